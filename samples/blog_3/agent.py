@@ -2,30 +2,85 @@ import asyncio
 import anyio
 import logging
 import os
-from typing import List, Optional, Union, cast
+import time
+from typing import Optional
 from dataclasses import dataclass
 
 import mcp.client.mqtt as mcp_mqtt
 from mcp.shared.mqtt import configure_logging
-import mcp.types as types
 
 from llama_index.llms.siliconflow import SiliconFlow
 from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.core.agent import AgentRunner
-from llama_index.core.tools import BaseTool, FunctionTool
+from llama_index.core.memory import ChatMemoryBuffer
 from llama_index.core.settings import Settings
 
+from mcp_readiness import ServerReadiness
+from mcp_tools import ToolRegistry
+from server_health import ServerHealth
+from console import AsyncConsole, BrokerHealth
+from model_router import FAST, REASONING, ModelRouter, RouteDecision
+from tracing import Tracer, span
+
 configure_logging(level="DEBUG")
 logger = logging.getLogger(__name__)
 
 
+MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "broker.emqx.io")
+# Seconds between broker round trip probes while the REPL is idle, 0 disables
+BROKER_HEALTH_INTERVAL = float(os.getenv("BROKER_HEALTH_INTERVAL", "10"))
+
+# Easy and tool-only turns go to the fast model, the rest to the reasoning
+# model; AGENT_MODEL_ROUTER=off sends every turn to the reasoning model
+USE_MODEL_ROUTER = os.getenv("AGENT_MODEL_ROUTER", "") != "off"
+# Models on SiliconFlow's function-calling list (e.g. Qwen2.5) fail in streamed turns
+# without tool calls, both defaults run as ReAct agents
+FAST_MODEL = os.getenv("AGENT_FAST_MODEL", "deepseek-ai/DeepSeek-V3")
+REASONING_MODEL = os.getenv("AGENT_REASONING_MODEL", "deepseek-ai/DeepSeek-R1")
+
+# Turn traces in Chrome trace-event format: a directory (one JSON file per
+# turn) or a .jsonl file (one line per turn); unset keeps only the summaries
+TRACE_OUTPUT = os.getenv("AGENT_TRACE")
+
+# Servers the agent waits for at startup (comma separated, empty means any
+# MCP_MIN_SERVERS servers), and how long to wait at most
+MCP_SERVERS = [name.strip() for name in os.getenv("MCP_SERVERS", "ESP32 Demo Server").split(",") if name.strip()]
+MCP_MIN_SERVERS = int(os.getenv("MCP_MIN_SERVERS", "1"))
+MCP_WAIT_TIMEOUT = float(os.getenv("MCP_WAIT_TIMEOUT", "10"))
+
+# Calls to a device fail immediately for CIRCUIT_RESET_TIMEOUT seconds after
+# it went offline or CIRCUIT_FAILURES calls in a row failed or took longer
+# than CIRCUIT_SLOW_CALL seconds, with CIRCUIT_BREAKER=on; off by default.
+# Failing fast trades success for latency: the LLM's retries of an instant failure are spent
+# within seconds, so a device that is back within the time its timed-out retries would have
+# spanned now fails the turn (blog_6 bench_circuit_breaker.py: 100% -> 46% of turns on a device
+# offline 6s of every 10s). Only turn it on for devices that stay away for long
+USE_CIRCUIT_BREAKER = os.getenv("CIRCUIT_BREAKER", "") == "on"
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "2"))
+CIRCUIT_SLOW_CALL = float(os.getenv("CIRCUIT_SLOW_CALL", "10"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "15"))
+
+readiness = ServerReadiness()
+server_health = ServerHealth(CIRCUIT_FAILURES, CIRCUIT_SLOW_CALL, CIRCUIT_RESET_TIMEOUT) if USE_CIRCUIT_BREAKER else None
+registry = ToolRegistry(health=server_health)
+
 async def on_mcp_server_discovered(client: mcp_mqtt.MqttTransportClient, server_name):
     logger.info(f"Discovered {server_name}, connecting ...")
-    await client.initialize_mcp_server(server_name)
+    readiness.mark_discovered(server_name)
+    if server_health is not None:
+        server_health.mark_online(server_name)
+    readiness.initialize_soon(client, server_name)
 
 async def on_mcp_connect(client, server_name, connect_result):
+    if server_health is not None:
+        server_health.mark_online(server_name)
     capabilities = client.get_session(server_name).server_info.capabilities
     logger.info(f"Capabilities of {server_name}: {capabilities}")
+    # Register tools first, the agent only waits for servers to become ready
+    if capabilities.tools:
+        await registry.refresh_server(server_name)
+        logger.info(f"Tools of {server_name}: {registry.server_tools.get(server_name)}")
+    readiness.mark_connected(server_name)
     if capabilities.prompts:
         prompts = await client.list_prompts(server_name)
         logger.info(f"Prompts of {server_name}: {prompts}")
@@ -34,131 +89,74 @@ async def on_mcp_connect(client, server_name, connect_result):
         logger.info(f"Resources of {server_name}: {resources}")
         resource_templates = await client.list_resource_templates(server_name)
         logger.info(f"Resources templates of {server_name}: {resource_templates}")
-    if capabilities.tools:
-        toolsResult = await client.list_tools(server_name)
-        tools = toolsResult.tools
-        logger.info(f"Tools of {server_name}: {tools}")
 
 async def on_mcp_disconnect(client, server_name):
     logger.info(f"Disconnected from {server_name}")
+    readiness.mark_disconnected(server_name)
+    if server_health is not None:
+        server_health.mark_offline(server_name)
+    registry.remove_server(server_name)
 
 client = None
 api_key = "sk-*"
 
-async def get_mcp_tools(mcp_client: mcp_mqtt.MqttTransportClient) -> List[BaseTool]:
-    all_tools = []
-    try:
-        try:
-            tools_result = await mcp_client.list_tools("ESP32 Demo Server")
-            
-            if tools_result is False:
-                return all_tools
-            
-            list_tools_result = cast(types.ListToolsResult, tools_result)
-            tools = list_tools_result.tools
-            
-            for tool in tools:
-                logger.info(f"tool: {tool.name} - {tool.description}")
-                
-                def create_mcp_tool_wrapper(client_ref, server_name, tool_name):
-                    async def mcp_tool_wrapper(**kwargs):
-                        try:
-                            result = await client_ref.call_tool(server_name, tool_name, kwargs)
-                            if result is False:
-                                return f"call {tool_name} failed"
-                            
-                            call_result = cast(types.CallToolResult, result)
-                            
-                            if hasattr(call_result, 'content') and call_result.content:
-                                content_parts = []
-                                for content_item in call_result.content:
-                                    if hasattr(content_item, 'type'):
-                                        if content_item.type == 'text':
-                                            text_content = cast(types.TextContent, content_item)
-                                            content_parts.append(text_content.text)
-                                        elif content_item.type == 'image':
-                                            image_content = cast(types.ImageContent, content_item)
-                                            content_parts.append(f"[image: {image_content.mimeType}]")
-                                        elif content_item.type == 'resource':
-                                            resource_content = cast(types.EmbeddedResource, content_item)
-                                            content_parts.append(f"[resource: {resource_content.resource}]")
-                                        else:
-                                            content_parts.append(str(content_item))
-                                    else:
-                                        content_parts.append(str(content_item))
-                                
-                                result_text = '\n'.join(content_parts)
-                                
-                                if hasattr(call_result, 'isError') and call_result.isError:
-                                    return f"tool return error: {result_text}"
-                                else:
-                                    return result_text
-                            else:
-                                return str(call_result)
-                                
-                        except Exception as e:
-                            error_msg = f"call {tool_name} error: {e}"
-                            logger.error(error_msg)
-                            return error_msg
-                    
-                    return mcp_tool_wrapper
-                
-                wrapper_func = create_mcp_tool_wrapper(mcp_client, "ESP32 Demo Server", tool.name)
-                
-                try:
-                    llamaindex_tool = FunctionTool.from_defaults(
-                        fn=wrapper_func,
-                        name=f"mcp_{tool.name}",
-                        description=tool.description or f"MCP tool: {tool.name}",
-                        async_fn=wrapper_func
-                    )
-                    all_tools.append(llamaindex_tool)
-                    logger.info(f"call tool success: mcp_{tool.name}")
-                    
-                except Exception as e:
-                    logger.error(f"create tool {tool.name} error: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Get tool list error: {e}")
-                
-    except Exception as e:
-        logger.error(f"Get tool list error: {e}")
-    
-    return all_tools
-
 class ConversationalAgent:
-    def __init__(self, mcp_client: Optional[mcp_mqtt.MqttTransportClient] = None):
-        self.llm = SiliconFlow(api_key=api_key, model="deepseek-ai/DeepSeek-R1", temperature=0.6, max_tokens=4000, timeout=180)
+    def __init__(self, mcp_client: Optional[mcp_mqtt.MqttTransportClient] = None, tool_registry: Optional[ToolRegistry] = None):
+        self.llm = SiliconFlow(api_key=api_key, model=REASONING_MODEL, temperature=0.6, max_tokens=4000, timeout=180)
         Settings.llm = self.llm
         
+        self.llms = {REASONING: self.llm}
+        self.router = None
+        if USE_MODEL_ROUTER:
+            self.llms[FAST] = SiliconFlow(api_key=api_key, model=FAST_MODEL, temperature=0.6, max_tokens=1000, timeout=60)
+            self.router = ModelRouter()
+        self.last_route = None
+        self.tracer = Tracer(TRACE_OUTPUT)
+        
         self.mcp_client = mcp_client
         self.tools = []
         
-        self.agent = AgentRunner.from_llm(
-            llm=self.llm,
-            tools=self.tools,
-            verbose=True
-        )
+        # One agent per route, sharing the memory so switching models keeps the conversation
+        self.memory = ChatMemoryBuffer.from_defaults(llm=self.llm)
+        self.agents = self._build_agents()
         
-        self.mcp_tools_loaded = False
+        # Tools of all connected servers, kept up to date by the MCP callbacks
+        self.tool_registry = tool_registry or ToolRegistry(mcp_client)
+        self.tools_version = None
+
+    def _build_agents(self) -> dict:
+        return {
+            route: AgentRunner.from_llm(llm=llm, tools=self.tools, memory=self.memory, verbose=True)
+            for route, llm in self.llms.items()
+        }
+    
+    def route(self, message: str) -> RouteDecision:
+        if self.router is None:
+            return RouteDecision(REASONING, "router disabled")
+        tool_names = [tool.name for tools in self.tool_registry.server_tools.values() for tool in tools]
+        return self.router.classify(message, self.last_route, tool_names)
+    
+    @property
+    def mcp_tools_loaded(self) -> bool:
+        return self.tools_version == self.tool_registry.version
         
     async def load_mcp_tools(self):
-        if not self.mcp_tools_loaded and self.mcp_client:
-            try:
-                mcp_tools = await get_mcp_tools(self.mcp_client)
-                if mcp_tools:
-                    self.tools.extend(mcp_tools)
-                    self.agent = AgentRunner.from_llm(
-                        llm=self.llm,
-                        tools=self.tools,
-                        verbose=True
-                    )
-                    logger.info(f"load {len(mcp_tools)} tools")
-                    self.mcp_tools_loaded = True
-            except Exception as e:
-                logger.error(f"load tool error: {e}")
+        """Rebuild the agent if the registry's tool set changed"""
+        if self.mcp_tools_loaded:
+            return
+        try:
+            if not self.tool_registry.server_tools and self.mcp_client:
+                # Nothing registered by the callbacks yet, list connected servers directly
+                await self.tool_registry.refresh_all(readiness.connected)
+            self.tools = self.tool_registry.snapshot()
+            self.tools_version = self.tool_registry.version
+            self.agents = self._build_agents()
+            logger.info(f"load {len(self.tools)} tools")
+        except Exception as e:
+            logger.error(f"load tool error: {e}")
         
     async def chat(self, message: str) -> str:
+        trace = self.tracer.start_turn(message_chars=len(message))
         try:
             if not self.mcp_tools_loaded:
                 await self.load_mcp_tools()
@@ -166,13 +164,23 @@ class ConversationalAgent:
             logger.info(f"user input: {message}")
             user_message = ChatMessage(role=MessageRole.USER, content=message)
             
-            response = await self.agent.achat(message)
-            logger.info(f"Agent response: {response}")
+            decision = self.route(message)
+            start = time.perf_counter()
+            # LLM calls plus the tool spans nested in them
+            with span("achat", "agent", model=self.llms[decision.route].model) as trace_args:
+                response = await self.agents[decision.route].achat(message)
+                trace_args["tool_calls"] = len(getattr(response, "sources", None) or [])
+            if self.router is not None:
+                self.router.record(decision, time.perf_counter() - start)
+            self.last_route = decision.route
+            logger.info(f"Agent response ({decision.route} model): {response}")
+            self.tracer.end_turn(trace, route=decision.route, response_chars=len(str(response)))
             return str(response)
             
         except Exception as e:
             error_msg = f"error: {e}"
             logger.error(error_msg)
+            self.tracer.end_turn(trace, error=error_msg)
             return error_msg
     
 
@@ -185,44 +193,90 @@ async def main():
             on_mcp_connect=on_mcp_connect,
             on_mcp_disconnect=on_mcp_disconnect,
             mqtt_options=mcp_mqtt.MqttOptions(
-                host="broker.emqx.io",
+                host=MQTT_BROKER_HOST,
             )
         ) as mcp_client:
+            registry.client = mcp_client
+            start = time.perf_counter()
             await mcp_client.start()
-            await anyio.sleep(3)
+            if await readiness.wait_for(MCP_SERVERS, min_servers=MCP_MIN_SERVERS, timeout=MCP_WAIT_TIMEOUT):
+                logger.info(f"MCP servers ready in {time.perf_counter() - start:.2f}s: {sorted(readiness.connected)}")
+            else:
+                logger.warning(f"Timed out after {MCP_WAIT_TIMEOUT}s waiting for {MCP_SERVERS}, connected: {sorted(readiness.connected)}")
             
-            agent = ConversationalAgent(mcp_client)
+            agent = ConversationalAgent(mcp_client, registry)
+            
+            # stdin is read in a thread so MQTT keeps running while the user types
+            console = AsyncConsole()
+            health = None
+            if BROKER_HEALTH_INTERVAL > 0:
+                health = BrokerHealth(MQTT_BROKER_HOST, interval=BROKER_HEALTH_INTERVAL)
+                health.start()
             
             print("input 'exit' or 'quit' exit")
             print("input 'tools' show available tools")
+            print("input 'health' show broker round trip")
+            print("input 'routes' show model routing decisions and latency")
+            print("input 'traces' show where recent turns spent their time")
             print("="*50)
             
-            while True:
-                try:
-                    user_input = input("\nuser: ").strip()
-                    
-                    if user_input.lower() in ['exit', 'quit']:
+            try:
+                while True:
+                    try:
+                        prompt = f"\nuser [{health.status()}]: " if health else "\nuser: "
+                        user_input = await console.readline(prompt)
+                        if user_input is None:
+                            break
+                        user_input = user_input.strip()
+                        
+                        if user_input.lower() in ['exit', 'quit']:
+                            break
+                        
+                        if user_input.lower() == 'tools':
+                            print(f"available tools: {len(agent.tools)}")
+                            for tool in agent.tools:
+                                tool_name = getattr(tool.metadata, 'name', str(tool))
+                                tool_desc = getattr(tool.metadata, 'description', 'No description')
+                                print(f"- {tool_name}: {tool_desc}")
+                            continue
+                        
+                        if user_input.lower() == 'routes':
+                            if agent.router is not None:
+                                print(agent.router.summary())
+                            else:
+                                print("model router is disabled")
+                            continue
+                        
+                        if user_input.lower() == 'traces':
+                            print(agent.tracer.stats())
+                            print(f"tool arguments: {registry.argument_stats.stats()}")
+                            continue
+                        
+                        if user_input.lower() == 'health':
+                            if health:
+                                print(f"broker {MQTT_BROKER_HOST}: {health.summary()}")
+                            else:
+                                print("broker health probe is disabled")
+                            print(f"connected servers: {sorted(readiness.connected)}")
+                            if server_health is not None:
+                                for server_name, state in server_health.stats().items():
+                                    print(f"- circuit {server_name}: {state}")
+                            continue
+                        
+                        if not user_input:
+                            continue
+                        
+                        response = await agent.chat(user_input)
+                        print(f"\nAgent: {response}")
+                        
+                    except KeyboardInterrupt:
                         break
-                    
-                    if user_input.lower() == 'tools':
-                        print(f"available tools: {len(agent.tools)}")
-                        for tool in agent.tools:
-                            tool_name = getattr(tool.metadata, 'name', str(tool))
-                            tool_desc = getattr(tool.metadata, 'description', 'No description')
-                            print(f"- {tool_name}: {tool_desc}")
-                        continue
-                    
-                    if not user_input:
-                        continue
-                    
-                    response = await agent.chat(user_input)
-                    print(f"\nAgent: {response}")
-                    
-                except KeyboardInterrupt:
-                    break
-                except Exception as e:
-                    print(f"error: {e}")
-                    
+                    except Exception as e:
+                        print(f"error: {e}")
+            finally:
+                if health:
+                    health.stop()
+
     except Exception as e:
         print(f"agent init error: {e}")
         
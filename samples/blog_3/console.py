@@ -0,0 +1,161 @@
+"""
+Async console input and broker health for the agent REPL
+
+`input()` called from a coroutine blocks the whole event loop, so MQTT
+keepalives, presence and discovery callbacks stop while the user is typing.
+AsyncConsole reads stdin in a daemon thread and hands each line back to the
+loop. BrokerHealth measures the broker round trip with a loopback message on
+its own connection, so the REPL can show whether the broker is reachable
+while it sits idle.
+"""
+
+import asyncio
+import logging
+import queue
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Optional
+
+import paho.mqtt.client as paho
+
+logger = logging.getLogger(__name__)
+
+# RTT samples kept for the health summary
+RTT_WINDOW = 100
+
+
+def _resolve(future: asyncio.Future, line: Optional[str]):
+    # The read may have been cancelled while the thread was blocked in input()
+    if not future.done():
+        future.set_result(line)
+
+
+class AsyncConsole:
+    """Read stdin lines in a daemon thread without blocking the event loop"""
+
+    def __init__(self):
+        self.requests: "queue.Queue" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="console", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            prompt, loop, future = self.requests.get()
+            try:
+                line = input(prompt)
+            except EOFError:
+                line = None
+            loop.call_soon_threadsafe(_resolve, future, line)
+
+    async def readline(self, prompt: str = "") -> Optional[str]:
+        """Return the next line typed by the user, None at end of input"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests.put((prompt, loop, future))
+        return await future
+
+
+class BrokerHealth:
+    """Periodically publish to a private topic and time the message coming back"""
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 1883,
+        interval: float = 10.0,
+        timeout: float = 5.0,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.topic = f"mcp-agent/health/{uuid.uuid4().hex[:12]}"
+        self.samples: Deque[float] = deque(maxlen=RTT_WINDOW)
+        self.failures = 0
+        self.last_seen: Optional[float] = None
+        self.seq = 0
+        self.pending: Optional[int] = None
+        self.pending_since = 0.0
+        self.stopped = threading.Event()
+
+        self.client = paho.Client(paho.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.host = host
+        self.port = port
+        self.thread = threading.Thread(target=self._run, name="broker-health", daemon=True)
+
+    def start(self):
+        # Non-blocking connect, paho reconnects on its own if the broker drops us
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        client.subscribe(self.topic, qos=0)
+
+    def _on_message(self, client, userdata, message):
+        try:
+            seq = int(message.payload)
+        except ValueError:
+            return
+        if seq == self.pending:
+            self.samples.append(time.perf_counter() - self.pending_since)
+            self.last_seen = time.time()
+            self.pending = None
+
+    def _run(self):
+        # First probe soon after connecting, then every interval
+        delay = min(self.interval, 1.0)
+        while not self.stopped.wait(delay):
+            self.probe()
+            delay = self.interval
+
+    def probe(self):
+        if self.pending is not None and time.perf_counter() - self.pending_since > self.timeout:
+            self.failures += 1
+            logger.warning(
+                f"Broker {self.host} did not answer within {self.timeout:g}s "
+                f"({self.failures} failed probes)"
+            )
+            self.pending = None
+        if self.pending is not None or not self.client.is_connected():
+            return
+        self.seq += 1
+        # Set the send time first, _on_message runs in paho's network thread
+        self.pending_since = time.perf_counter()
+        self.pending = self.seq
+        self.client.publish(self.topic, str(self.seq), qos=0)
+
+    @property
+    def last_rtt(self) -> Optional[float]:
+        return self.samples[-1] if self.samples else None
+
+    def status(self) -> str:
+        """Short indicator for the prompt, e.g. "broker 12 ms" """
+        if not self.client.is_connected():
+            return "broker offline"
+        if self.pending is not None and time.perf_counter() - self.pending_since > self.timeout:
+            return "broker not responding"
+        if self.last_rtt is None:
+            return "broker connected"
+        return f"broker {self.last_rtt * 1000:.0f} ms"
+
+    def summary(self) -> dict:
+        samples = [s * 1000 for s in self.samples]
+        return {
+            "connected": self.client.is_connected(),
+            "last_ms": round(samples[-1], 1) if samples else None,
+            "p50_ms": round(statistics.median(samples), 1) if samples else None,
+            "max_ms": round(max(samples), 1) if samples else None,
+            "failed_probes": self.failures,
+            "last_seen_s_ago": round(time.time() - self.last_seen, 1)
+            if self.last_seen
+            else None,
+        }
@@ -0,0 +1,91 @@
+"""
+Event-driven readiness tracking for MCP servers discovered over MQTT
+
+Replaces a fixed sleep after MqttTransportClient.start(): the discovery and
+connect callbacks report to a ServerReadiness, and the agent waits until the
+servers it needs are connected, or a timeout expires.
+"""
+
+import asyncio
+import logging
+from typing import Iterable, Optional, Set
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+
+class ServerReadiness:
+    """Track discovered / connected MCP servers and let callers wait for them"""
+
+    def __init__(self):
+        self.discovered: Set[str] = set()
+        self.connected: Set[str] = set()
+        self._changed = anyio.Event()
+        # Keep references to background initializations so they are not garbage collected
+        self._pending = set()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = anyio.Event()
+
+    def mark_discovered(self, server_name: str):
+        self.discovered.add(server_name)
+        self._notify()
+
+    def mark_connected(self, server_name: str):
+        self.connected.add(server_name)
+        self._notify()
+
+    def mark_disconnected(self, server_name: str):
+        self.connected.discard(server_name)
+        self._notify()
+
+    def initialize_soon(self, client, server_name: str):
+        """
+        Initialize a discovered server in the background
+
+        The discovery callback returns immediately, so several servers that
+        show up together are initialized concurrently instead of one by one.
+        """
+
+        async def initialize():
+            try:
+                await client.initialize_mcp_server(server_name)
+            except Exception as e:
+                logger.error(f"Initialize {server_name} error: {e}")
+
+        task = asyncio.ensure_future(initialize())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def is_ready(
+        self, server_names: Optional[Iterable[str]] = None, min_servers: int = 1
+    ) -> bool:
+        if server_names:
+            return set(server_names) <= self.connected
+        return len(self.connected) >= min_servers
+
+    async def wait_for(
+        self,
+        server_names: Optional[Iterable[str]] = None,
+        min_servers: int = 1,
+        timeout: float = 10.0,
+    ) -> bool:
+        """
+        Wait until the given servers (or any `min_servers` servers) are connected
+
+        Args:
+            server_names: Servers that must all be connected; if empty, any
+                `min_servers` connected servers are enough
+            min_servers: Number of servers to wait for when no names are given
+            timeout: Seconds to wait at most
+
+        Returns:
+            bool: True if ready, False if the timeout expired first
+        """
+        server_names = list(server_names or [])
+        with anyio.move_on_after(timeout):
+            while not self.is_ready(server_names, min_servers):
+                await self._changed.wait()
+        return self.is_ready(server_names, min_servers)
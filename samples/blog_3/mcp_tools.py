@@ -0,0 +1,230 @@
+"""
+MCP tools of every connected server, wrapped as LlamaIndex tools
+
+ToolRegistry keeps the tool list of each MCP server, fed incrementally by the
+connect / disconnect callbacks, and hands the agent a cached snapshot of
+LlamaIndex tools. Tool names are namespaced per server so several devices
+exposing the same tool (e.g. set_volume) can coexist.
+"""
+
+import json
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional, cast
+
+import anyio
+import mcp.types as types
+from llama_index.core.tools import BaseTool, FunctionTool
+from pydantic import ValidationError
+
+from server_health import CircuitOpenError, ServerHealth
+from tool_schema import ArgumentStats, create_fn_schema, format_validation_error, validate_arguments
+from tracing import result_size, span
+
+logger = logging.getLogger(__name__)
+
+# Function names accepted by OpenAI-compatible APIs: ^[a-zA-Z0-9_-]{1,64}$
+MAX_TOOL_NAME_LENGTH = 64
+
+
+def server_prefix(server_name: str) -> str:
+    """'ESP32 Demo Server' -> 'esp32_demo_server'"""
+    return re.sub(r"[^a-zA-Z0-9]+", "_", server_name).strip("_").lower()
+
+
+def namespaced_tool_name(server_name: str, tool_name: str) -> str:
+    return f"{server_prefix(server_name)}__{tool_name}"[:MAX_TOOL_NAME_LENGTH]
+
+
+def format_call_result(tool_name: str, result) -> str:
+    """Convert a CallToolResult into text for the LLM"""
+    if result is False:
+        return f"call {tool_name} failed"
+
+    call_result = cast(types.CallToolResult, result)
+
+    if hasattr(call_result, "content") and call_result.content:
+        content_parts = []
+        for content_item in call_result.content:
+            if hasattr(content_item, "type"):
+                if content_item.type == "text":
+                    text_content = cast(types.TextContent, content_item)
+                    content_parts.append(text_content.text)
+                elif content_item.type == "image":
+                    image_content = cast(types.ImageContent, content_item)
+                    content_parts.append(f"[image: {image_content.mimeType}]")
+                elif content_item.type == "resource":
+                    resource_content = cast(types.EmbeddedResource, content_item)
+                    content_parts.append(f"[resource: {resource_content.resource}]")
+                else:
+                    content_parts.append(str(content_item))
+            else:
+                content_parts.append(str(content_item))
+
+        result_text = "\n".join(content_parts)
+
+        if hasattr(call_result, "isError") and call_result.isError:
+            return f"tool return error: {result_text}"
+        else:
+            return result_text
+    else:
+        return str(call_result)
+
+
+def create_mcp_tool_wrapper(client_ref, server_name, tool_name, health=None, fn_schema=None, argument_stats=None):
+    async def mcp_tool_wrapper(**kwargs):
+        with span(f"tool {tool_name}", "tool", server=server_name) as trace_args:
+            try:
+                if fn_schema is not None:
+                    # Calls in the untyped shape, kwargs={...}, are still accepted
+                    arguments = kwargs
+                    if set(arguments) == {"kwargs"} and isinstance(arguments["kwargs"], dict) and "kwargs" not in fn_schema.model_fields:
+                        arguments = arguments["kwargs"]
+                    try:
+                        validated = validate_arguments(fn_schema, arguments)
+                    except ValidationError as e:
+                        if argument_stats is not None:
+                            argument_stats.record(tool_name, False)
+                        trace_args["invalid_arguments"] = True
+                        return f"call {tool_name} failed: invalid arguments: {format_validation_error(e)}"
+                    if argument_stats is not None:
+                        argument_stats.record(tool_name, True)
+                    kwargs = {"kwargs": validated}
+
+                # Offline or failing servers are not waited for again
+                if health is not None:
+                    try:
+                        health.check(server_name)
+                    except CircuitOpenError as e:
+                        trace_args["circuit"] = "open"
+                        return f"call {tool_name} failed: {e}"
+
+                # kwargs is the firmware's {"kwargs": {...}} argument object
+                trace_args["request_chars"] = len(json.dumps(kwargs, default=str))
+                start = time.perf_counter()
+                with span(f"mqtt call_tool {tool_name}", "mqtt", server=server_name) as mqtt_args:
+                    try:
+                        result = await client_ref.call_tool(server_name, tool_name, kwargs)
+                    except Exception as e:
+                        if health is not None:
+                            health.record_failure(server_name, str(e) or type(e).__name__)
+                        raise
+                    mqtt_args["response_chars"] = result_size(result)
+                if health is not None:
+                    if result is False:
+                        health.record_failure(server_name, "call failed")
+                    else:
+                        health.record_success(server_name, time.perf_counter() - start)
+                result_text = format_call_result(tool_name, result)
+                trace_args["result_chars"] = len(result_text)
+                return result_text
+
+            except Exception as e:
+                error_msg = f"call {tool_name} error: {e}"
+                logger.error(error_msg)
+                return error_msg
+
+    return mcp_tool_wrapper
+
+
+def create_llamaindex_tool(client, server_name: str, tool: types.Tool, health=None, argument_stats=None) -> BaseTool:
+    # Typed parameters for the LLM, checked before the call goes over MQTT
+    fn_schema = create_fn_schema(tool)
+    wrapper_func = create_mcp_tool_wrapper(client, server_name, tool.name, health, fn_schema, argument_stats)
+    description = tool.description or f"MCP tool: {tool.name}"
+    return FunctionTool.from_defaults(
+        fn=wrapper_func,
+        name=namespaced_tool_name(server_name, tool.name),
+        description=f"[{server_name}] {description}",
+        fn_schema=fn_schema,
+        async_fn=wrapper_func,
+    )
+
+
+class ToolRegistry:
+    """Tools of all connected MCP servers, updated incrementally"""
+
+    def __init__(self, client=None, health: Optional[ServerHealth] = None):
+        self.client = client
+        # ServerHealth, fails calls to offline or failing servers fast
+        self.health = health
+        # Calls rejected by the typed argument schemas before reaching a device
+        self.argument_stats = ArgumentStats()
+        self.server_tools: Dict[str, List[types.Tool]] = {}
+        self.llamaindex_tools: Dict[str, List[BaseTool]] = {}
+        # Bumped on every change, lets consumers skip work when nothing changed
+        self.version = 0
+        self._snapshot: Optional[List[BaseTool]] = None
+
+    def update_server(self, server_name: str, tools: List[types.Tool]) -> bool:
+        """Replace the tools of one server, returns False if nothing changed"""
+        old_tools = self.server_tools.get(server_name)
+        if old_tools is not None and [t.model_dump() for t in old_tools] == [
+            t.model_dump() for t in tools
+        ]:
+            return False
+
+        llamaindex_tools = []
+        for tool in tools:
+            try:
+                llamaindex_tools.append(
+                    create_llamaindex_tool(self.client, server_name, tool, self.health, self.argument_stats)
+                )
+            except Exception as e:
+                logger.error(f"create tool {tool.name} of {server_name} error: {e}")
+
+        self.server_tools[server_name] = list(tools)
+        self.llamaindex_tools[server_name] = llamaindex_tools
+        self._changed()
+        logger.info(f"Registered {len(llamaindex_tools)} tools of {server_name}")
+        return True
+
+    def remove_server(self, server_name: str) -> bool:
+        if server_name not in self.server_tools:
+            return False
+        del self.server_tools[server_name]
+        del self.llamaindex_tools[server_name]
+        self._changed()
+        logger.info(f"Removed tools of {server_name}")
+        return True
+
+    def _changed(self):
+        self.version += 1
+        self._snapshot = None
+
+    async def refresh_server(self, server_name: str) -> bool:
+        """List the tools of one server and update the registry"""
+        try:
+            with span("list_tools", "mqtt", server=server_name) as trace_args:
+                tools_result = await self.client.list_tools(server_name)
+                trace_args["tools"] = len(getattr(tools_result, "tools", None) or [])
+        except Exception as e:
+            logger.error(f"Get tool list of {server_name} error: {e}")
+            return False
+
+        if tools_result is False:
+            logger.warning(f"Get tool list of {server_name} failed")
+            return False
+
+        list_tools_result = cast(types.ListToolsResult, tools_result)
+        self.update_server(server_name, list_tools_result.tools)
+        return True
+
+    async def refresh_all(self, server_names: Iterable[str]) -> float:
+        """List tools of all given servers concurrently, returns elapsed seconds"""
+        start = time.perf_counter()
+        async with anyio.create_task_group() as tg:
+            for server_name in server_names:
+                tg.start_soon(self.refresh_server, server_name)
+        return time.perf_counter() - start
+
+    def snapshot(self) -> List[BaseTool]:
+        """All LlamaIndex tools, rebuilt only after a change"""
+        if self._snapshot is None:
+            self._snapshot = [
+                tool
+                for server_name in sorted(self.llamaindex_tools)
+                for tool in self.llamaindex_tools[server_name]
+            ]
+        return self._snapshot
@@ -0,0 +1,172 @@
+"""
+Typed argument schemas for MCP tools
+
+A wrapper declared as `mcp_tool_wrapper(**kwargs)` gives FunctionTool
+nothing to infer, so the LLM sees a single untyped `kwargs` argument and
+has to guess names and types from the description; wrong guesses cost a
+round trip to the device ("Volume argument must be an integer") and another
+LLM step. create_fn_schema() turns a tool's JSON inputSchema into a pydantic
+model the LLM sees as the tool's parameters. The wrapper validates the
+arguments against it before anything is sent over MQTT and still sends them
+in the firmware's {"kwargs": {...}} shape.
+"""
+
+import keyword
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Literal, Optional, Type, Union
+
+import mcp.types as types
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+logger = logging.getLogger(__name__)
+
+JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": bool,
+    "object": Dict[str, Any],
+}
+
+# JSON schema keywords that map onto pydantic Field constraints
+CONSTRAINTS = {
+    "minimum": "ge",
+    "maximum": "le",
+    "exclusiveMinimum": "gt",
+    "exclusiveMaximum": "lt",
+    "minLength": "min_length",
+    "maxLength": "max_length",
+    "minItems": "min_length",
+    "maxItems": "max_length",
+}
+
+
+def json_schema_annotation(schema: dict):
+    """Python type of one JSON schema property ('integer' -> int, enum -> Literal)"""
+    enum = schema.get("enum")
+    if isinstance(enum, list) and enum and all(
+        isinstance(value, (str, int, float, bool)) for value in enum
+    ):
+        return Literal[tuple(enum)]
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        annotations = [
+            json_schema_annotation({**schema, "type": t}) for t in schema_type if t != "null"
+        ]
+        if not annotations:
+            return Any
+        annotation = annotations[0] if len(annotations) == 1 else Union[tuple(annotations)]
+        return Optional[annotation] if "null" in schema_type else annotation
+    if schema_type == "array":
+        items = schema.get("items")
+        return List[json_schema_annotation(items)] if isinstance(items, dict) else List[Any]
+    return JSON_TYPES.get(schema_type, Any)
+
+
+def compact_json_schema(schema: dict):
+    """
+    Drop what the LLM does not need from the schema in every prompt
+
+    Pydantic titles each property after its own name and spells optional
+    fields as anyOf [type, null] with a null default; the required list
+    already says which arguments may be left out.
+    """
+    for prop in schema.get("properties", {}).values():
+        prop.pop("title", None)
+        variants = prop.get("anyOf")
+        if isinstance(variants, list):
+            variants = [v for v in variants if v != {"type": "null"}]
+            if len(variants) == 1:
+                del prop["anyOf"]
+                prop.update(variants[0])
+        if "default" in prop and prop["default"] is None:
+            del prop["default"]
+
+
+def _field_name_ok(name: str) -> bool:
+    return (
+        name.isidentifier()
+        and not keyword.iskeyword(name)
+        and not name.startswith(("_", "model_"))
+        and not hasattr(BaseModel, name)
+    )
+
+
+def create_fn_schema(tool: types.Tool) -> Optional[Type[BaseModel]]:
+    """
+    Pydantic model of a tool's inputSchema
+
+    Returns None when the schema can not be expressed as keyword arguments
+    (property names that are not identifiers), the tool then keeps the
+    untyped `kwargs` parameter.
+    """
+    schema = tool.inputSchema or {}
+    properties = schema.get("properties") or {}
+    required = set(schema.get("required") or [])
+    if not all(_field_name_ok(name) for name in properties):
+        logger.debug(f"Untyped arguments for {tool.name}: {list(properties)}")
+        return None
+
+    fields = {}
+    for name, prop in properties.items():
+        prop = prop if isinstance(prop, dict) else {}
+        annotation = json_schema_annotation(prop)
+        constraints = {
+            field_key: prop[schema_key]
+            for schema_key, field_key in CONSTRAINTS.items()
+            if isinstance(prop.get(schema_key), (int, float))
+        }
+        if name in required:
+            default = ...
+        else:
+            annotation = Optional[annotation]
+            default = prop.get("default")
+        fields[name] = (
+            annotation,
+            Field(default, description=prop.get("description"), **constraints),
+        )
+
+    # Extra arguments are passed through unless the server forbids them
+    extra = "forbid" if schema.get("additionalProperties") is False else "allow"
+    config = ConfigDict(extra=extra, json_schema_extra=compact_json_schema)
+    return create_model(f"{tool.name}_arguments", __config__=config, **fields)
+
+
+def validate_arguments(fn_schema: Type[BaseModel], arguments: dict) -> dict:
+    """
+    Checked and coerced arguments ("40" -> 40), only those the caller set
+
+    Raises:
+        ValidationError: If the arguments do not match the schema
+    """
+    return fn_schema.model_validate(arguments).model_dump(mode="json", exclude_unset=True)
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """'volume: Input should be a valid integer; url: Field required'"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'arguments'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+class ArgumentStats:
+    """Tool calls whose arguments were checked locally, per tool"""
+
+    def __init__(self):
+        self.valid: Dict[str, int] = defaultdict(int)
+        self.invalid: Dict[str, int] = defaultdict(int)
+
+    def record(self, tool_name: str, valid: bool):
+        (self.valid if valid else self.invalid)[tool_name] += 1
+
+    def stats(self) -> dict:
+        valid = sum(self.valid.values())
+        invalid = sum(self.invalid.values())
+        return {
+            "checked": valid + invalid,
+            # Each rejected call is a round trip to the device that was not made
+            "rejected": invalid,
+            "rejected_by_tool": dict(self.invalid),
+        }
@@ -0,0 +1,226 @@
+"""
+Per-turn trace timeline in Chrome trace-event format
+
+A slow turn is made of LLM calls, MCP call_tool / list_tools round trips
+over MQTT and the wrapper code around them. Tracer.start_turn() opens a
+TurnTrace held in a context variable; span() blocks in the tool wrappers
+and the registry add timed, nested spans with payload sizes to it, and
+tasks started during the turn (parallel tool calls) inherit it.
+Each finished turn is written as Chrome trace JSON (load it in
+chrome://tracing or https://ui.perfetto.dev) or as one JSONL line, and a
+per-category breakdown is logged. A span costs a few microseconds against
+round trips of tens of milliseconds, so tracing can stay enabled.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Finished turn summaries kept for stats()
+SUMMARY_WINDOW = 50
+
+_current_turn: ContextVar[Optional["TurnTrace"]] = ContextVar("current_turn", default=None)
+
+
+def _lane() -> int:
+    """Current asyncio task (or thread), parallel tool calls get separate rows"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+def result_size(result) -> int:
+    """Payload characters of a CallToolResult (text, base64 data and resources)"""
+    size = 0
+    for item in getattr(result, "content", None) or []:
+        size += len(getattr(item, "text", None) or getattr(item, "data", None) or "")
+        resource = getattr(item, "resource", None)
+        if resource is not None:
+            size += len(getattr(resource, "text", None) or getattr(resource, "blob", None) or "")
+    return size
+
+
+class TurnTrace:
+    """Spans of one agent turn"""
+
+    def __init__(self, name: str, turn_id: int, **args):
+        self.name = name
+        self.turn_id = turn_id
+        self.args = args
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        # (name, category, start ns, end ns, lane, args)
+        self.spans: List[tuple] = []
+
+    @property
+    def closed(self) -> bool:
+        return self.end_ns is not None
+
+    def add(self, name: str, category: str, start_ns: int, end_ns: int, **args):
+        # Background tasks inherit the turn that was current when they started
+        if self.closed:
+            return
+        self.spans.append((name, category, start_ns, end_ns, _lane(), args))
+
+    def elapsed(self) -> float:
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e9
+
+    def chrome_events(self) -> List[dict]:
+        """Complete ("X") events, timestamps in microseconds from the turn start"""
+        end_ns = self.end_ns or time.perf_counter_ns()
+        lanes = {}
+        events = [
+            {
+                "name": self.name,
+                "cat": "turn",
+                "ph": "X",
+                "ts": 0,
+                "dur": (end_ns - self.start_ns) / 1000,
+                "pid": self.turn_id,
+                "tid": 0,
+                "args": self.args,
+            }
+        ]
+        for name, category, start_ns, stop_ns, lane, args in self.spans:
+            tid = lanes.setdefault(lane, len(lanes))
+            events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start_ns - self.start_ns) / 1000,
+                    "dur": (stop_ns - start_ns) / 1000,
+                    "pid": self.turn_id,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+        events.sort(key=lambda event: event["ts"])
+        return events
+
+    def totals(self) -> Dict[str, float]:
+        """Milliseconds per span category, overlapping spans counted in full"""
+        totals: Dict[str, float] = defaultdict(float)
+        for _, category, start_ns, end_ns, _, _ in self.spans:
+            totals[category] += (end_ns - start_ns) / 1e6
+        return {category: round(ms, 1) for category, ms in totals.items()}
+
+    def counts(self) -> Dict[str, int]:
+        """Spans per category, e.g. LLM steps and tool calls of the turn"""
+        counts: Dict[str, int] = defaultdict(int)
+        for _, category, _, _, _, _ in self.spans:
+            counts[category] += 1
+        return dict(counts)
+
+
+@contextmanager
+def span(name: str, category: str, **args):
+    """
+    Time a block as a span of the current turn
+
+    Yields the span's args dict, so sizes known only at the end can be
+    added (`args["result_chars"] = ...`); outside a turn it is a plain dict
+    that is thrown away.
+    """
+    trace = _current_turn.get()
+    if trace is None:
+        yield args
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield args
+    finally:
+        trace.add(name, category, start, time.perf_counter_ns(), **args)
+
+
+class Tracer:
+    """
+    Start and finish turn traces and write them out
+
+    `output` is a directory (one Chrome trace JSON file per turn) or a path
+    ending in .jsonl (one line per turn appended); None keeps only the
+    in-memory summaries.
+    """
+
+    def __init__(self, output: Optional[str] = None):
+        self.output = output
+        self.turns = 0
+        self.summaries: Deque[dict] = deque(maxlen=SUMMARY_WINDOW)
+        if output:
+            directory = os.path.dirname(output) if output.endswith(".jsonl") else output
+            os.makedirs(directory or ".", exist_ok=True)
+
+    def start_turn(self, name: str = "turn", **args) -> TurnTrace:
+        self.turns += 1
+        trace = TurnTrace(name, self.turns, **args)
+        _current_turn.set(trace)
+        return trace
+
+    def end_turn(self, trace: TurnTrace, **args) -> dict:
+        """Close the trace, write it and return its per-category summary"""
+        trace.end_ns = time.perf_counter_ns()
+        trace.args.update(args)
+        if _current_turn.get() is trace:
+            _current_turn.set(None)
+        summary = {
+            "turn": trace.turn_id,
+            "name": trace.name,
+            "elapsed_ms": round(trace.elapsed() * 1000, 1),
+            "spans": len(trace.spans),
+            "ms": trace.totals(),
+            "count": trace.counts(),
+        }
+        self.summaries.append(summary)
+        logger.info(f"Trace of {trace.name} {trace.turn_id}: {summary['ms']}")
+        if self.output:
+            try:
+                self._write(trace)
+            except OSError as e:
+                logger.warning(f"Write trace to {self.output} error: {e}")
+        return summary
+
+    def _write(self, trace: TurnTrace):
+        events = trace.chrome_events()
+        if self.output.endswith(".jsonl"):
+            line = {"turn": trace.turn_id, "traceEvents": events}
+            with open(self.output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+            return
+        path = os.path.join(self.output, f"{trace.name}-{int(time.time())}-{trace.turn_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": events, "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False,
+                default=str,
+            )
+
+    def stats(self) -> dict:
+        """Mean milliseconds and spans per category over the recent turns"""
+        totals: Dict[str, float] = defaultdict(float)
+        spans: Dict[str, int] = defaultdict(int)
+        for summary in self.summaries:
+            for category, ms in summary["ms"].items():
+                totals[category] += ms
+            for category, n in summary["count"].items():
+                spans[category] += n
+        count = len(self.summaries)
+        return {
+            "turns": count,
+            "mean_ms": {c: round(ms / count, 1) for c, ms in totals.items()} if count else {},
+            "mean_count": {c: round(n / count, 2) for c, n in spans.items()} if count else {},
+            "mean_turn_ms": round(sum(s["elapsed_ms"] for s in self.summaries) / count, 1)
+            if count
+            else None,
+        }
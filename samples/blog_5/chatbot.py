@@ -4,8 +4,10 @@ Chatbot implementation based on LlamaIndex and Qwen model
 """
 
 import os
+import re
 import logging
-from typing import Optional
+import threading
+from typing import List, Optional
 from llama_index.core import Settings
 from llama_index.llms.dashscope import DashScope
 from llama_index.core.llms import ChatMessage, MessageRole
@@ -20,6 +22,30 @@ from roles import (
 )
 from personality import personality_manager
 
+# CJK punctuation, kana, ideographs and full-width forms count ~1 token per character
+CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a voice assistant.
+Merge the existing summary and the new conversation turns into one updated summary.
+Keep facts about the user, their preferences, open questions and anything the assistant promised.
+Write in the language of the conversation, as plain text, no longer than {max_length} characters.
+
+Existing summary:
+{summary}
+
+New conversation turns:
+{transcript}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~1 token per CJK character, ~4 characters per token otherwise"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
 
 class ChatBot:
     """Chatbot based on LlamaIndex and Qwen model"""
@@ -87,6 +113,15 @@ class ChatBot:
 
         # For storing conversation history (using structured ChatMessage)
         self.conversation_history = []
+        # Full transcript for display, compaction only folds the history sent to the LLM
+        self.display_history = []
+
+        # Running summary of turns folded out of the history by compaction
+        self.history_summary = ""
+        self._history_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        # Bumped on reset so a running compaction does not restore old turns
+        self._history_generation = 0
 
         # Initialize model
         try:
@@ -159,8 +194,11 @@ class ChatBot:
                 role=MessageRole.ASSISTANT, content=response_text, additional_kwargs={}
             )
 
-            self.conversation_history.append(user_msg)
-            self.conversation_history.append(assistant_msg)
+            with self._history_lock:
+                self.conversation_history.append(user_msg)
+                self.conversation_history.append(assistant_msg)
+                self.display_history.append(user_msg)
+                self.display_history.append(assistant_msg)
 
             # Log conversation history length
             if self.logger:
@@ -168,6 +206,9 @@ class ChatBot:
                     f"Conversation history length: {len(self.conversation_history)}"
                 )
 
+            # The reply is already streamed, summarizing never delays the user
+            self._maybe_start_compaction()
+
         except Exception as e:
             error_msg = f"Error occurred: {str(e)}"
             if self.logger:
@@ -187,11 +228,26 @@ class ChatBot:
             )
         )
 
-        # Add conversation history (keep recent N rounds of conversation)
+        # Add the summary of compacted turns
+        with self._history_lock:
+            history_summary = self.history_summary
+            conversation_history = list(self.conversation_history)
+        if history_summary:
+            messages.append(
+                ChatMessage(
+                    role=MessageRole.SYSTEM,
+                    content=f"Summary of the earlier conversation:\n{history_summary}",
+                    additional_kwargs={},
+                )
+            )
+
+        # Add conversation history (keep recent N rounds of conversation);
+        # with compaction every turn not yet in the summary is sent
         recent_history = (
-            self.conversation_history[-self.config.max_history_length :]
-            if len(self.conversation_history) > self.config.max_history_length
-            else self.conversation_history
+            conversation_history[-self.config.max_history_length :]
+            if not self.config.enable_history_compaction
+            and len(conversation_history) > self.config.max_history_length
+            else conversation_history
         )
 
         # Clean history messages, completely remove tool_calls field and filter empty messages
@@ -202,12 +258,12 @@ class ChatBot:
             if not content.strip():  # Skip empty messages
                 continue
 
-            # Use model_construct to create cleanest messages
-            clean_msg = ChatMessage.model_construct(
+            # Rebuild as a plain text message; model_construct with blocks=[]
+            # would drop the content on llama-index versions that store text in blocks
+            clean_msg = ChatMessage(
                 role=msg.role,
                 content=content,
                 additional_kwargs={},
-                blocks=[],  # Ensure no extra block data
             )
             messages.append(clean_msg)
 
@@ -231,11 +287,97 @@ class ChatBot:
 
         return final_messages
 
+    def _history_tokens(self) -> int:
+        """Estimated tokens of the verbatim history"""
+        return sum(
+            estimate_tokens(msg.content or "") for msg in self.conversation_history
+        )
+
+    def _maybe_start_compaction(self):
+        """Fold older turns into the summary in a background thread if over a limit"""
+        if not self.config.enable_history_compaction:
+            return
+        with self._history_lock:
+            if self._compaction_thread and self._compaction_thread.is_alive():
+                return
+            history_tokens = self._history_tokens()
+            # Many short turns reach the message cap before the token threshold
+            if (
+                history_tokens <= self.config.compaction_threshold_tokens
+                and len(self.conversation_history) < self.config.max_history_length
+            ):
+                return
+            keep = self.config.compaction_keep_messages
+            # Fold whole turns only, the kept tail always starts with a user message
+            fold_count = max(len(self.conversation_history) - keep, 0)
+            fold_count -= fold_count % 2
+            if fold_count == 0:
+                return
+            self._compaction_thread = threading.Thread(
+                target=self._compact_history,
+                args=(
+                    list(self.conversation_history[:fold_count]),
+                    self.history_summary,
+                    self._history_generation,
+                ),
+                daemon=True,
+            )
+            self._compaction_thread.start()
+
+        if self.logger:
+            self.logger.info(
+                f"HISTORY COMPACTION: ~{history_tokens} tokens, folding {fold_count} messages"
+            )
+
+    def _compact_history(
+        self, folded: List[ChatMessage], summary: str, generation: int
+    ):
+        """Summarize the folded messages and drop them from the history sent to the LLM"""
+        transcript = "\n".join(f"{msg.role.value}: {msg.content}" for msg in folded)
+        prompt = SUMMARY_PROMPT.format(
+            max_length=self.config.summary_max_length,
+            summary=summary or "(none)",
+            transcript=transcript,
+        )
+        try:
+            response = self.llm.chat(
+                [
+                    ChatMessage(
+                        role=MessageRole.USER, content=prompt, additional_kwargs={}
+                    )
+                ]
+            )
+            new_summary = (response.message.content or "").strip()
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"HISTORY COMPACTION ERROR: {str(e)}")
+            return
+        if not new_summary:
+            return
+
+        with self._history_lock:
+            if generation != self._history_generation:
+                # Conversation was reset or switched while summarizing
+                return
+            self.history_summary = new_summary[: self.config.summary_max_length]
+            # Turns added while summarizing stay after the folded prefix
+            self.conversation_history = self.conversation_history[len(folded) :]
+
+        if self.logger:
+            self.logger.info(
+                f"HISTORY COMPACTION: summary {len(self.history_summary)} chars, "
+                f"{len(self.conversation_history)} messages kept"
+            )
+
     def reset_conversation(self):
         """Reset conversation history"""
         if self.logger:
             self.logger.info("CONVERSATION RESET: Clearing conversation history")
-        self.conversation_history = []
+        with self._history_lock:
+            self.conversation_history = []
+            self.display_history = []
+            self.history_summary = ""
+            self._history_generation += 1
 
     def get_role_info(self) -> dict:
         """Get current role information as dictionary"""
@@ -257,9 +399,11 @@ class ChatBot:
         }
 
     def get_conversation_history(self) -> list:
-        """Get conversation history as list of dictionaries"""
+        """Get conversation history as list of dictionaries, including compacted turns"""
+        with self._history_lock:
+            display_history = list(self.display_history)
         history = []
-        for message in self.conversation_history:
+        for message in display_history:
             history.append(
                 {
                     "role": message.role.value,
@@ -338,6 +482,8 @@ class ChatBot:
             "temperature": self.config.temperature,
             "max_tokens": self.config.max_tokens,
             "max_history_length": self.config.max_history_length,
+            "enable_history_compaction": self.config.enable_history_compaction,
+            "history_summary": self.history_summary,
             "assistant_name": self.config.assistant_name,
             "debug_mode": self.debug_mode,
             "current_role": self._get_role_description(),
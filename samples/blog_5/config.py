@@ -26,6 +26,14 @@ class ChatConfig:
     # Conversation management
     max_history_length: int = 20
 
+    # History compaction: once the history exceeds the token threshold or
+    # max_history_length messages, older turns are folded into a running
+    # summary in the background
+    enable_history_compaction: bool = False
+    compaction_threshold_tokens: int = 2000
+    compaction_keep_messages: int = 4
+    summary_max_length: int = 300
+
     # System configuration
     assistant_name: str = "AI Assistant"
     enable_debug: bool = False
@@ -59,6 +67,21 @@ class ChatConfig:
                 f"Max tokens should be between 1-32000, current value: {self.max_tokens}"
             )
 
+        if self.compaction_threshold_tokens < 100:
+            raise ValueError(
+                f"Compaction threshold should be at least 100 tokens, current value: {self.compaction_threshold_tokens}"
+            )
+
+        if self.compaction_keep_messages < 0:
+            raise ValueError(
+                f"Compaction keep messages cannot be negative, current value: {self.compaction_keep_messages}"
+            )
+
+        if not 20 <= self.summary_max_length <= 4000:
+            raise ValueError(
+                f"Summary max length should be between 20-4000, current value: {self.summary_max_length}"
+            )
+
         if not self.assistant_name.strip():
             raise ValueError("Assistant name cannot be empty")
 
@@ -80,6 +103,14 @@ class ChatConfig:
             temperature=cls._get_env_float("TEMPERATURE", 0.7),
             max_tokens=cls._get_env_int("MAX_TOKENS", 2048),
             max_history_length=cls._get_env_int("MAX_HISTORY_LENGTH", 20),
+            enable_history_compaction=cls._get_env_bool(
+                "ENABLE_HISTORY_COMPACTION", False
+            ),
+            compaction_threshold_tokens=cls._get_env_int(
+                "COMPACTION_THRESHOLD_TOKENS", 2000
+            ),
+            compaction_keep_messages=cls._get_env_int("COMPACTION_KEEP_MESSAGES", 4),
+            summary_max_length=cls._get_env_int("SUMMARY_MAX_LENGTH", 300),
             assistant_name=os.getenv("ASSISTANT_NAME", "AI Assistant"),
             enable_debug=cls._get_env_bool("DEBUG", False),
             enable_conversation_logging=cls._get_env_bool(
@@ -143,6 +174,10 @@ class ChatConfig:
             "temperature": self.temperature,
             "max_tokens": self.max_tokens,
             "max_history_length": self.max_history_length,
+            "enable_history_compaction": self.enable_history_compaction,
+            "compaction_threshold_tokens": self.compaction_threshold_tokens,
+            "compaction_keep_messages": self.compaction_keep_messages,
+            "summary_max_length": self.summary_max_length,
             "assistant_name": self.assistant_name,
             "enable_debug": self.enable_debug,
             "enable_conversation_logging": self.enable_conversation_logging,
@@ -156,6 +191,10 @@ class ChatConfig:
         config_info.append(f"Temperature: {self.temperature}")
         config_info.append(f"Max Tokens: {self.max_tokens}")
         config_info.append(f"History Length: {self.max_history_length}")
+        if self.enable_history_compaction:
+            config_info.append(
+                f"Compaction: >{self.compaction_threshold_tokens} tokens"
+            )
         config_info.append(f"Assistant Name: {self.assistant_name}")
         if self.enable_debug:
             config_info.append("Debug Mode: Enabled")
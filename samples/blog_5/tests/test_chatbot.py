@@ -0,0 +1,83 @@
+"""
+History compaction keeps every turn in the summary or the prompt
+
+Run from samples/blog_5:
+    uv run python -m unittest discover tests
+"""
+
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+try:
+    from llama_index.core.llms import MessageRole
+
+    from chatbot import ChatBot
+    from config import ChatConfig
+except ImportError:  # pragma: no cover - dependencies of the sample not installed
+    ChatBot = None
+
+
+class FakeLLM:
+    """Replies "ok" and "summarizes" by keeping every user line of the prompt"""
+
+    def __init__(self):
+        self.requests = []
+
+    def stream_chat(self, messages):
+        self.requests.append(messages)
+        yield types.SimpleNamespace(delta="ok")
+
+    def chat(self, messages):
+        prompt = messages[-1].content
+        summary, transcript = prompt.split("New conversation turns:\n")
+        previous = summary.split("Existing summary:\n")[1].split("\n\n")[0]
+        kept = [] if previous == "(none)" else [previous]
+        kept += [line for line in transcript.splitlines() if line.startswith("user: ")]
+        return types.SimpleNamespace(message=types.SimpleNamespace(content="\n".join(kept)))
+
+
+@unittest.skipIf(ChatBot is None, "blog_5 dependencies are not installed")
+class HistoryCompactionTest(unittest.TestCase):
+    def setUp(self):
+        config = ChatConfig(
+            api_key="sk-test",
+            enable_history_compaction=True,
+            summary_max_length=4000,
+            enable_conversation_logging=False,
+        )
+        self.chatbot = ChatBot(config=config)
+        self.llm = FakeLLM()
+        self.chatbot.llm = self.llm
+
+    def chat(self, message: str):
+        list(self.chatbot.stream_chat(message))
+        # Compaction runs in the background, wait for it between turns
+        thread = self.chatbot._compaction_thread
+        if thread is not None:
+            thread.join()
+
+    def test_short_turns_are_not_lost(self):
+        # Far below the token threshold, but more messages than max_history_length
+        for i in range(25):
+            self.chat(f"turn {i}")
+        self.chat("last")
+
+        prompt = self.llm.requests[-1]
+        seen = "\n".join(str(msg.content) for msg in prompt)
+        for i in range(25):
+            self.assertIn(f"turn {i}\n", seen + "\n")
+        self.assertTrue(self.chatbot.history_summary)
+        self.assertEqual(prompt[1].role, MessageRole.SYSTEM)
+        self.assertLessEqual(
+            len(self.chatbot.conversation_history), self.chatbot.config.max_history_length
+        )
+        # The displayed transcript keeps everything
+        self.assertEqual(len(self.chatbot.get_conversation_history()), 52)
+
+
+if __name__ == "__main__":
+    unittest.main()
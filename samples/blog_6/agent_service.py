@@ -0,0 +1,386 @@
+"""
+Multi-session agent service
+
+Serves many users from one process: a single MqttTransportClient, tool
+registry, LLM and agent workflow are shared, and every session only owns its
+conversation history. Requests arrive over HTTP or MQTT:
+
+    POST /sessions/{session_id}/chat     {"message": "...", "stream": false}
+    DELETE /sessions/{session_id}
+    GET /stats
+
+    mcp-agent/request/{session_id}       {"message": "..."} or plain text
+    mcp-agent/response/{session_id}      ChatEvent JSON, one message per event
+
+Sessions idle longer than AGENT_SESSION_IDLE_TIMEOUT are dropped, and the
+least recently used ones are evicted once AGENT_MAX_SESSIONS or the total
+history budget (AGENT_MAX_HISTORY_TOKENS, estimated tokens across sessions)
+is exceeded.
+
+Usage:
+    uv run python agent_service.py
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Optional
+
+import anyio
+import paho.mqtt.client as paho
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+import mcp.client.mqtt as mcp_mqtt
+
+from history import ConversationHistory
+from main import (
+    HISTORY_TOKEN_BUDGET,
+    MCP_IDLE_TIMEOUT,
+    MCP_LAZY_INIT,
+    MCP_MIN_SERVERS,
+    MCP_SERVERS,
+    MCP_WAIT_TIMEOUT,
+    MQTT_BROKER_HOST,
+    ChatEvent,
+    ConversationalAgent,
+    batch_client,
+    dispatcher,
+    on_mcp_connect,
+    on_mcp_disconnect,
+    on_mcp_server_discovered,
+    readiness,
+    registry,
+    server_health,
+)
+
+logger = logging.getLogger(__name__)
+
+AGENT_HTTP_HOST = os.getenv("AGENT_HTTP_HOST", "0.0.0.0")
+AGENT_HTTP_PORT = int(os.getenv("AGENT_HTTP_PORT", "8002"))
+# Set AGENT_REQUEST_TOPIC=off to serve HTTP only
+AGENT_REQUEST_TOPIC = os.getenv("AGENT_REQUEST_TOPIC", "mcp-agent/request/+")
+AGENT_RESPONSE_TOPIC = os.getenv("AGENT_RESPONSE_TOPIC", "mcp-agent/response/{session_id}")
+
+AGENT_SESSION_IDLE_TIMEOUT = float(os.getenv("AGENT_SESSION_IDLE_TIMEOUT", "600"))
+AGENT_MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "1000"))
+AGENT_MAX_HISTORY_TOKENS = int(os.getenv("AGENT_MAX_HISTORY_TOKENS", "2000000"))
+
+
+@dataclass
+class Session:
+    session_id: str
+    history: ConversationHistory
+    # One turn at a time per session, turns of different sessions run concurrently
+    lock: anyio.Lock = field(default_factory=anyio.Lock)
+    created: float = field(default_factory=time.monotonic)
+    last_active: float = field(default_factory=time.monotonic)
+    turns: int = 0
+
+
+class SessionManager:
+    """Per-session histories on top of one shared ConversationalAgent"""
+
+    def __init__(
+        self,
+        agent: ConversationalAgent,
+        max_sessions: int = AGENT_MAX_SESSIONS,
+        idle_timeout: float = AGENT_SESSION_IDLE_TIMEOUT,
+        max_history_tokens: int = AGENT_MAX_HISTORY_TOKENS,
+        history_token_budget: int = HISTORY_TOKEN_BUDGET,
+    ):
+        self.agent = agent
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_history_tokens = max_history_tokens
+        self.history_token_budget = history_token_budget
+        # Least recently used first
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        self.turns = 0
+
+    def get(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = Session(
+                session_id,
+                ConversationHistory(
+                    max_messages=self.agent.max_history_length,
+                    max_tokens=self.history_token_budget,
+                ),
+            )
+            self.sessions[session_id] = session
+            self.enforce_limits(keep=session_id)
+        else:
+            self.sessions.move_to_end(session_id)
+        session.last_active = time.monotonic()
+        return session
+
+    def close(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def history_tokens(self) -> int:
+        return sum(session.history.total_tokens for session in self.sessions.values())
+
+    def enforce_limits(self, keep: Optional[str] = None):
+        """
+        Evict least recently used idle sessions over the count or history budget
+
+        `keep` is never evicted: the session being created, whose turn is about to
+        start even if every other session is mid-turn.
+        """
+        total_tokens = self.history_tokens()
+        for session_id in list(self.sessions):
+            if (
+                len(self.sessions) <= self.max_sessions
+                and total_tokens <= self.max_history_tokens
+            ):
+                break
+            session = self.sessions[session_id]
+            if session.lock.locked() or session_id == keep:
+                # Mid-turn, its reply still needs the history
+                continue
+            del self.sessions[session_id]
+            total_tokens -= session.history.total_tokens
+            self.evicted_capacity += 1
+            logger.info(f"Evicted session {session_id} ({len(self.sessions)} left)")
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [
+            session_id
+            for session_id, session in self.sessions.items()
+            if session.last_active < cutoff and not session.lock.locked()
+        ]
+        for session_id in idle:
+            del self.sessions[session_id]
+        self.evicted_idle += len(idle)
+        if idle:
+            logger.info(f"Dropped {len(idle)} idle sessions ({len(self.sessions)} left)")
+        return len(idle)
+
+    async def run_evictor(self, interval: float = 30.0):
+        while True:
+            await anyio.sleep(interval)
+            self.evict_idle()
+
+    async def chat_stream(self, session_id: str, message: str) -> AsyncIterator[ChatEvent]:
+        session = self.get(session_id)
+        async with session.lock:
+            async for event in self.agent.chat_stream(message, session.history):
+                yield event
+            session.turns += 1
+            session.last_active = time.monotonic()
+        self.turns += 1
+        self.enforce_limits()
+
+    async def chat(self, session_id: str, message: str) -> ChatEvent:
+        done = None
+        async for event in self.chat_stream(session_id, message):
+            if event.type == "done":
+                done = event
+        return done
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "active": sum(1 for s in self.sessions.values() if s.lock.locked()),
+            "turns": self.turns,
+            "history_tokens": self.history_tokens(),
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
+
+
+class ChatRequest(BaseModel):
+    message: str
+    stream: bool = False
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    response: str
+    ttft: Optional[float] = None
+    elapsed: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+
+
+def create_app(manager: SessionManager) -> FastAPI:
+    app = FastAPI(
+        title="ESP32 MCP Agent Service",
+        description="Multi-session conversational agent over one MCP-over-MQTT client",
+        version="1.0.0",
+    )
+
+    @app.post("/sessions/{session_id}/chat", response_model=ChatResponse)
+    async def chat(session_id: str, request: ChatRequest):
+        message = request.message.strip()
+        if not message:
+            raise HTTPException(status_code=400, detail="Message cannot be empty")
+
+        if request.stream:
+
+            async def events():
+                async for event in manager.chat_stream(session_id, message):
+                    yield f"data: {json.dumps(asdict(event), ensure_ascii=False)}\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        done = await manager.chat(session_id, message)
+        return ChatResponse(
+            session_id=session_id,
+            response=done.text,
+            ttft=done.ttft,
+            elapsed=done.elapsed,
+            prompt_tokens=done.prompt_tokens,
+        )
+
+    @app.delete("/sessions/{session_id}")
+    async def close_session(session_id: str):
+        if not manager.close(session_id):
+            raise HTTPException(status_code=404, detail="Unknown session")
+        return {"closed": session_id}
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "sessions": manager.stats(),
+            "tools": dispatcher.summary(),
+            "traces": manager.agent.tracer.stats(),
+            "tool_arguments": manager.agent.tool_registry.argument_stats.stats(),
+            "tool_selection": (
+                manager.agent.tool_selector.stats() if manager.agent.tool_selector else None
+            ),
+            "mcp_servers": readiness.stats(),
+            "circuits": server_health.stats() if server_health is not None else None,
+            "tool_batches": dispatcher.batch_stats() if batch_client is not None else None,
+        }
+
+    return app
+
+
+class MqttRequestBridge:
+    """Take chat requests from an MQTT topic and publish the events of each turn"""
+
+    def __init__(
+        self,
+        manager: SessionManager,
+        host: str = "localhost",
+        port: int = 1883,
+        request_topic: str = AGENT_REQUEST_TOPIC,
+        response_topic: str = AGENT_RESPONSE_TOPIC,
+    ):
+        self.manager = manager
+        self.request_topic = request_topic
+        self.response_topic = response_topic
+        self.host = host
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client = paho.Client(paho.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        # Non-blocking connect, the network loop runs in paho's own thread
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        client.subscribe(self.request_topic, qos=1)
+
+    def _on_message(self, client, userdata, message):
+        # Called in paho's thread, the turn itself runs on the event loop
+        session_id = message.topic.rsplit("/", 1)[-1]
+        text = message.payload.decode("utf-8", errors="replace")
+        try:
+            payload = json.loads(text)
+            if isinstance(payload, dict):
+                text = str(payload.get("message", ""))
+        except ValueError:
+            pass
+        if text.strip():
+            asyncio.run_coroutine_threadsafe(self.handle(session_id, text.strip()), self.loop)
+
+    async def handle(self, session_id: str, message: str):
+        topic = self.response_topic.format(session_id=session_id)
+        try:
+            async for event in self.manager.chat_stream(session_id, message):
+                self.client.publish(topic, json.dumps(asdict(event), ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"MQTT request of session {session_id} failed: {e}")
+            self.client.publish(
+                topic, json.dumps(asdict(ChatEvent(type="done", text=f"error: {e}")))
+            )
+
+
+async def main():
+    import uvicorn
+
+    async with mcp_mqtt.MqttTransportClient(
+        "agent_service",
+        auto_connect_to_mcp_server=not MCP_LAZY_INIT,
+        on_mcp_server_discovered=on_mcp_server_discovered,
+        on_mcp_connect=on_mcp_connect,
+        on_mcp_disconnect=on_mcp_disconnect,
+        mqtt_options=mcp_mqtt.MqttOptions(
+            host=MQTT_BROKER_HOST,
+        ),
+    ) as mcp_client:
+        registry.client = mcp_client
+        dispatcher.client = mcp_client
+        readiness.client = mcp_client
+        if batch_client is not None:
+            batch_client.start()
+        cached_servers = registry.load_cached()
+        await mcp_client.start()
+        if MCP_LAZY_INIT and MCP_SERVERS and set(MCP_SERVERS) <= set(cached_servers):
+            # Tools are known from the cache, the devices connect on their first call
+            logger.info(f"Starting with cached tools of {cached_servers}")
+        elif not await readiness.wait_for(
+            MCP_SERVERS, min_servers=MCP_MIN_SERVERS, timeout=MCP_WAIT_TIMEOUT
+        ):
+            logger.warning(
+                f"Timed out after {MCP_WAIT_TIMEOUT}s waiting for {MCP_SERVERS}, "
+                f"connected: {sorted(readiness.connected)}"
+            )
+
+        agent = ConversationalAgent(mcp_client, registry)
+        await agent.load_mcp_tools()
+        manager = SessionManager(agent)
+
+        bridge = None
+        if AGENT_REQUEST_TOPIC != "off":
+            bridge = MqttRequestBridge(manager, MQTT_BROKER_HOST)
+            bridge.start()
+
+        server = uvicorn.Server(
+            uvicorn.Config(
+                create_app(manager), host=AGENT_HTTP_HOST, port=AGENT_HTTP_PORT
+            )
+        )
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(manager.run_evictor)
+            if MCP_LAZY_INIT and MCP_IDLE_TIMEOUT > 0:
+                tg.start_soon(readiness.run_evictor, MCP_IDLE_TIMEOUT)
+            await server.serve()
+            tg.cancel_scope.cancel()
+
+        if bridge:
+            bridge.close()
+        if batch_client is not None:
+            batch_client.close()
+
+
+if __name__ == "__main__":
+    anyio.run(main)
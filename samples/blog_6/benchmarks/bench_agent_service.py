@@ -0,0 +1,161 @@
+"""
+Throughput of the multi-session agent service
+
+Starts the fake OpenAI-compatible upstream (benchmarks/fake_upstream.py),
+points the shared ConversationalAgent at it and drives N concurrent sessions
+through SessionManager, each sending --turns turns one after another. Reports
+turns/sec, turn latency and time to first token percentiles, and the memory
+each session costs compared with giving every user their own agent.
+
+Usage:
+    uv run python benchmarks/bench_agent_service.py [--sessions 100,250] [--turns 3]
+"""
+
+import argparse
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import anyio
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def wait_ready(url: str, timeout: float = 20.0):
+    async with httpx.AsyncClient() as client:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await anyio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up in {timeout}s")
+
+
+def memory_per_instance(factory, count: int = 50) -> float:
+    """Average bytes allocated by one instance built by factory"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    instances = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del instances
+    return size / count
+
+
+async def run_sessions(manager, n_sessions: int, turns: int):
+    latencies, ttfts, errors = [], [], 0
+
+    async def session(i: int):
+        nonlocal errors
+        for turn in range(turns):
+            done = await manager.chat(f"session-{i}", f"user {i} turn {turn}: 今天天气怎么样")
+            if done.text.startswith("error:"):
+                errors += 1
+            latencies.append(done.elapsed)
+            if done.ttft is not None:
+                ttfts.append(done.ttft)
+
+    start = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        for i in range(n_sessions):
+            tg.start_soon(session, i)
+    return latencies, ttfts, errors, time.perf_counter() - start
+
+
+async def run(args):
+    from agent_service import SessionManager
+    from main import ConversationalAgent
+
+    await wait_ready(f"http://127.0.0.1:{args.upstream_port}/stats")
+    agent = ConversationalAgent()
+    await agent.load_mcp_tools()
+    agent.get_workflow()
+
+    print(
+        f"{'sessions':>9}{'turns':>7}{'turns/s':>9}{'p50 ms':>8}{'p95 ms':>8}"
+        f"{'ttft p50':>10}{'history tok':>13}{'rss MiB':>9}{'err':>5}"
+    )
+    for n_sessions in args.sessions:
+        manager = SessionManager(agent)
+        latencies, ttfts, errors, elapsed = await run_sessions(
+            manager, n_sessions, args.turns
+        )
+        total = n_sessions * args.turns
+        stats = manager.stats()
+        print(
+            f"{n_sessions:>9}{total:>7}{total / elapsed:>9.1f}"
+            f"{percentile(latencies, 0.5) * 1000:>8.0f}"
+            f"{percentile(latencies, 0.95) * 1000:>8.0f}"
+            f"{percentile(ttfts, 0.5) * 1000 if ttfts else 0:>10.0f}"
+            f"{stats['history_tokens']:>13}"
+            f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>9.0f}{errors:>5}"
+        )
+
+    manager = SessionManager(agent)
+    per_session = memory_per_instance(lambda i: manager.get(f"mem-{i}"))
+
+    def own_agent(i):
+        instance = ConversationalAgent()
+        instance.get_workflow()
+        return instance
+
+    per_agent = memory_per_instance(own_agent)
+    print(
+        f"\nmemory per session: {per_session / 1024:.1f} KiB shared agent, "
+        f"{per_agent / 1024:.1f} KiB with an agent per user"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session agent throughput")
+    parser.add_argument("--upstream-port", type=int, default=9002)
+    parser.add_argument("--latency", type=float, default=0.4, help="upstream seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="upstream tokens per second")
+    parser.add_argument("--tokens", type=int, default=20, help="upstream completion tokens")
+    parser.add_argument(
+        "--sessions",
+        type=lambda s: [int(c) for c in s.split(",")],
+        default=[100, 250],
+    )
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    args = parser.parse_args()
+
+    os.environ.setdefault("YOUR_API_KEY_FROM_CLOUD_SILICONFLOW_CN", "sk-bench")
+    os.environ["AGENT_LLM_API_BASE"] = (
+        f"http://127.0.0.1:{args.upstream_port}/v1/chat/completions"
+    )
+    upstream = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCH_DIR, "fake_upstream.py"),
+            "--port", str(args.upstream_port),
+            "--latency", str(args.latency),
+            "--token-rate", str(args.token_rate),
+            "--tokens", str(args.tokens),
+        ]
+    )
+    try:
+        anyio.run(run, args)
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == "__main__":
+    # Per-turn INFO logs of main.py would dominate the measurement
+    logging.disable(logging.INFO)
+    main()
@@ -0,0 +1,88 @@
+"""
+Per-turn setup overhead of ConversationalAgent in main.py
+
+Compares building the AgentWorkflow on every turn (the old behaviour) with
+the cached workflow returned by ConversationalAgent.get_workflow(), for
+several tool catalog sizes. Only local setup work is timed, no LLM or MQTT
+round trips are made.
+
+Usage:
+    uv run python benchmarks/bench_agent_turn.py [--turns 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("YOUR_API_KEY_FROM_CLOUD_SILICONFLOW_CN", "sk-bench")
+
+from llama_index.core.agent.workflow import AgentWorkflow  # noqa: E402
+from llama_index.core.tools import FunctionTool  # noqa: E402
+
+from main import ConversationalAgent  # noqa: E402
+
+
+def make_tools(count: int) -> list:
+    tools = []
+    for i in range(count):
+
+        async def tool_fn(**kwargs):
+            return "ok"
+
+        tools.append(
+            FunctionTool.from_defaults(
+                fn=tool_fn,
+                async_fn=tool_fn,
+                name=f"mcp_tool_{i}",
+                description=f"Synthetic device tool number {i}",
+            )
+        )
+    return tools
+
+
+def time_turns(turns: int, prepare) -> float:
+    samples = []
+    for i in range(turns):
+        start = time.perf_counter()
+        prepare(f"turn {i}")
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn agent setup overhead")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    agent = ConversationalAgent()
+
+    def rebuild_every_turn(message):
+        workflow = AgentWorkflow.from_tools_or_functions(
+            tools_or_functions=agent.tools,
+            llm=agent.llm,
+            system_prompt=agent.system_prompt,
+            verbose=False,
+            timeout=180,
+        )
+        agent._build_chat_messages(message)
+        return workflow
+
+    def cached_workflow(message):
+        workflow = agent.get_workflow()
+        agent._build_chat_messages(message)
+        return workflow
+
+    print(f"{'tools':>6}{'rebuild us/turn':>18}{'cached us/turn':>17}{'speedup':>10}")
+    for count in (2, 10, 50, 200):
+        agent.tools = make_tools(count)
+        agent.workflows.clear()
+        before = time_turns(args.turns, rebuild_every_turn)
+        after = time_turns(args.turns, cached_workflow)
+        print(f"{count:>6}{before:>18.0f}{after:>17.0f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Prompt size of binary tool results
+
+Formats tool results carrying an image or an embedded binary resource of
+increasing size, once the old way (the resource repr went into the prompt)
+and once through format_call_result with a BlobStore, and prints the
+characters and estimated tokens the LLM would receive.
+
+Usage:
+    uv run python benchmarks/bench_blob_results.py [--sizes 1,16,256,1024]
+"""
+
+import argparse
+import base64
+import os
+import sys
+import time
+
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blob_store import BlobStore  # noqa: E402
+from history import estimate_tokens  # noqa: E402
+from mcp_tools import format_call_result  # noqa: E402
+
+
+def legacy_format(result: types.CallToolResult) -> str:
+    parts = []
+    for item in result.content:
+        if item.type == "text":
+            parts.append(item.text)
+        elif item.type == "image":
+            parts.append(f"[image: {item.mimeType}]")
+        elif item.type == "resource":
+            parts.append(f"[resource: {item.resource}]")
+    return "\n".join(parts)
+
+
+def make_result(kind: str, size: int) -> types.CallToolResult:
+    data = base64.b64encode(os.urandom(size)).decode()
+    if kind == "image":
+        item = types.ImageContent(type="image", data=data, mimeType="image/jpeg")
+    else:
+        item = types.EmbeddedResource(
+            type="resource",
+            resource=types.BlobResourceContents(
+                uri="file:///sdcard/capture.bin",
+                mimeType="application/octet-stream",
+                blob=data,
+            ),
+        )
+    return types.CallToolResult(
+        content=[types.TextContent(type="text", text="capture done"), item]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt size of binary tool results")
+    parser.add_argument(
+        "--sizes",
+        type=lambda s: [int(c) for c in s.split(",")],
+        default=[1, 16, 256, 1024],
+        help="payload sizes in KiB",
+    )
+    args = parser.parse_args()
+
+    store = BlobStore()
+    print(
+        f"{'kind':<9}{'KiB':>6}{'old chars':>11}{'old tokens':>12}"
+        f"{'new chars':>11}{'new tokens':>12}{'format ms':>11}"
+    )
+    for kind in ("image", "resource"):
+        for kib in args.sizes:
+            result = make_result(kind, kib * 1024)
+            old = legacy_format(result)
+            start = time.perf_counter()
+            new = format_call_result("take_photo", result, store)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(
+                f"{kind:<9}{kib:>6}{len(old):>11}{estimate_tokens(old):>12}"
+                f"{len(new):>11}{estimate_tokens(new):>12}{elapsed:>11.2f}"
+            )
+    print(f"\nblob store: {store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Turn latency with a flaky device, with and without the circuit breaker
+
+Simulates --devices ESP32 servers behind the tool registry and dispatcher.
+Device 0 drops off Wi-Fi for --outage seconds every --period seconds: calls
+sent to it meanwhile are never answered and run into the dispatcher timeout.
+Its presence loss is reported --detect-delay seconds later (the broker
+publishes the will after 1.5x the keepalive), its return right away; the
+tools stay registered, as they do when restored from the tool schema cache.
+
+Each turn is an LLM step, a call to set_volume on a random device, up to
+--retries more steps and calls if the tool reported a failure (LLMs tend to
+try again), and a final LLM step. Turns start every --interval seconds.
+
+Latency alone flatters the breaker: its failures are instant, so the
+retries of a turn are used up within a few LLM steps instead of spanning
+the outage, and turns that would have reached the device once it came back
+fail instead. The share of successful turns is reported next to the
+latencies, for the flaky device and overall. That is why the agents only
+enable the breaker with CIRCUIT_BREAKER=on.
+
+Usage:
+    uv run python benchmarks/bench_circuit_breaker.py [--turns 100] [--timeout 2] [--outage 6]
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+import anyio
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from esp32_sim import firmware_tools, tool_list  # noqa: E402
+from mcp_tools import ToolRegistry, namespaced_tool_name  # noqa: E402
+from server_health import ServerHealth  # noqa: E402
+from tool_dispatch import ToolDispatcher  # noqa: E402
+
+
+class FlakyFleetClient:
+    """Answers call_tool after --rtt, except for device 0 while it is offline"""
+
+    def __init__(self, devices, rtt: float, period: float, outage: float):
+        self.devices = devices
+        self.rtt = rtt
+        self.period = period
+        self.outage = outage
+        self.start = time.monotonic()
+
+    def online(self, server_name: str) -> bool:
+        if server_name != self.devices[0]:
+            return True
+        # Online for the first part of each period, offline for the last `outage` seconds
+        return (time.monotonic() - self.start) % self.period < self.period - self.outage
+
+    async def call_tool(self, server_name, name, arguments=None):
+        if not self.online(server_name):
+            # The request is lost, nothing ever answers
+            await anyio.sleep_forever()
+        await anyio.sleep(self.rtt)
+        return types.CallToolResult(
+            content=[types.TextContent(type="text", text="Volume set successfully")]
+        )
+
+
+async def report_presence(client: FlakyFleetClient, health: ServerHealth, detect_delay: float):
+    """Feed presence changes of the flaky device to the health tracker"""
+    flaky = client.devices[0]
+    online_for = client.period - client.outage
+    cycle = 0
+    while True:
+        offline_at = client.start + cycle * client.period + online_for
+        await anyio.sleep(max(0.0, offline_at + detect_delay - time.monotonic()))
+        health.mark_offline(flaky)
+        back_at = client.start + (cycle + 1) * client.period
+        await anyio.sleep(max(0.0, back_at - time.monotonic()))
+        health.mark_online(flaky)
+        cycle += 1
+
+
+def failed(text: str) -> bool:
+    return text.startswith("call ") and ("failed" in text or "error" in text)
+
+
+async def run_mode(args, breaker: bool) -> dict:
+    devices = [f"ESP32 Device {i}" for i in range(args.devices)]
+    client = FlakyFleetClient(devices, args.rtt, args.period, args.outage)
+    health = (
+        ServerHealth(args.failures, args.slow_call, args.reset_timeout) if breaker else None
+    )
+    dispatcher = ToolDispatcher(client, timeout=args.timeout)
+    registry = ToolRegistry(client, dispatcher=dispatcher, health=health)
+    tools = [types.Tool.model_validate(tool) for tool in tool_list(firmware_tools())]
+    for server_name in devices:
+        registry.update_server(server_name, tools)
+    by_name = {tool.metadata.name: tool for tool in registry.snapshot()}
+
+    rng = random.Random(0)
+    results = []
+
+    async def turn(server_name: str):
+        tool = by_name[namespaced_tool_name(server_name, "set_volume")]
+        start = time.perf_counter()
+        ok = False
+        for _ in range(args.retries + 1):
+            await anyio.sleep(args.llm_latency)
+            text = await tool.acall(volume=40)
+            if not failed(str(text)):
+                ok = True
+                break
+        await anyio.sleep(args.llm_latency)
+        results.append((server_name == devices[0], time.perf_counter() - start, ok))
+
+    async with anyio.create_task_group() as tg:
+        if health is not None:
+            tg.start_soon(report_presence, client, health, args.detect_delay)
+        async with anyio.create_task_group() as turns:
+            for _ in range(args.turns):
+                turns.start_soon(turn, rng.choice(devices))
+                await anyio.sleep(args.interval)
+        tg.cancel_scope.cancel()
+
+    flaky = sorted(elapsed for is_flaky, elapsed, _ in results if is_flaky)
+    flaky_ok = [ok for is_flaky, _, ok in results if is_flaky]
+    healthy = sorted(elapsed for is_flaky, elapsed, _ in results if not is_flaky)
+    return {
+        "flaky_turns": len(flaky),
+        "p50": statistics.median(flaky),
+        "p95": flaky[max(0, int(len(flaky) * 0.95) - 1)],
+        "max": flaky[-1],
+        "healthy_p50": statistics.median(healthy),
+        "flaky_ok": sum(flaky_ok) / len(flaky_ok),
+        "ok": sum(ok for _, _, ok in results) / len(results),
+        "rejected": sum(s["rejected"] for s in health.stats().values()) if health else 0,
+    }
+
+
+async def run(args):
+    print(
+        f"{args.devices} devices, device 0 offline {args.outage:.0f}s of every "
+        f"{args.period:.0f}s, call timeout {args.timeout:.1f}s, {args.retries} retries"
+    )
+    print(
+        f"{'breaker':>8}{'flaky turns':>13}{'p50 s':>8}{'p95 s':>8}{'max s':>8}"
+        f"{'flaky ok':>10}{'others p50 s':>14}{'all ok':>8}{'fast fails':>12}"
+    )
+    for breaker in (False, True):
+        r = await run_mode(args, breaker)
+        print(
+            f"{'on' if breaker else 'off':>8}{r['flaky_turns']:>13}{r['p50']:>8.2f}"
+            f"{r['p95']:>8.2f}{r['max']:>8.2f}{r['flaky_ok']:>10.0%}"
+            f"{r['healthy_p50']:>14.2f}{r['ok']:>8.0%}{r['rejected']:>12}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Circuit breaker for a flaky device")
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between turns")
+    parser.add_argument("--rtt", type=float, default=0.03, help="call_tool round trip, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per LLM step")
+    parser.add_argument("--retries", type=int, default=2, help="LLM retries of a failed call")
+    parser.add_argument("--timeout", type=float, default=2.0, help="dispatcher call timeout")
+    parser.add_argument("--period", type=float, default=10.0)
+    parser.add_argument("--outage", type=float, default=6.0)
+    parser.add_argument("--detect-delay", type=float, default=3.0)
+    parser.add_argument("--failures", type=int, default=2, help="failures that open a circuit")
+    parser.add_argument("--slow-call", type=float, default=1.0)
+    parser.add_argument("--reset-timeout", type=float, default=3.0)
+    args = parser.parse_args()
+    # Timeouts and open circuits are expected here
+    logging.disable(logging.ERROR)
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
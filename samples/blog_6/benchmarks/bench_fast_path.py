@@ -0,0 +1,109 @@
+"""
+Fast path hit rate and latency for simple device commands
+
+Builds IntentFastPath over a simulated device exposing the firmware's
+set_volume tool, runs a set of commands that should and should not take the
+fast path, and reports the hit rate, the matching cost, and the turn
+latency of the fast path (one tool round trip) versus the modelled agent
+path (two LLM calls around the same tool round trip).
+
+Usage:
+    uv run python benchmarks/bench_fast_path.py [--rtt 0.05] [--llm-latency 0.8]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import anyio
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_tool_registry import SimulatedFleetClient  # noqa: E402
+from fast_path import IntentFastPath  # noqa: E402
+from mcp_tools import ToolRegistry  # noqa: E402
+
+SET_VOLUME = types.Tool(
+    name="set_volume",
+    description="Set the speaker volume",
+    inputSchema={
+        "type": "object",
+        "properties": {"volume": {"type": "integer", "description": "Volume level (0-100)"}},
+        "required": ["volume"],
+    },
+)
+
+# (message, should take the fast path)
+COMMANDS = [
+    ("volume 40", True),
+    ("set volume to 75", True),
+    ("Set the volume to 10 please", True),
+    ("set_volume 60", True),
+    ("把音量调到30", True),
+    ("音量调到三十", True),
+    ("声音设置为八十吧", True),
+    ("请把音量设为100", True),
+    ("音量50", True),
+    ("volume 140", False),
+    ("volume 4.5", False),
+    ("音量大一点", False),
+    ("把音量调到30，然后拍张照片", False),
+    ("为什么音量调到30还是很小？", False),
+    ("你好", False),
+    ("what is the volume", False),
+]
+
+
+async def run(args):
+    client = SimulatedFleetClient(1, args.rtt, tools_per_server=0)
+    client.tools = {"ESP32 Device": [SET_VOLUME]}
+    registry = ToolRegistry(client)
+    await registry.refresh_all(list(client.tools))
+    fast_path = IntentFastPath(registry)
+
+    wrong = []
+    for message, expected in COMMANDS:
+        match = fast_path.match(message)
+        if (match is not None) != expected:
+            wrong.append(message)
+        print(f"  {'hit' if match else 'miss':<6}{str(match.arguments if match else ''):<18}{message}")
+
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        fast_path.match(COMMANDS[i % len(COMMANDS)][0])
+    match_us = (time.perf_counter() - start) / args.iterations * 1e6
+
+    latencies = []
+    for message, expected in COMMANDS:
+        if not expected:
+            continue
+        start = time.perf_counter()
+        await fast_path.handle(message)
+        latencies.append(time.perf_counter() - start)
+    fast_ms = statistics.median(latencies) * 1000
+    agent_ms = (2 * args.llm_latency + args.rtt) * 1000
+
+    hits = sum(1 for _, expected in COMMANDS if expected)
+    print(f"\nclassified as expected: {len(COMMANDS) - len(wrong)}/{len(COMMANDS)} {wrong}")
+    print(f"fast path share of this set: {hits}/{len(COMMANDS)}")
+    print(f"match cost: {match_us:.1f} us/message")
+    print(f"turn latency p50: fast path {fast_ms:.0f} ms, agent path ~{agent_ms:.0f} ms")
+    print(f"fast path stats: {fast_path.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast path hit rate and latency")
+    parser.add_argument("--rtt", type=float, default=0.05, help="tool call round trip, seconds")
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.8, help="one LLM call of the agent, seconds"
+    )
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
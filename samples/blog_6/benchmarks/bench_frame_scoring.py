@@ -0,0 +1,95 @@
+"""
+Frame scoring benchmark for the /explain_photo_burst endpoint
+
+Generates synthetic JPEG bursts (one sharp frame, the rest blurred or badly
+exposed) at common ESP32 camera resolutions and reports the cost of decoding
+and scoring one frame, plus whether the sharp frame was picked.
+
+Usage:
+    uv run python benchmarks/bench_frame_scoring.py [--frames 5] [--rounds 20]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from frame_scoring import select_best_frame  # noqa: E402
+
+RESOLUTIONS = {
+    "QVGA": (320, 240),
+    "VGA": (640, 480),
+    "SVGA": (800, 600),
+    "UXGA": (1600, 1200),
+}
+
+
+def make_scene(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Textured test scene with edges at several scales"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pattern = 128 + 60 * np.sin(x / 7.0) * np.cos(y / 11.0)
+    pattern += rng.normal(0, 25, size=(height, width))
+    rgb = np.stack([pattern, pattern * 0.9, pattern * 1.1], axis=-1)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+
+def encode(image: Image.Image, quality: int = 80) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_burst(width: int, height: int, n_frames: int, sharp_index: int) -> list:
+    scene = make_scene(width, height)
+    frames = []
+    for i in range(n_frames):
+        if i == sharp_index:
+            frame = scene
+        elif i % 2:
+            frame = scene.filter(ImageFilter.GaussianBlur(radius=2 + i))
+        else:
+            # Sharp but underexposed
+            frame = scene.point(lambda v: v // 6)
+        frames.append(encode(frame))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'resolution':<12}{'jpeg KiB':>10}{'ms/frame':>10}{'p95 ms':>10}  picked")
+    for name, (width, height) in RESOLUTIONS.items():
+        sharp_index = args.frames // 2
+        frames = make_burst(width, height, args.frames, sharp_index)
+        kib = sum(len(f) for f in frames) / len(frames) / 1024
+
+        select_best_frame(frames)  # warm-up
+        per_frame = []
+        picked = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            picked, _ = select_best_frame(frames)
+            per_frame.append((time.perf_counter() - start) * 1000 / len(frames))
+
+        per_frame.sort()
+        p95 = per_frame[int(len(per_frame) * 0.95) - 1]
+        status = "ok" if picked == sharp_index else f"WRONG ({picked})"
+        print(
+            f"{name:<12}{kib:>10.1f}{statistics.median(per_frame):>10.2f}"
+            f"{p95:>10.2f}  {status}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Eager vs lazy MCP server initialization for a large device fleet
+
+Simulates --devices ESP32 servers behind an MQTT client whose initialize,
+tools/list and tools/call round trips take --rtt seconds each; every open
+session holds the streams and receive task a real MCP session keeps. Both
+modes start from a tool schema cache, like a restarted agent.
+
+- eager: every discovered device is initialized (at most --init-concurrency
+  at a time) and its tools are listed, as auto_connect_to_mcp_server does
+- lazy: discovery only records the device, its first tool call initializes
+  it, and sessions idle for --idle-timeout are closed
+
+Reports time until the agent is ready, memory held by the sessions
+(tracemalloc), open sessions, and the latency of a cold and a warm call
+while --calls tool calls hit a working set of --working-set devices.
+
+Usage:
+    uv run python benchmarks/bench_lazy_init.py [--devices 5000] [--rtt 0.02] [--working-set 50]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import anyio
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from esp32_sim import PROTOCOL_VERSION, firmware_tools, tool_list  # noqa: E402
+from mcp_readiness import ServerReadiness  # noqa: E402
+from mcp_tools import ToolRegistry, namespaced_tool_name  # noqa: E402
+from tool_cache import ToolSchemaCache, capability_hash  # noqa: E402
+
+
+def server_info() -> types.InitializeResult:
+    """What the firmware answers to initialize"""
+    return types.InitializeResult(
+        protocolVersion=PROTOCOL_VERSION,
+        serverInfo=types.Implementation(name="mcp", version="0.0.1"),
+        capabilities=types.ServerCapabilities(tools=types.ToolsCapability(listChanged=True)),
+    )
+
+
+class SimulatedSession:
+    """Per-server state of an initialized MCP session"""
+
+    def __init__(self):
+        self.server_info = server_info()
+        self.send, self.receive = anyio.create_memory_object_stream(16)
+        self.task = asyncio.ensure_future(self._receive_loop())
+
+    async def _receive_loop(self):
+        async for _ in self.receive:
+            pass
+
+    def close(self):
+        self.send.close()
+        self.task.cancel()
+
+
+class SimulatedMqttClient:
+    """MqttTransportClient stand-in in front of `devices` simulated ESP32 servers"""
+
+    def __init__(self, devices, rtt, on_discovered, on_connect, on_disconnect):
+        self.devices = devices
+        self.rtt = rtt
+        self.on_discovered = on_discovered
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.sessions = {}
+        self.tools = [types.Tool.model_validate(tool) for tool in tool_list(firmware_tools())]
+
+    async def discover_all(self):
+        # Retained presence messages of the whole fleet arrive right after subscribing
+        for server_name in self.devices:
+            await self.on_discovered(self, server_name)
+
+    async def initialize_mcp_server(self, server_name):
+        await anyio.sleep(self.rtt)
+        self.sessions[server_name] = SimulatedSession()
+        await self.on_connect(self, server_name, None)
+        return True
+
+    async def deinitialize_mcp_server(self, server_name):
+        session = self.sessions.pop(server_name, None)
+        if session is not None:
+            session.close()
+            await self.on_disconnect(self, server_name)
+
+    def get_session(self, server_name):
+        return self.sessions.get(server_name)
+
+    async def list_tools(self, server_name):
+        await anyio.sleep(self.rtt)
+        return types.ListToolsResult(tools=self.tools)
+
+    async def call_tool(self, server_name, name, arguments=None):
+        if server_name not in self.sessions:
+            return False
+        await anyio.sleep(self.rtt)
+        return types.CallToolResult(
+            content=[types.TextContent(type="text", text="Volume set successfully")]
+        )
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+
+
+def prefill_cache(path: str, devices) -> ToolSchemaCache:
+    cache = ToolSchemaCache(path)
+    tools = tool_list(firmware_tools())
+    cap_hash = capability_hash(server_info())
+    cache.entries = {
+        name: {"capability_hash": cap_hash, "tools": tools, "updated": time.time()}
+        for name in devices
+    }
+    cache.save()
+    return ToolSchemaCache(path)
+
+
+def traced_memory() -> int:
+    """Bytes allocated and still reachable"""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def run_mode(args, lazy: bool, cache_path: str) -> dict:
+    devices = [f"ESP32 Device {i}" for i in range(args.devices)]
+    readiness = ServerReadiness(lazy=lazy, max_initializing=args.init_concurrency)
+
+    # Same callbacks as main.py
+    async def on_discovered(client, server_name):
+        readiness.mark_discovered(server_name)
+        if lazy and server_name in registry.server_tools:
+            return
+        readiness.initialize_soon(client, server_name)
+
+    async def on_connect(client, server_name, connect_result):
+        cap_hash = capability_hash(client.get_session(server_name).server_info)
+        if registry.use_cached(server_name, cap_hash):
+            readiness.mark_connected(server_name)
+        await registry.refresh_server(server_name, cap_hash)
+        readiness.mark_connected(server_name)
+
+    async def on_disconnect(client, server_name):
+        readiness.mark_disconnected(server_name)
+        if server_name not in readiness.evicted:
+            registry.remove_server(server_name)
+
+    client = SimulatedMqttClient(devices, args.rtt, on_discovered, on_connect, on_disconnect)
+    readiness.client = client
+    registry = ToolRegistry(client, cache=ToolSchemaCache(cache_path), readiness=readiness)
+    registry.load_cached()
+
+    tracemalloc.start()
+    baseline = traced_memory()
+    start = time.perf_counter()
+    await client.discover_all()
+    if not lazy:
+        await readiness.wait_for(min_servers=args.devices, timeout=args.timeout)
+    ready = time.perf_counter() - start
+    ready_memory = traced_memory() - baseline
+    ready_sessions = len(client.sessions)
+
+    tools = {tool.metadata.name: tool for tool in registry.snapshot()}
+    working_set = random.Random(0).sample(devices, args.working_set)
+
+    async def call(server_name) -> float:
+        call_start = time.perf_counter()
+        result = await tools[namespaced_tool_name(server_name, "set_volume")].acall(volume=40)
+        assert "failed" not in str(result) and "error" not in str(result), result
+        return time.perf_counter() - call_start
+
+    # The first call to a device is cold, lazy mode initializes it then
+    cold, warm, called = [], [], set()
+    rng = random.Random(1)
+    for _ in range(args.calls):
+        server_name = rng.choice(working_set)
+        (warm if server_name in called else cold).append(await call(server_name))
+        called.add(server_name)
+    used_sessions = len(client.sessions)
+    used_memory = traced_memory() - baseline
+
+    evicted = await readiness.evict_idle(args.idle_timeout) if lazy else None
+    # Let the cancelled receive tasks finish
+    await anyio.sleep(0.01)
+    evicted_memory = traced_memory() - baseline
+    tracemalloc.stop()
+    client.close()
+    return {
+        "ready_s": ready,
+        "ready_sessions": ready_sessions,
+        "ready_mb": ready_memory / 1e6,
+        "cold_ms": statistics.median(cold) * 1000,
+        "warm_ms": statistics.median(warm) * 1000,
+        "sessions": used_sessions,
+        "mb": used_memory / 1e6,
+        "idle_sessions": used_sessions - len(evicted) if evicted is not None else None,
+        "idle_mb": evicted_memory / 1e6 if evicted is not None else None,
+    }
+
+
+async def run(args):
+    devices = [f"ESP32 Device {i}" for i in range(args.devices)]
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, "tool_cache.json")
+        prefill_cache(cache_path, devices)
+        print(
+            f"{args.devices} devices, rtt {args.rtt * 1000:.0f} ms, "
+            f"init concurrency {args.init_concurrency}, {args.calls} calls "
+            f"over {args.working_set} devices"
+        )
+        print(
+            f"{'':>6}{'-- ready --':>26}{'-- calls --':>20}{'-- in use --':>16}"
+            f"{'-- after eviction --':>22}"
+        )
+        print(
+            f"{'mode':>6}{'s':>9}{'sessions':>10}{'MB':>7}{'cold ms':>10}{'warm ms':>10}"
+            f"{'sessions':>10}{'MB':>6}{'sessions':>14}{'MB':>8}"
+        )
+        for lazy in (False, True):
+            r = await run_mode(args, lazy, cache_path)
+            idle = (
+                f"{r['idle_sessions']:>14}{r['idle_mb']:>8.1f}"
+                if r["idle_sessions"] is not None
+                else f"{'-':>14}{'-':>8}"
+            )
+            print(
+                f"{'lazy' if lazy else 'eager':>6}{r['ready_s']:>9.2f}{r['ready_sessions']:>10}"
+                f"{r['ready_mb']:>7.1f}{r['cold_ms']:>10.1f}{r['warm_ms']:>10.1f}"
+                f"{r['sessions']:>10}{r['mb']:>6.1f}{idle}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eager vs lazy MCP server initialization")
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--rtt", type=float, default=0.02, help="MQTT round trip, seconds")
+    parser.add_argument("--init-concurrency", type=int, default=16)
+    parser.add_argument("--working-set", type=int, default=50, help="devices the calls hit")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument(
+        "--idle-timeout", type=float, default=0.0, help="evict sessions idle this long"
+    )
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
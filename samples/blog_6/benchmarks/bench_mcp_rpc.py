@@ -0,0 +1,341 @@
+"""
+call_tool round trips over MCP-over-MQTT against simulated ESP32 servers
+
+Starts --servers simulated devices (esp32_sim.py) on a local broker and
+drives tools/call through one of three clients:
+
+- raw: a minimal paho MCP client, the broker and simulator floor
+- sdk: mcp.client.mqtt.MqttTransportClient, the transport the agent uses
+- wrapper: the SDK client behind ToolRegistry wrappers and ToolDispatcher,
+  exactly what the LLM's tool calls go through
+
+For every payload size and concurrency it reports call_tool latency
+percentiles and calls/s. Payload 0 calls set_volume {"volume": 40}; a
+larger payload calls the simulator's echo tool with that many characters,
+so request and response grow together. --json appends the results for a
+later --baseline run, which flags p50 or throughput regressions.
+
+Usage:
+    uv run python benchmarks/bench_mcp_rpc.py [--client sdk] [--payloads 0,1024,16384] [--concurrency 1,8] [--qos 0]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+from typing import Dict, List
+
+import mcp.client.mqtt as mcp_mqtt
+import paho.mqtt.client as paho
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.subscribeoptions import SubscribeOptions
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from esp32_sim import SimulatedFleet  # noqa: E402
+from mcp_tools import ToolRegistry, namespaced_tool_name  # noqa: E402
+from tool_dispatch import ToolDispatcher  # noqa: E402
+
+# A regression is a p50 this much higher, or a throughput this much lower, than the baseline
+REGRESSION_THRESHOLD = 0.10
+
+
+class RawMcpClient:
+    """Just enough of the MCP-over-MQTT client side to initialize and call tools"""
+
+    def __init__(self, host: str, port: int, qos: int):
+        self.client_id = f"mcp-bench-{uuid.uuid4().hex[:8]}"
+        self.qos = qos
+        self.host = host
+        self.port = port
+        self.loop = asyncio.get_running_loop()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+        self.rpc_topics: Dict[str, str] = {}
+        self.client = paho.Client(
+            paho.CallbackAPIVersion.VERSION2, client_id=self.client_id, protocol=paho.MQTTv5
+        )
+        self.client.on_message = self._on_message
+
+    async def connect(self):
+        connected = self.loop.create_future()
+        self.client.on_connect = lambda *args: self.loop.call_soon_threadsafe(
+            lambda: connected.done() or connected.set_result(True)
+        )
+        properties = Properties(PacketTypes.CONNECT)
+        properties.UserProperty = ("MCP-COMPONENT-TYPE", "mcp-client")
+        self.client.connect_async(self.host, self.port, properties=properties)
+        self.client.loop_start()
+        await asyncio.wait_for(connected, 10)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _on_message(self, client, userdata, message):
+        try:
+            response = json.loads(message.payload)
+        except ValueError:
+            return
+        future = self.pending.pop(response.get("id"), None)
+        if future is not None:
+            self.loop.call_soon_threadsafe(
+                lambda: future.done() or future.set_result(response)
+            )
+
+    async def _request(self, topic: str, method: str, params: dict, properties=None) -> dict:
+        request_id = next(self.ids)
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+        self.client.publish(topic, json.dumps(payload), qos=self.qos, properties=properties)
+        response = await asyncio.wait_for(future, 30)
+        if "error" in response:
+            raise RuntimeError(f"{method} failed: {response['error']}")
+        return response["result"]
+
+    async def initialize(self, server_client_id: str, server_name: str):
+        rpc_topic = f"$mcp-rpc/{self.client_id}/{server_client_id}/{server_name}"
+        subscribed = self.loop.create_future()
+        self.client.on_subscribe = lambda *args: self.loop.call_soon_threadsafe(
+            lambda: subscribed.done() or subscribed.set_result(True)
+        )
+        self.client.subscribe(rpc_topic, options=SubscribeOptions(qos=self.qos, noLocal=True))
+        await asyncio.wait_for(subscribed, 10)
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.UserProperty = ("MCP-MQTT-CLIENT-ID", self.client_id)
+        await self._request(
+            f"$mcp-server/{server_client_id}/{server_name}",
+            "initialize",
+            {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "bench", "version": "0.1"},
+            },
+            properties,
+        )
+        self.rpc_topics[server_name] = rpc_topic
+
+    async def call_tool(self, server_name: str, name: str, arguments: dict) -> dict:
+        return await self._request(
+            self.rpc_topics[server_name], "tools/call", {"name": name, "arguments": arguments}
+        )
+
+
+async def connect_sdk(args, fleet: SimulatedFleet, stack: AsyncExitStack):
+    connected = set()
+
+    async def on_mcp_connect(client, server_name, connect_result):
+        connected.add(server_name)
+
+    client = await stack.enter_async_context(
+        mcp_mqtt.MqttTransportClient(
+            f"mcp-bench-{uuid.uuid4().hex[:8]}",
+            auto_connect_to_mcp_server=True,
+            on_mcp_connect=on_mcp_connect,
+            mqtt_options=mcp_mqtt.MqttOptions(host=args.host, port=args.port),
+        )
+    )
+    await client.start()
+    deadline = time.monotonic() + 10
+    while set(fleet.names) - connected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    missing = set(fleet.names) - connected
+    if missing:
+        raise RuntimeError(f"servers not connected through the SDK: {sorted(missing)}")
+    return client
+
+
+async def connect(args, fleet: SimulatedFleet, stack: AsyncExitStack):
+    """call(server_name, tool_name, arguments) for the chosen client"""
+    if args.client == "raw":
+        raw_client = RawMcpClient(args.host, args.port, args.qos)
+        await raw_client.connect()
+        stack.callback(raw_client.close)
+        for server in fleet.servers:
+            await raw_client.initialize(server.client_id, server.name)
+        return lambda server_name, name, arguments: raw_client.call_tool(
+            server_name, name, {"kwargs": arguments}
+        )
+
+    sdk_client = await connect_sdk(args, fleet, stack)
+    if args.client == "sdk":
+
+        async def call(server_name, name, arguments):
+            result = await sdk_client.call_tool(server_name, name, {"kwargs": arguments})
+            if result is False:
+                raise RuntimeError(f"call {name} on {server_name} failed")
+            return result
+
+        return call
+
+    dispatcher = ToolDispatcher(sdk_client, max_concurrency_per_server=args.per_server)
+    registry = ToolRegistry(sdk_client, dispatcher=dispatcher)
+    await registry.refresh_all(fleet.names)
+    tools = {
+        tool.metadata.name: tool
+        for server_tools in registry.llamaindex_tools.values()
+        for tool in server_tools
+    }
+
+    async def call(server_name, name, arguments):
+        # The LLM's call, the wrapper validates and sends {"kwargs": arguments}
+        output = await tools[namespaced_tool_name(server_name, name)].acall(**arguments)
+        # Wrappers report failures as text for the LLM
+        if str(output).startswith(("call ", "tool return error")):
+            raise RuntimeError(str(output))
+        return output
+
+    return call
+
+
+def tool_call(payload: int):
+    """(tool name, arguments) of a call with about `payload` characters each way"""
+    if payload <= 0:
+        return "set_volume", {"volume": 40}
+    return "echo", {"text": "x" * payload}
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def measure(call, servers: List[str], payload: int, concurrency: int, calls: int) -> dict:
+    """Run `calls` tool calls from `concurrency` workers spread over the servers"""
+    name, arguments = tool_call(payload)
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= calls:
+                return
+            server = servers[i % len(servers)]
+            start = time.perf_counter()
+            try:
+                await call(server, name, arguments)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latency * 1000 for latency in latencies)
+    return {
+        "payload": payload,
+        "concurrency": concurrency,
+        "calls": len(latencies),
+        "errors": errors,
+        "calls_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(ordered, 0.5), 2) if ordered else None,
+        "p95_ms": round(percentile(ordered, 0.95), 2) if ordered else None,
+        "p99_ms": round(percentile(ordered, 0.99), 2) if ordered else None,
+        "max_ms": round(ordered[-1], 2) if ordered else None,
+    }
+
+
+def compare(results: List[dict], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = [json.loads(line) for line in f if line.strip()]
+    for result in results:
+        key = (result["client"], result["qos"], result["payload"], result["concurrency"])
+        matches = [
+            b for b in baseline if (b["client"], b["qos"], b["payload"], b["concurrency"]) == key
+        ]
+        old = matches[-1] if matches else None
+        if old is None or not old["p50_ms"] or not old["calls_per_s"]:
+            continue
+        p50 = result["p50_ms"] / old["p50_ms"] - 1
+        rate = result["calls_per_s"] / old["calls_per_s"] - 1
+        flag = "REGRESSION" if p50 > REGRESSION_THRESHOLD or rate < -REGRESSION_THRESHOLD else "ok"
+        print(
+            f"{key}: p50 {old['p50_ms']} -> {result['p50_ms']} ms ({p50:+.0%}), "
+            f"{old['calls_per_s']} -> {result['calls_per_s']} calls/s ({rate:+.0%}) {flag}"
+        )
+
+
+async def run(args):
+    fleet = SimulatedFleet(
+        args.servers, host=args.host, port=args.port, service_time=args.service_time, qos=args.qos
+    )
+    if not fleet.start():
+        fleet.stop()
+        raise SystemExit(f"could not connect the simulators to {args.host}:{args.port}")
+
+    results = []
+    try:
+        async with AsyncExitStack() as stack:
+            call = await connect(args, fleet, stack)
+            # Warm up connections and code paths
+            await measure(call, fleet.names, 0, 1, min(20, args.calls))
+            print(
+                f"client {args.client}, qos {args.qos}, {args.servers} servers, "
+                f"service time {args.service_time * 1000:.1f} ms"
+            )
+            print(
+                f"{'payload':>8}{'conc':>6}{'calls':>7}{'err':>5}{'calls/s':>9}"
+                f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+            )
+            for payload in args.payloads:
+                for concurrency in args.concurrency:
+                    result = await measure(call, fleet.names, payload, concurrency, args.calls)
+                    result.update(client=args.client, qos=args.qos, servers=args.servers)
+                    results.append(result)
+                    print(
+                        f"{payload:>8}{concurrency:>6}{result['calls']:>7}{result['errors']:>5}"
+                        f"{result['calls_per_s']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                        f"{result['p99_ms']:>9}{result['max_ms']:>9}"
+                    )
+            print(f"tool calls served: {sum(server.calls for server in fleet.servers)}")
+    finally:
+        fleet.stop()
+
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP-over-MQTT call_tool round trips")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--client", choices=["raw", "sdk", "wrapper"], default="sdk")
+    parser.add_argument("--servers", type=int, default=4)
+    parser.add_argument(
+        "--service-time", type=float, default=0.005, help="simulated tools/call time, seconds"
+    )
+    parser.add_argument("--qos", type=int, default=0, choices=[0, 1, 2])
+    parser.add_argument(
+        "--payloads",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[0, 1024, 16384],
+        help="echo text characters, 0 calls set_volume",
+    )
+    parser.add_argument(
+        "--concurrency", type=lambda s: [int(n) for n in s.split(",")], default=[1, 8]
+    )
+    parser.add_argument("--calls", type=int, default=500, help="calls per row")
+    parser.add_argument(
+        "--per-server", type=int, default=1, help="ToolDispatcher limit in wrapper mode"
+    )
+    parser.add_argument("--json", help="append the results to this JSONL file")
+    parser.add_argument("--baseline", help="JSONL file of an earlier run to compare with")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Routing accuracy and expected turn latency of ModelRouter
+
+Classifies a labelled set of typical agent turns (device commands, small
+talk, questions that need reasoning) and reports how many were routed as
+labelled, how many hard turns would have lost the reasoning model, the
+classifier cost, and the median / p90 turn latency with every turn on the
+reasoning model versus routed, from the per-model latencies given.
+
+Usage:
+    uv run python benchmarks/bench_model_router.py [--fast-latency 0.8] [--reasoning-latency 12]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from model_router import FAST, REASONING, ModelRouter  # noqa: E402
+
+TOOL_NAMES = ["set_volume", "get_volume", "set_brightness", "explain_photo"]
+
+# (message, expected route)
+TURNS = [
+    ("把音量调到30", FAST),
+    ("音量大一点", FAST),
+    ("静音", FAST),
+    ("set volume to 40", FAST),
+    ("turn off the light", FAST),
+    ("亮度调到最低", FAST),
+    ("你看看我今天打扮得怎么样", FAST),
+    ("帮我拍张照片", FAST),
+    ("explain_photo", FAST),
+    ("你好", FAST),
+    ("早上好呀", FAST),
+    ("谢谢你", FAST),
+    ("我今天有点累", FAST),
+    ("你叫什么名字", FAST),
+    ("good night", FAST),
+    ("为什么我晚上总是睡不着？", REASONING),
+    ("帮我分析一下这个月的开销应该怎么控制", REASONING),
+    ("比较一下跑步和游泳哪个更适合我", REASONING),
+    ("explain how the ESP32 connects to the MQTT broker step by step", REASONING),
+    ("我下周要去北京出差三天，天气可能变冷，帮我规划一下要带的东西和每天的安排", REASONING),
+    ("如果一个房间有三盏灯，每盏灯功率是十瓦，一天开八小时，一个月要用多少度电？能省多少？", REASONING),
+    ("why does my speaker keep disconnecting?", REASONING),
+    ("what are the pros and cons of keeping the device always on", REASONING),
+    ("我最近工作压力很大，和同事关系也不太好，周末也没法休息，感觉自己的状态越来越差，不知道该从哪里开始改变", REASONING),
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ModelRouter accuracy and latency")
+    parser.add_argument("--fast-latency", type=float, default=0.8, help="fast model turn, seconds")
+    parser.add_argument(
+        "--reasoning-latency", type=float, default=12.0, help="reasoning model turn, seconds"
+    )
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    router = ModelRouter()
+    correct = 0
+    hard_to_fast = []
+    routed = []
+    for message, expected in TURNS:
+        decision = router.classify(message, tool_names=TOOL_NAMES)
+        routed.append(decision.route)
+        if decision.route == expected:
+            correct += 1
+        elif expected == REASONING:
+            hard_to_fast.append(message)
+        print(f"  {decision.route:<10}{decision.reason:<32}{message[:40]}")
+
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        message, _ = TURNS[i % len(TURNS)]
+        router.classify(message, tool_names=TOOL_NAMES)
+    classify_us = (time.perf_counter() - start) / args.iterations * 1e6
+
+    latency = {FAST: args.fast_latency, REASONING: args.reasoning_latency}
+    baseline = [args.reasoning_latency] * len(TURNS)
+    with_router = [latency[route] for route in routed]
+
+    print(f"\nrouted as labelled: {correct}/{len(TURNS)}")
+    print(f"hard turns sent to the fast model: {len(hard_to_fast)} {hard_to_fast}")
+    print(f"classifier cost: {classify_us:.1f} us/turn")
+    print(f"{'':<14}{'p50 s':>8}{'p90 s':>8}{'mean s':>8}")
+    for name, values in (("all reasoning", baseline), ("routed", with_router)):
+        print(
+            f"{name:<14}{statistics.median(values):>8.2f}"
+            f"{percentile(values, 0.9):>8.2f}{statistics.mean(values):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Deterministic offline agent turns from recorded LLM and MCP exchanges
+
+record: runs the sessions (lists of user messages, from --sessions or the
+built-in ones) through ConversationalAgent against the real LLM and MCP
+servers and writes every exchange to a cassette directory (see
+cassette.py): the LLM traffic through the cassette proxy in front of
+--upstream, the MCP traffic through RecordingMcpClient around the SDK
+client.
+
+replay: runs the same sessions --repeat times against the cassette, with
+the recorded response timing (--latency original) or none at all (--latency
+zero), and reports per turn the median wall time, the CPU time of this
+process, the agent's own overhead (wall time minus the recorded LLM and MCP
+time it waited for; tool calls running in parallel are counted once each,
+so it is a lower bound for those turns) and, in a separate tracemalloc
+pass, the peak memory allocated during the turn. Replay needs no network,
+API key or devices, so agent changes can be compared turn by turn. Misses
+(requests the cassette does not have, e.g. after a prompt change) are
+counted; the turns are then no longer the recorded ones.
+
+Record and replay with the same agent settings (AGENT_TOOL_TOP_K,
+AGENT_MODEL_ROUTER, ...), they change the requests sent to the LLM.
+
+Usage:
+    uv run python benchmarks/bench_replay.py record cassettes/demo [--sessions sessions.json] [--servers "ESP32 Demo Server"]
+    uv run python benchmarks/bench_replay.py replay cassettes/demo [--latency zero] [--repeat 5] [--json results.jsonl]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+
+import anyio
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_agent_service import wait_ready  # noqa: E402
+from cassette import (  # noqa: E402
+    LLM_FILE,
+    MCP_FILE,
+    SESSIONS_FILE,
+    CassetteLog,
+    RecordingMcpClient,
+    Replay,
+    ReplayMcpClient,
+)
+
+DEFAULT_SESSIONS = [
+    ["你好", "把音量调到40", "再大一点"],
+    ["你看看我今天打扮得怎么样", "谢谢"],
+    ["set the volume to 20", "what did I just ask you?"],
+]
+
+
+def start_proxy(args, *mode_args) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCH_DIR, "cassette.py"),
+            *mode_args,
+            "--port", str(args.proxy_port),
+        ]
+    )
+
+
+def new_agent(mcp_client):
+    """Agent with its own registry and dispatcher, as main.py wires them"""
+    from blob_store import BlobStore
+    from main import ConversationalAgent
+    from mcp_tools import ToolRegistry
+    from tool_dispatch import ToolDispatcher
+
+    registry = ToolRegistry(
+        mcp_client, dispatcher=ToolDispatcher(mcp_client), blob_store=BlobStore()
+    )
+    return ConversationalAgent(mcp_client, registry), registry
+
+
+async def run_turn(agent, message: str, history) -> dict:
+    tool_calls = 0
+    async for event in agent.chat_stream(message, history):
+        if event.type == "tool_call":
+            tool_calls += 1
+        elif event.type == "done":
+            return {"response": event.text, "tool_calls": tool_calls, "route": event.route}
+    return {"response": "", "tool_calls": tool_calls, "route": None}
+
+
+async def record(args):
+    import mcp.client.mqtt as mcp_mqtt
+
+    from history import ConversationHistory
+
+    connected = set()
+
+    async def on_mcp_connect(client, server_name, connect_result):
+        connected.add(server_name)
+
+    async with mcp_mqtt.MqttTransportClient(
+        f"mcp-record-{uuid.uuid4().hex[:8]}",
+        auto_connect_to_mcp_server=True,
+        on_mcp_connect=on_mcp_connect,
+        mqtt_options=mcp_mqtt.MqttOptions(host=args.host, port=args.port),
+    ) as sdk_client:
+        await sdk_client.start()
+        await wait_ready(f"http://127.0.0.1:{args.proxy_port}/stats")
+        deadline = time.monotonic() + args.wait
+        while set(args.servers) - connected and time.monotonic() < deadline:
+            await anyio.sleep(0.05)
+        missing = set(args.servers) - connected
+        if missing:
+            raise SystemExit(f"servers not connected: {sorted(missing)}")
+
+        client = RecordingMcpClient(sdk_client, CassetteLog(os.path.join(args.cassette, MCP_FILE)))
+        agent, registry = new_agent(client)
+        await registry.refresh_all(sorted(connected))
+        for i, session in enumerate(args.sessions):
+            history = ConversationHistory(max_tokens=agent.conversation_history.max_tokens)
+            for message in session:
+                result = await run_turn(agent, message, history)
+                print(f"[{i}] {message} -> {result['response']!r}")
+
+    with open(os.path.join(args.cassette, SESSIONS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"sessions": args.sessions}, f, ensure_ascii=False, indent=2)
+    print(f"recorded {sum(len(s) for s in args.sessions)} turns to {args.cassette}")
+
+
+async def replay_pass(args, mcp_replay: Replay, sessions, trace_memory: bool) -> list:
+    """One run of every session, a dict per turn"""
+    from history import ConversationHistory
+
+    stats_url = f"http://127.0.0.1:{args.proxy_port}/stats"
+    async with httpx.AsyncClient() as http:
+        await http.post(f"http://127.0.0.1:{args.proxy_port}/reset")
+        mcp_replay.reset()
+        client = ReplayMcpClient(mcp_replay, zero_latency=args.latency == "zero")
+        agent, registry = new_agent(client)
+        await registry.refresh_all(client.server_names)
+        await agent.load_mcp_tools()
+
+        turns = []
+        for i, session in enumerate(sessions):
+            history = ConversationHistory(max_tokens=agent.conversation_history.max_tokens)
+            for message in session:
+                llm_before = (await http.get(stats_url)).json()
+                mcp_waited = mcp_replay.waited
+                if trace_memory:
+                    tracemalloc.reset_peak()
+                    allocated = tracemalloc.get_traced_memory()[0]
+                wall, cpu = time.perf_counter(), time.process_time()
+                result = await run_turn(agent, message, history)
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+                if trace_memory:
+                    allocated = tracemalloc.get_traced_memory()[1] - allocated
+                llm_after = (await http.get(stats_url)).json()
+                waited = llm_after["waited"] - llm_before["waited"]
+                waited += mcp_replay.waited - mcp_waited
+                turns.append(
+                    {
+                        "session": i,
+                        "message": message,
+                        "wall": wall,
+                        "cpu": cpu,
+                        "overhead": wall - waited,
+                        "allocated": allocated if trace_memory else None,
+                        "llm_requests": llm_after["requests"] - llm_before["requests"],
+                        "llm_misses": llm_after["misses"] - llm_before["misses"],
+                        "tool_calls": result["tool_calls"],
+                    }
+                )
+    return turns
+
+
+async def replay(args):
+    with open(os.path.join(args.cassette, SESSIONS_FILE), encoding="utf-8") as f:
+        sessions = json.load(f)["sessions"]
+    mcp_replay = Replay.load(os.path.join(args.cassette, MCP_FILE))
+    await wait_ready(f"http://127.0.0.1:{args.proxy_port}/stats")
+
+    # Timed passes first, tracemalloc slows every allocation down
+    passes = [await replay_pass(args, mcp_replay, sessions, False) for _ in range(args.repeat)]
+    tracemalloc.start()
+    try:
+        memory_pass = await replay_pass(args, mcp_replay, sessions, True)
+    finally:
+        tracemalloc.stop()
+
+    rows = []
+    for turn, samples in enumerate(zip(*passes)):
+        rows.append(
+            {
+                **{key: samples[0][key] for key in ("session", "message", "tool_calls")},
+                "llm_requests": samples[0]["llm_requests"],
+                "wall_ms": statistics.median(s["wall"] for s in samples) * 1000,
+                "cpu_ms": statistics.median(s["cpu"] for s in samples) * 1000,
+                "overhead_ms": statistics.median(s["overhead"] for s in samples) * 1000,
+                "alloc_kib": memory_pass[turn]["allocated"] / 1024,
+                "misses": sum(s["llm_misses"] for s in samples),
+            }
+        )
+
+    print(
+        f"{args.cassette}: {len(rows)} turns, latency {args.latency}, "
+        f"median of {args.repeat} runs"
+    )
+    print(
+        f"{'turn':>5}{'llm':>5}{'tools':>7}{'wall ms':>10}{'cpu ms':>9}{'overhead ms':>13}"
+        f"{'alloc KiB':>11}  message"
+    )
+    for i, r in enumerate(rows):
+        print(
+            f"{i:>5}{r['llm_requests']:>5}{r['tool_calls']:>7}{r['wall_ms']:>10.1f}"
+            f"{r['cpu_ms']:>9.1f}{r['overhead_ms']:>13.1f}{r['alloc_kib']:>11.0f}  {r['message']}"
+        )
+    print(
+        f"total cpu {sum(r['cpu_ms'] for r in rows):.1f} ms, "
+        f"overhead {sum(r['overhead_ms'] for r in rows):.1f} ms, "
+        f"llm misses {sum(r['misses'] for r in rows)}, mcp misses {mcp_replay.misses}"
+    )
+
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            summary = {"cassette": args.cassette, "latency": args.latency, "repeat": args.repeat}
+            f.write(json.dumps({**summary, "turns": rows}, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay agent turns")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette", help="cassette directory")
+    parser.add_argument("--proxy-port", type=int, default=9003)
+    # record
+    parser.add_argument("--sessions", help="JSON file with a list of sessions of user messages")
+    parser.add_argument("--upstream", help="chat completions URL to record")
+    parser.add_argument("--servers", nargs="+", default=["ESP32 Demo Server"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--wait", type=float, default=10.0, help="seconds to wait for servers")
+    # replay
+    parser.add_argument("--latency", choices=["original", "zero"], default="original")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    os.environ["AGENT_LLM_API_BASE"] = f"http://127.0.0.1:{args.proxy_port}/v1/chat/completions"
+    if args.mode == "record":
+        if not os.getenv("YOUR_API_KEY_FROM_CLOUD_SILICONFLOW_CN"):
+            raise SystemExit("recording needs YOUR_API_KEY_FROM_CLOUD_SILICONFLOW_CN")
+        if os.path.exists(os.path.join(args.cassette, LLM_FILE)):
+            raise SystemExit(f"{args.cassette} already holds a recording")
+        if args.sessions:
+            with open(args.sessions, encoding="utf-8") as f:
+                args.sessions = json.load(f)
+        else:
+            args.sessions = DEFAULT_SESSIONS
+        proxy_args = ["--record", args.cassette]
+        if args.upstream:
+            proxy_args += ["--upstream", args.upstream]
+        proxy = start_proxy(args, *proxy_args)
+    else:
+        # Replay sends no real requests, the LLM client still wants a key
+        os.environ.setdefault("YOUR_API_KEY_FROM_CLOUD_SILICONFLOW_CN", "sk-replay")
+        proxy = start_proxy(args, "--replay", args.cassette, "--latency", args.latency)
+    try:
+        anyio.run(record if args.mode == "record" else replay, args)
+    finally:
+        proxy.terminate()
+        proxy.wait()
+
+
+if __name__ == "__main__":
+    # Per-turn INFO logs of main.py would dominate the measurement
+    logging.disable(logging.INFO)
+    main()
@@ -0,0 +1,111 @@
+"""
+Hit rate and lookup cost of the agent response cache
+
+Replays a stream of typical voice-agent turns (greetings, "what can you do"
+and other frequent questions, each with a few surface variants, mixed with
+one-off questions) through ResponseCache, then checks pairs that must never
+share an answer. Reports exact / near-duplicate hits, wrong matches, the
+lookup cost with a full cache, and the LLM time saved at --llm-latency per
+turn.
+
+Usage:
+    uv run python benchmarks/bench_response_cache.py [--turns 2000] [--llm-latency 1.5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from response_cache import ResponseCache  # noqa: E402
+
+CONTEXT = "bench"
+
+# Variants of the same request, all should get the same answer
+FREQUENT = [
+    ["你好", "你好呀！", "你好啊", "你好。"],
+    ["你会做什么", "你会做什么？", "你会做什么呢"],
+    ["介绍一下你自己", "请介绍一下你自己", "介绍一下你自己吧"],
+    ["what can you do", "What can you do?", "please, what can you do"],
+    ["tell me a joke", "Tell me a joke please", "tell me a joke!"],
+    ["讲个笑话", "讲个笑话吧", "给我讲个笑话"],
+    ["晚安", "晚安啦", "晚安！"],
+    ["good morning", "Good morning!", "good morning :)"],
+]
+
+# Pairs that look alike but must not share an answer
+DISTINCT = [
+    ("今天天气怎么样", "明天天气怎么样"),
+    ("把音量调到30", "把音量调到40"),
+    ("what is 3 plus 4", "what is 3 plus 5"),
+    ("打开客厅的灯", "关闭客厅的灯"),
+    ("what can you do", "what can't you do"),
+    ("提醒我八点起床", "提醒我九点起床"),
+    # Near in characters, different in meaning
+    ("what is the capital of austria", "what is the capital of australia"),
+    ("is the kitchen light on", "is the kitchen light off"),
+    ("turn on the bedroom light", "turn on the bathroom light"),
+    ("set a timer for five minutes", "set a timer for nine minutes"),
+    ("what time is it in paris", "what time is it in perth"),
+    ("how do i get to the station", "how do i get to the stadium"),
+    ("今天天气怎么样", "今天空气怎么样"),
+    ("打开卧室的灯", "打开浴室的灯"),
+    ("播放周杰伦的歌", "播放周华健的歌"),
+    ("我叫什么名字", "你叫什么名字"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response cache hit rate and lookup cost")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument(
+        "--frequent-share", type=float, default=0.4, help="share of turns that are frequent"
+    )
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="one agent turn, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cache = ResponseCache()
+    for i in range(args.turns):
+        if rng.random() < args.frequent_share:
+            group = rng.randrange(len(FREQUENT))
+            message = rng.choice(FREQUENT[group])
+            answer = f"answer {group}"
+        else:
+            message = f"one-off question number {i} about topic {rng.randrange(10 ** 6)}"
+            answer = f"answer {message}"
+        if cache.get(CONTEXT, message) is None:
+            cache.put(CONTEXT, message, answer, args.llm_latency)
+
+    stats = cache.stats()
+    wrong = []
+    for first, second in DISTINCT:
+        probe = ResponseCache()
+        probe.put(CONTEXT, first, first, args.llm_latency)
+        if probe.get(CONTEXT, second) is not None:
+            wrong.append((first, second))
+
+    start = time.perf_counter()
+    lookups = 2000
+    for i in range(lookups):
+        cache.get(CONTEXT, f"a message that is not cached {i}")
+    lookup_us = (time.perf_counter() - start) / lookups * 1e6
+
+    hits = stats["exact_hits"] + stats["near_hits"]
+    print(f"turns: {args.turns}, frequent share: {args.frequent_share}")
+    print(f"exact hits: {stats['exact_hits']}, near-duplicate hits: {stats['near_hits']}")
+    print(f"hit rate: {stats['hit_rate']} (frequent share {args.frequent_share})")
+    print(f"wrong matches: {len(wrong)}/{len(DISTINCT)} {wrong}")
+    print(f"miss lookup with {len(cache.entries)} entries: {lookup_us:.1f} us")
+    print(
+        f"LLM time saved: {stats['saved_s']:.0f}s of {args.turns * args.llm_latency:.0f}s "
+        f"({hits / args.turns:.0%} of turns)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Agent startup time against a local broker
+
+Measures how long it takes from MqttTransportClient.start() until the MCP
+servers are connected, using the same readiness callbacks as main.py. The
+old startup always cost a fixed 3 s sleep, whether or not the servers had
+been discovered by then.
+
+Run one or more ESP32 devices (or simulated servers) against the broker
+first, then:
+    uv run python benchmarks/bench_startup.py [--host localhost] [--servers 1] [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import anyio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mcp.client.mqtt as mcp_mqtt  # noqa: E402
+
+from mcp_readiness import ServerReadiness  # noqa: E402
+
+FIXED_SLEEP = 3.0
+
+
+async def measure_once(host: str, port: int, servers: int, timeout: float, run: int):
+    readiness = ServerReadiness()
+
+    async def on_discovered(client, server_name):
+        readiness.mark_discovered(server_name)
+        readiness.initialize_soon(client, server_name)
+
+    async def on_connect(client, server_name, connect_result):
+        readiness.mark_connected(server_name)
+
+    async def on_disconnect(client, server_name):
+        readiness.mark_disconnected(server_name)
+
+    async with mcp_mqtt.MqttTransportClient(
+        f"bench_startup_{os.getpid()}_{run}",
+        auto_connect_to_mcp_server=True,
+        on_mcp_server_discovered=on_discovered,
+        on_mcp_connect=on_connect,
+        on_mcp_disconnect=on_disconnect,
+        mqtt_options=mcp_mqtt.MqttOptions(host=host, port=port),
+    ) as mcp_client:
+        start = time.perf_counter()
+        await mcp_client.start()
+        ready = await readiness.wait_for(min_servers=servers, timeout=timeout)
+        return time.perf_counter() - start, ready, len(readiness.connected)
+
+
+async def run(args):
+    samples = []
+    for i in range(args.runs):
+        elapsed, ready, connected = await measure_once(
+            args.host, args.port, args.servers, args.timeout, i
+        )
+        status = "ready" if ready else "TIMEOUT"
+        print(f"run {i}: {elapsed * 1000:.0f} ms, {connected} servers connected ({status})")
+        samples.append(elapsed)
+
+    median = statistics.median(samples)
+    print(
+        f"median time to ready: {median * 1000:.0f} ms "
+        f"(fixed sleep was {FIXED_SLEEP * 1000:.0f} ms + connect)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent startup time")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--servers", type=int, default=1, help="servers to wait for")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
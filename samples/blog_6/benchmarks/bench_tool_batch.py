@@ -0,0 +1,193 @@
+"""
+MQTT messages and tool latency per LLM step, single calls vs JSON-RPC batches
+
+Starts --servers simulated devices (esp32_sim.py) on a local broker; each
+message costs the device --message-time seconds and each tools/call
+--service-time more, handled one at a time like the firmware. Every turn is
+one LLM step that calls --calls tools on the same device at once, through
+the ToolRegistry wrappers and the ToolDispatcher:
+
+- single: one MQTT message per call, as the SDK client sends them
+- batch: the dispatcher coalesces the calls, McpBatchClient sends them as
+  one JSON-RPC batch array
+- fallback: batches enabled against devices that, like the firmware, do not
+  announce them; the feature check fails and the calls go out one by one
+
+Single calls use bench_mcp_rpc's minimal MCP client in place of the SDK
+client.
+
+Usage:
+    uv run python benchmarks/bench_tool_batch.py [--port 1883] [--calls 1,2,4,8] [--message-time 0.02]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+import anyio
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_mcp_rpc import RawMcpClient  # noqa: E402
+from esp32_sim import SimulatedFleet, firmware_tools, tool_list  # noqa: E402
+from mcp_batch import McpBatchClient  # noqa: E402
+from mcp_tools import ToolRegistry, namespaced_tool_name  # noqa: E402
+from tool_dispatch import ToolDispatcher  # noqa: E402
+
+
+class SingleCallClient:
+    """call_tool with the SDK client's contract over the minimal MCP client"""
+
+    def __init__(self, raw_client: RawMcpClient):
+        self.raw_client = raw_client
+
+    async def call_tool(self, server_name, name, arguments=None):
+        try:
+            result = await self.raw_client.call_tool(server_name, name, arguments or {})
+        except RuntimeError:
+            return False
+        return types.CallToolResult.model_validate(result)
+
+
+def step_calls(count: int):
+    """(tool, arguments) of an LLM step with `count` calls to one device"""
+    calls = [("set_volume", {"volume": 40}), ("echo", {"text": "status"})]
+    return [calls[i % len(calls)] for i in range(count)]
+
+
+async def wait_for_presence(batch_client: McpBatchClient, names, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while set(names) - set(batch_client.server_client_ids):
+        if time.monotonic() > deadline:
+            raise RuntimeError("batch client did not see the simulated servers")
+        await asyncio.sleep(0.05)
+
+
+async def run_mode(args, mode: str) -> list:
+    fleet = SimulatedFleet(
+        args.servers,
+        host=args.host,
+        port=args.port,
+        service_time=args.service_time,
+        message_time=args.message_time,
+        batch=mode != "fallback",
+    )
+    if not fleet.start():
+        fleet.stop()
+        raise SystemExit(f"could not connect the simulators to {args.host}:{args.port}")
+
+    raw_client = RawMcpClient(args.host, args.port, 0)
+    batch_client = None
+    rows = []
+    try:
+        await raw_client.connect()
+        for server in fleet.servers:
+            await raw_client.initialize(server.client_id, server.name)
+        if mode != "single":
+            batch_client = McpBatchClient(args.host, args.port)
+            batch_client.start()
+            for name in fleet.names:
+                batch_client.enable(name)
+            await wait_for_presence(batch_client, fleet.names)
+
+        for count in args.calls:
+            dispatcher = ToolDispatcher(
+                SingleCallClient(raw_client), batch_window=args.window, max_batch=args.max_batch
+            )
+            registry = ToolRegistry(dispatcher.client, dispatcher=dispatcher)
+            tools = [types.Tool.model_validate(tool) for tool in tool_list(firmware_tools())]
+            for name in fleet.names:
+                registry.update_server(name, tools)
+                if batch_client is not None:
+                    # main.py enables servers whose initialize result announces batches;
+                    # here the batch session's own check decides
+                    batch_client.enable(name)
+            dispatcher.batch_client = batch_client
+            by_name = {tool.metadata.name: tool for tool in registry.snapshot()}
+
+            device_messages = sum(server.messages for server in fleet.servers)
+            latencies = []
+            failed = 0
+            for turn in range(args.turns):
+                server_name = fleet.names[turn % len(fleet.names)]
+                start = time.perf_counter()
+                outputs = []
+
+                async def call(tool_name, arguments):
+                    tool = by_name[namespaced_tool_name(server_name, tool_name)]
+                    outputs.append(str(await tool.acall(**arguments)))
+
+                async with anyio.create_task_group() as tg:
+                    for tool_name, arguments in step_calls(count):
+                        tg.start_soon(call, tool_name, arguments)
+                latencies.append(time.perf_counter() - start)
+                failed += sum(output.startswith("call ") for output in outputs)
+
+            rows.append(
+                {
+                    "mode": mode,
+                    "calls": count,
+                    "messages": sum(dispatcher.messages.values()) / args.turns,
+                    "device_messages": (
+                        sum(server.messages for server in fleet.servers) - device_messages
+                    )
+                    / args.turns,
+                    "p50_ms": statistics.median(latencies) * 1000,
+                    "failed": failed,
+                    "fallbacks": dispatcher.fallbacks,
+                }
+            )
+    finally:
+        raw_client.close()
+        if batch_client is not None:
+            batch_client.close()
+        fleet.stop()
+    return rows
+
+
+async def run(args):
+    print(
+        f"{args.servers} devices, {args.message_time * 1000:.0f} ms per message, "
+        f"{args.service_time * 1000:.0f} ms per call, window {args.window * 1000:.0f} ms"
+    )
+    print(
+        f"{'mode':>9}{'calls/step':>12}{'msgs/step':>11}{'device msgs':>13}"
+        f"{'step p50 ms':>13}{'failed':>8}{'fallbacks':>11}"
+    )
+    for mode in ("single", "batch", "fallback"):
+        for r in await run_mode(args, mode):
+            print(
+                f"{r['mode']:>9}{r['calls']:>12}{r['messages']:>11.1f}"
+                f"{r['device_messages']:>13.1f}{r['p50_ms']:>13.1f}{r['failed']:>8}"
+                f"{r['fallbacks']:>11}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON-RPC batches of tool calls")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--servers", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument(
+        "--calls", type=lambda s: [int(n) for n in s.split(",")], default=[1, 2, 4, 8]
+    )
+    parser.add_argument(
+        "--message-time", type=float, default=0.02, help="device seconds per message"
+    )
+    parser.add_argument("--service-time", type=float, default=0.005, help="seconds per call")
+    parser.add_argument("--window", type=float, default=0.005, help="batch window, seconds")
+    parser.add_argument("--max-batch", type=int, default=8)
+    args = parser.parse_args()
+    # The fallback mode logs the failed feature check of every server
+    logging.disable(logging.WARNING)
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
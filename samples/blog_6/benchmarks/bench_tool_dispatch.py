@@ -0,0 +1,74 @@
+"""
+Turn latency of several tool calls in one LLM step
+
+Runs K tool calls spread over several simulated devices, first one after
+another (sum of round trips) and then concurrently through ToolDispatcher,
+which keeps one in-flight call per device. With calls on distinct devices the
+concurrent turn should cost roughly one round trip. Only function-calling
+models issue several calls in one step; the default ReAct models of main.py
+issue one, see tool_dispatch.py.
+
+Usage:
+    uv run python benchmarks/bench_tool_dispatch.py [--rtt 0.2] [--calls 4]
+"""
+
+import argparse
+import functools
+import os
+import sys
+import time
+
+import anyio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_tool_registry import SimulatedFleetClient  # noqa: E402
+from mcp_tools import ToolRegistry  # noqa: E402
+from tool_dispatch import ToolDispatcher  # noqa: E402
+
+
+async def run_turn(tools, concurrent: bool) -> float:
+    start = time.perf_counter()
+    if concurrent:
+        async with anyio.create_task_group() as tg:
+            for tool in tools:
+                tg.start_soon(functools.partial(tool.acall, value=1))
+    else:
+        for tool in tools:
+            await tool.acall(value=1)
+    return time.perf_counter() - start
+
+
+async def run(args):
+    print(f"{'devices':>8}{'calls':>7}{'sequential ms':>15}{'concurrent ms':>15}")
+    for n_devices in (1, 2, args.calls):
+        client = SimulatedFleetClient(n_devices, args.rtt, tools_per_server=1)
+        dispatcher = ToolDispatcher(client, timeout=args.rtt * args.calls * 2)
+        registry = ToolRegistry(client, dispatcher=dispatcher)
+        await registry.refresh_all(list(client.tools))
+
+        per_device = registry.snapshot()
+        tools = [per_device[i % n_devices] for i in range(args.calls)]
+
+        sequential = await run_turn(tools, concurrent=False)
+        concurrent = await run_turn(tools, concurrent=True)
+        print(
+            f"{n_devices:>8}{args.calls:>7}{sequential * 1000:>15.0f}"
+            f"{concurrent * 1000:>15.0f}"
+        )
+
+    print("\nper-device latency of the last run:")
+    for server_name, stats in sorted(dispatcher.summary().items()):
+        print(f"  {server_name}: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tool call dispatch latency")
+    parser.add_argument("--rtt", type=float, default=0.2, help="call_tool round trip, seconds")
+    parser.add_argument("--calls", type=int, default=4, help="tool calls in one LLM step")
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Tool listing across many MCP servers
+
+Simulates a fleet of MCP servers whose list_tools round trip takes --rtt
+seconds and compares listing them one after another (the old
+get_mcp_tools behaviour) with ToolRegistry.refresh_all(), which lists
+concurrently. Also reports the cost of an incremental update and of taking
+a snapshot.
+
+Usage:
+    uv run python benchmarks/bench_tool_registry.py [--servers 100,500] [--rtt 0.05]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import anyio
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mcp_tools import ToolRegistry  # noqa: E402
+
+
+class SimulatedFleetClient:
+    """Answers list_tools like an MQTT client talking to N devices"""
+
+    def __init__(self, n_servers: int, rtt: float, tools_per_server: int = 2):
+        self.rtt = rtt
+        self.tools = {
+            f"ESP32 Device {i}": [
+                types.Tool(
+                    name=f"tool_{j}",
+                    description=f"Tool {j} of device {i}",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {"value": {"type": "integer"}},
+                        "required": ["value"],
+                    },
+                )
+                for j in range(tools_per_server)
+            ]
+            for i in range(n_servers)
+        }
+
+    async def list_tools(self, server_name):
+        await anyio.sleep(self.rtt)
+        return types.ListToolsResult(tools=self.tools[server_name])
+
+    async def call_tool(self, server_name, name, arguments=None):
+        await anyio.sleep(self.rtt)
+        return types.CallToolResult(content=[types.TextContent(type="text", text="ok")])
+
+
+async def list_serially(client) -> float:
+    start = time.perf_counter()
+    for server_name in client.tools:
+        await client.list_tools(server_name)
+    return time.perf_counter() - start
+
+
+async def run(args):
+    print(
+        f"{'servers':>8}{'serial s':>10}{'registry s':>12}{'update ms':>11}"
+        f"{'snapshot us':>13}{'tools':>7}"
+    )
+    for n_servers in args.servers:
+        client = SimulatedFleetClient(n_servers, args.rtt)
+        serial = await list_serially(client) if n_servers <= args.max_serial else None
+
+        registry = ToolRegistry(client)
+        concurrent = await registry.refresh_all(list(client.tools))
+
+        # One device reconnecting with a changed tool set
+        changed = client.tools["ESP32 Device 0"][:1]
+        start = time.perf_counter()
+        registry.update_server("ESP32 Device 0", changed)
+        update_ms = (time.perf_counter() - start) * 1000
+
+        registry.snapshot()
+        start = time.perf_counter()
+        for _ in range(1000):
+            tools = registry.snapshot()
+        snapshot_us = (time.perf_counter() - start) * 1000
+
+        serial_text = f"{serial:>10.2f}" if serial is not None else f"{'-':>10}"
+        print(
+            f"{n_servers:>8}{serial_text}{concurrent:>12.2f}{update_ms:>11.2f}"
+            f"{snapshot_us:>13.2f}{len(tools):>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tool listing across many servers")
+    parser.add_argument(
+        "--servers",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[10, 100, 500],
+    )
+    parser.add_argument("--rtt", type=float, default=0.05, help="list_tools round trip, seconds")
+    parser.add_argument(
+        "--max-serial", type=int, default=200, help="skip the serial baseline above this"
+    )
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
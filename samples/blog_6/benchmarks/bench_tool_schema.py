@@ -0,0 +1,132 @@
+"""
+Device round trips wasted on malformed tool arguments, untyped vs typed
+
+Replays arguments LLMs produce for the firmware's set_volume and
+explain_photo tools (right, stringly typed, misnamed, missing, extra)
+through the MCP tool wrapper against a stand-in for the firmware's checks:
+exact argument names (-32601 otherwise) and its own type and range
+checks. Untyped is the old wrapper whose only parameter is `kwargs`;
+typed validates against the fn_schema generated from the inputSchema and
+coerces what it can before anything is sent. Also reports the cost of
+validating one call.
+
+Usage:
+    uv run python benchmarks/bench_tool_schema.py [--iterations 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import anyio
+import mcp.types as types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from esp32_sim import firmware_tools, tool_list  # noqa: E402
+from mcp_tools import create_mcp_tool_wrapper  # noqa: E402
+from tool_schema import ArgumentStats, create_fn_schema, validate_arguments  # noqa: E402
+
+SERVER = "ESP32 Demo Server"
+
+SUCCESS = {"Volume set successfully", "A person in a blue shirt, smiling"}
+
+# (tool, arguments as the LLM produced them)
+CALLS = [
+    ("set_volume", {"volume": 40}),
+    ("set_volume", {"volume": "40"}),
+    ("set_volume", {"volume": 40.0}),
+    ("set_volume", {"volume": "loud"}),
+    ("set_volume", {"level": 40}),
+    ("set_volume", {}),
+    ("set_volume", {"volume": 40, "unit": "%"}),
+    ("set_volume", {"volume": 150}),
+    ("explain_photo", {"url": "http://cam/1.jpg", "question": "who is it?"}),
+    ("explain_photo", {"url": "http://cam/1.jpg"}),
+    ("explain_photo", {"image": "http://cam/1.jpg", "question": "who is it?"}),
+    ("explain_photo", {"url": ["http://cam/1.jpg"], "question": "who is it?"}),
+]
+
+
+class FirmwareClient:
+    """Applies the checks of mcp_server.c and main.c to each call_tool"""
+
+    def __init__(self):
+        self.tools = firmware_tools()
+        self.round_trips = 0
+        self.rejections = 0
+
+    async def call_tool(self, server_name, name, arguments=None):
+        self.round_trips += 1
+        kwargs = (arguments or {}).get("kwargs")
+        tool = self.tools.get(name)
+        if (
+            not isinstance(kwargs, dict)
+            or tool is None
+            or sorted(kwargs) != sorted(prop for prop, _, _ in tool[1])
+        ):
+            self.rejections += 1
+            return types.CallToolResult(
+                content=[types.TextContent(type="text", text="Method not found")], isError=True
+            )
+        try:
+            text = tool[2](kwargs)
+        except Exception as e:
+            text = f"error: {e}"
+        if text not in SUCCESS:
+            self.rejections += 1
+        return types.CallToolResult(content=[types.TextContent(type="text", text=text)])
+
+
+async def replay(typed: bool) -> dict:
+    client = FirmwareClient()
+    stats = ArgumentStats()
+    tools = {tool["name"]: types.Tool.model_validate(tool) for tool in tool_list(firmware_tools())}
+    ok = 0
+    for name, arguments in CALLS:
+        fn_schema = create_fn_schema(tools[name]) if typed else None
+        wrapper = create_mcp_tool_wrapper(
+            client, SERVER, name, fn_schema=fn_schema, argument_stats=stats
+        )
+        # The untyped tool's only parameter is `kwargs`, the typed one has the real ones
+        text = await (wrapper(**arguments) if typed else wrapper(kwargs=arguments))
+        ok += text in SUCCESS
+    return {
+        "succeeded": ok,
+        "round_trips": client.round_trips,
+        "device_rejections": client.rejections,
+        "local_rejections": stats.stats()["rejected"],
+    }
+
+
+async def run(args):
+    print(f"{len(CALLS)} calls as produced by the LLM")
+    print(f"{'wrapper':>8}{'succeeded':>11}{'round trips':>13}{'rejected by device':>20}"
+          f"{'rejected locally':>18}")
+    for typed in (False, True):
+        r = await replay(typed)
+        print(
+            f"{'typed' if typed else 'untyped':>8}{r['succeeded']:>11}{r['round_trips']:>13}"
+            f"{r['device_rejections']:>20}{r['local_rejections']:>18}"
+        )
+
+    fn_schema = create_fn_schema(
+        types.Tool.model_validate(tool_list(firmware_tools())[0])
+    )
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        validate_arguments(fn_schema, {"volume": "40"})
+    per_call = (time.perf_counter() - start) / args.iterations
+    print(f"validation: {per_call * 1e6:.1f} us per call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Typed tool argument validation")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
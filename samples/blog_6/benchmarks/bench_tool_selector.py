@@ -0,0 +1,392 @@
+"""
+Prompt size and tool recall with relevance-filtered tool exposure
+
+Builds catalogs of 10, 100 and 1000 tools: the firmware's tools on the demo
+server plus a simulated home of lights, thermostats, fans, curtains, locks,
+speakers, sensors, dehumidifiers and kettles across rooms, registered
+through the ToolRegistry as they would be from tools/list. For labeled
+English and Chinese requests (including follow-ups that only make sense
+with the previous message) it reports the estimated tokens of the ReAct
+tool section with every tool and with the top-k selection, with and without
+compact schemas, how often the tool the request needs was among those
+exposed (recall, what bounds answer accuracy: the LLM can not call a tool
+it was not shown), and the selection latency. No LLM is called.
+
+Recall is measured with the device-agnostic synonyms of tool_selector.py
+alone ("generic") and with the site vocabulary a deployment passes in
+("site": the Chinese names of its rooms and device types, built here from
+the catalog). "held-out" requests are the ones the synonym table was not
+written against: other phrasings, the dehumidifier and kettle device types
+and the nursery and attic rooms.
+
+Usage:
+    uv run python benchmarks/bench_tool_selector.py [--top-k 8] [--sizes 10 100 1000]
+"""
+
+import argparse
+import dataclasses
+import itertools
+import os
+import statistics
+import sys
+import time
+
+import mcp.types as types
+from pydantic import ConfigDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from esp32_sim import firmware_tools, tool_list  # noqa: E402
+from history import estimate_tokens  # noqa: E402
+from mcp_tools import ToolRegistry, namespaced_tool_name  # noqa: E402
+from tool_selector import ToolSelector, tokenize  # noqa: E402
+
+DEMO_SERVER = "ESP32 Demo Server"
+
+ROOMS = [
+    ("Living Room", "客厅"),
+    ("Bedroom", "卧室"),
+    ("Kitchen", "厨房"),
+    ("Study", "书房"),
+    ("Bathroom", "浴室"),
+    ("Garage", "车库"),
+    ("Balcony", "阳台"),
+]
+# Rooms the synonym table was not written against
+HELD_OUT_ROOMS = [("Nursery", "婴儿房"), ("Attic", "阁楼")]
+
+
+def tool(name, description, properties=None, required=None):
+    return {
+        "name": name,
+        "description": description,
+        "inputSchema": {
+            "type": "object",
+            "properties": properties or {},
+            "required": required if required is not None else list(properties or {}),
+        },
+    }
+
+
+def level(description, minimum=0, maximum=100):
+    return {"type": "integer", "description": description, "minimum": minimum, "maximum": maximum}
+
+
+# device type -> (Chinese name, tools, requests, held-out requests), requests are
+# [(English request, Chinese request, expected tool)] using {dev} / {dev_zh}; a leading
+# "+" marks a follow-up of the request before it. Held-out requests are phrasings the
+# synonym table of tool_selector.py was not written against
+DEVICE_TYPES = {
+    "Light": (
+        "灯",
+        [
+            tool("set_power", "Turn the light on or off",
+                 {"on": {"type": "boolean", "description": "true to turn on"}}),
+            tool("set_brightness", "Set the brightness of the light",
+                 {"brightness": level("Brightness (0-100)")}),
+            tool("set_color", "Set the color of the light",
+                 {"color": {"type": "string", "enum": ["white", "red", "green", "blue"]}}),
+        ],
+        [
+            ("turn on the {dev}", "打开{dev_zh}", "set_power"),
+            ("set the {dev} brightness to 30", "把{dev_zh}亮度调到30", "set_brightness"),
+            ("+a bit brighter", "+再亮一点", "set_brightness"),
+            ("make the {dev} blue", "把{dev_zh}调成蓝色", "set_color"),
+        ],
+        [
+            ("it's too dark, switch on the {dev}", "{dev_zh}开一下", "set_power"),
+            ("dim the {dev} down to 10", "{dev_zh}调暗到10", "set_brightness"),
+        ],
+    ),
+    "Thermostat": (
+        "空调",
+        [
+            tool("set_temperature", "Set the target temperature in degrees Celsius",
+                 {"temperature": {"type": "number", "minimum": 16, "maximum": 30}}),
+            tool("get_temperature", "Read the current room temperature"),
+            tool("set_mode", "Set the operating mode",
+                 {"mode": {"type": "string", "enum": ["heat", "cool", "auto", "off"]}}),
+        ],
+        [
+            ("set the {dev} temperature to 24", "把{dev_zh}温度调到24度", "set_temperature"),
+            ("+what is it now?", "+现在多少度？", "get_temperature"),
+            ("switch the {dev} to cool mode", "把{dev_zh}调成制冷模式", "set_mode"),
+        ],
+        [
+            ("I'm cold, warm the {dev} up to 26 degrees", "{dev_zh}有点冷，调到26度", "set_temperature"),
+            ("put the {dev} on heating", "{dev_zh}开制热", "set_mode"),
+        ],
+    ),
+    "Fan": (
+        "风扇",
+        [
+            tool("set_power", "Turn the fan on or off",
+                 {"on": {"type": "boolean", "description": "true to turn on"}}),
+            tool("set_speed", "Set the fan speed", {"speed": level("Speed (1-5)", 1, 5)}),
+        ],
+        [
+            ("turn off the {dev}", "关掉{dev_zh}", "set_power"),
+            ("set the {dev} speed to 3", "把{dev_zh}风速调到3", "set_speed"),
+        ],
+        [
+            ("stop the {dev}", "{dev_zh}停一下", "set_power"),
+            ("run the {dev} faster, level 5", "{dev_zh}转快点，5档", "set_speed"),
+        ],
+    ),
+    "Curtain": (
+        "窗帘",
+        [
+            tool("open_curtain", "Open the curtain fully"),
+            tool("close_curtain", "Close the curtain fully"),
+            tool("set_position", "Open the curtain partially",
+                 {"position": level("Position, 0 closed to 100 open")}),
+        ],
+        [
+            ("close the {dev}", "拉上{dev_zh}", "close_curtain"),
+            ("open the {dev} halfway", "把{dev_zh}打开一半", "set_position"),
+        ],
+        [
+            ("draw the {dev}", "把{dev_zh}合上", "close_curtain"),
+            ("let some light in through the {dev}", "{dev_zh}全部打开", "open_curtain"),
+        ],
+    ),
+    "Lock": (
+        "门锁",
+        [
+            tool("lock_door", "Lock the door"),
+            tool("unlock_door", "Unlock the door"),
+            tool("get_battery", "Battery level of the lock in percent"),
+        ],
+        [
+            ("unlock the {dev}", "把{dev_zh}解锁", "unlock_door"),
+            ("how much battery does the {dev} have left?", "{dev_zh}还有多少电量？",
+             "get_battery"),
+        ],
+        [
+            ("secure the {dev}", "{dev_zh}锁好", "lock_door"),
+            ("is the {dev} running low?", "{dev_zh}快没电了吗", "get_battery"),
+        ],
+    ),
+    "Speaker": (
+        "音箱",
+        [
+            tool("set_volume", "Set the volume of the speaker, range 0 to 100",
+                 {"volume": level("Volume level (0-100)")}),
+            tool("play_music", "Play music matching a search query",
+                 {"query": {"type": "string", "description": "song, artist or genre"}}),
+            tool("stop_music", "Stop playing music"),
+        ],
+        [
+            ("play some jazz on the {dev}", "用{dev_zh}放点爵士音乐", "play_music"),
+            ("+louder please, 60", "+音量调到60", "set_volume"),
+        ],
+        [
+            ("turn the {dev} down to 15", "{dev_zh}小声点，15", "set_volume"),
+            ("put on some Beatles on the {dev}", "{dev_zh}来首周杰伦", "play_music"),
+        ],
+    ),
+    "Sensor": (
+        "传感器",
+        [
+            tool("get_temperature", "Read the temperature in degrees Celsius"),
+            tool("get_humidity", "Read the relative humidity in percent"),
+        ],
+        [
+            ("what's the humidity at the {dev}?", "{dev_zh}湿度是多少？", "get_humidity"),
+        ],
+        [
+            ("how damp is it by the {dev}?", "{dev_zh}那边潮不潮", "get_humidity"),
+            ("how warm is it at the {dev}?", "{dev_zh}现在几度", "get_temperature"),
+        ],
+    ),
+}
+
+# Device types the synonym table was not written against, every request is held out
+DEVICE_TYPES.update(
+    {
+        "Dehumidifier": (
+            "除湿机",
+            [
+                tool("set_power", "Turn the dehumidifier on or off",
+                     {"on": {"type": "boolean", "description": "true to turn on"}}),
+                tool("set_target_humidity", "Set the target relative humidity",
+                     {"humidity": level("Relative humidity in percent", 30, 80)}),
+                tool("get_water_tank", "Fill level of the water tank in percent"),
+            ],
+            [],
+            [
+                ("turn on the {dev}", "打开{dev_zh}", "set_power"),
+                ("keep the {dev} at 45 percent humidity", "{dev_zh}湿度设到45", "set_target_humidity"),
+                ("+is the tank full?", "+水箱满了吗", "get_water_tank"),
+            ],
+        ),
+        "Kettle": (
+            "水壶",
+            [
+                tool("boil", "Boil the water in the kettle"),
+                tool("set_keep_warm", "Keep the water warm at a temperature",
+                     {"temperature": level("Temperature in degrees Celsius", 40, 95)}),
+            ],
+            [],
+            [
+                ("boil water in the {dev}", "用{dev_zh}烧水", "boil"),
+                ("keep the {dev} warm at 60", "{dev_zh}保温60度", "set_keep_warm"),
+            ],
+        ),
+    }
+)
+
+# Requests for the demo server's firmware tools
+DEMO_REQUESTS = [
+    ("set the volume to 40", "把音量调到40", "set_volume"),
+    ("how do I look today?", "你看看我今天打扮得怎么样", "explain_photo"),
+]
+
+
+def build_fleet(size: int):
+    """[(server name, Chinese device name, device type, held-out room, [types.Tool])]"""
+    demo_tools = [types.Tool.model_validate(t) for t in tool_list(firmware_tools())]
+    fleet = [(DEMO_SERVER, "", None, False, demo_tools)]
+    count = len(demo_tools)
+    rooms = ROOMS + HELD_OUT_ROOMS
+    device_types = list(DEVICE_TYPES)
+    numbers = {}
+    for i in itertools.count():
+        # Every device type in every room, spread so small catalogs get a bit of each
+        device_type = device_types[i % len(device_types)]
+        room, room_zh = rooms[(i + i // len(device_types)) % len(rooms)]
+        zh, tools, _, _ = DEVICE_TYPES[device_type]
+        if count + len(tools) > size:
+            break
+        n = numbers[room, device_type] = numbers.get((room, device_type), 0) + 1
+        fleet.append(
+            (f"ESP32 {room} {device_type} {n}", f"{room_zh}{n}号{zh}", device_type,
+             (room, room_zh) in HELD_OUT_ROOMS, [types.Tool.model_validate(t) for t in tools])
+        )
+        count += len(tools)
+    return fleet
+
+
+def site_synonyms() -> dict:
+    """Chinese names of the catalog's rooms and device types, as a deployment would list them"""
+    synonyms = {}
+    for name, zh in ROOMS + HELD_OUT_ROOMS + [(t, DEVICE_TYPES[t][0]) for t in DEVICE_TYPES]:
+        synonyms.setdefault(tokenize(name)[0], []).append(zh)
+    return synonyms
+
+
+def build_requests(fleet, per_type: int):
+    """[(message, previous message, expected namespaced tool, held out)] in English and Chinese"""
+    requests = []
+    for en, zh, expected in DEMO_REQUESTS:
+        name = namespaced_tool_name(DEMO_SERVER, expected)
+        requests += [(en, None, name, False), (zh, None, name, False)]
+    seen = {}
+    for server_name, dev_zh, device_type, held_out_room, _ in fleet[1:]:
+        # per_type devices of each type in the regular and in the held-out rooms
+        key = (device_type, held_out_room)
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > per_type:
+            continue
+        dev = server_name.removeprefix("ESP32 ").lower()
+        _, _, regular, held_out = DEVICE_TYPES[device_type]
+        for phrasings, held_out_phrasing in ((regular, False), (held_out, True)):
+            previous = {}
+            for en, zh, expected in phrasings:
+                name = namespaced_tool_name(server_name, expected)
+                for lang, text in (("en", en), ("zh", zh)):
+                    message = text.format(dev=dev, dev_zh=dev_zh)
+                    follow_up = message.startswith("+")
+                    message = message.removeprefix("+")
+                    requests.append(
+                        (message, previous.get(lang) if follow_up else None, name,
+                         held_out_phrasing or held_out_room)
+                    )
+                    previous[lang] = message
+    return requests
+
+
+def tool_section_tokens(tools, compact: bool = True) -> int:
+    """Estimated tokens of the tool descriptions a ReAct prompt carries"""
+    total = 0
+    for t in tools:
+        fn_schema = t.metadata.fn_schema
+        if not compact:
+            # The same model without the compact schema hook, as pydantic renders it
+            config = ConfigDict(**{**fn_schema.model_config, "json_schema_extra": None})
+            fn_schema = type(fn_schema.__name__, (fn_schema,), {"model_config": config})
+        schema = dataclasses.replace(t.metadata, fn_schema=fn_schema).fn_schema_str
+        total += estimate_tokens(
+            f"> Tool Name: {t.metadata.name}\n"
+            f"Tool Description: {t.metadata.description}\n"
+            f"Tool Args: {schema}\n"
+        )
+    return total
+
+
+def run_size(size: int, args, synonyms=None):
+    registry = ToolRegistry()
+    fleet = build_fleet(size)
+    for server_name, _, _, _, tools in fleet:
+        registry.update_server(server_name, tools)
+    catalog = registry.snapshot()
+    selector = ToolSelector(args.top_k, args.always, synonyms)
+    selector.index(catalog)
+
+    requests = build_requests(fleet, args.per_type)
+    hits = {(held_out, lang): [] for held_out in (False, True) for lang in ("en", "zh")}
+    tokens = []
+    latencies = []
+    for message, previous, expected, held_out in requests:
+        start = time.perf_counter()
+        selected = selector.select(message, previous)
+        latencies.append(time.perf_counter() - start)
+        lang = "en" if message.isascii() else "zh"
+        hits[held_out, lang].append(expected in {t.metadata.name for t in selected})
+        tokens.append(tool_section_tokens(selected))
+
+    def recall(held_out, lang):
+        samples = hits[held_out, lang]
+        return statistics.mean(samples) if samples else float("nan")
+
+    return {
+        "tools": len(catalog),
+        "all_verbose": tool_section_tokens(catalog, compact=False),
+        "all": tool_section_tokens(catalog),
+        "selected": statistics.mean(tokens),
+        "recall": [recall(h, lang) for h in (False, True) for lang in ("en", "zh")],
+        "requests": len(requests),
+        "p50_us": statistics.median(latencies) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relevance-filtered tool exposure")
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--always", nargs="*", default=[], help="tools always exposed")
+    parser.add_argument("--per-type", type=int, default=3, help="devices per type to query")
+    args = parser.parse_args()
+
+    print(f"top-k {args.top_k}, tool section tokens (estimated) per prompt")
+    print(
+        f"{'tools':>6}{'all, verbose':>14}{'all':>8}{'top-k':>8}{'requests':>10}"
+        f"{'vocabulary':>12}{'recall en':>11}{'recall zh':>11}"
+        f"{'held-out en':>13}{'held-out zh':>13}{'select us':>11}"
+    )
+    for size in args.sizes:
+        for vocabulary, synonyms in (("generic", None), ("site", site_synonyms())):
+            r = run_size(size, args, synonyms)
+            print(
+                f"{r['tools']:>6}{r['all_verbose']:>14}{r['all']:>8}{r['selected']:>8.0f}"
+                f"{r['requests']:>10}{vocabulary:>12}"
+                + "".join(
+                    f"{value:>{width}.0%}"
+                    for value, width in zip(r["recall"], (11, 11, 13, 13))
+                )
+                + f"{r['p50_us']:>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
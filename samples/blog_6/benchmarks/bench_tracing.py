@@ -0,0 +1,87 @@
+"""
+Cost of turn tracing and what a trace shows
+
+Measures span() outside a turn (what every tool call pays when no turn is
+traced) and inside one, then runs a simulated turn: an LLM call, parallel
+tool calls through the ToolRegistry wrappers and ToolDispatcher to a
+simulated device fleet, and a second LLM call. Prints the per-category
+breakdown and writes the Chrome trace to --output.
+
+Usage:
+    uv run python benchmarks/bench_tracing.py [--output /tmp/agent-traces] [--tools 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import anyio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_tool_registry import SimulatedFleetClient  # noqa: E402
+from mcp_tools import ToolRegistry  # noqa: E402
+from tool_dispatch import ToolDispatcher  # noqa: E402
+from tracing import Tracer, span  # noqa: E402
+
+
+def span_cost_ns(iterations: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        with span("bench", "bench", server="ESP32 Device 0"):
+            pass
+    return (time.perf_counter_ns() - start) / iterations
+
+
+async def simulated_turn(tracer, tools, llm_latency: float):
+    trace = tracer.start_turn(message_chars=12)
+    for step in range(2):
+        llm_start = time.perf_counter_ns()
+        await anyio.sleep(llm_latency)
+        trace.add("llm", "llm", llm_start, time.perf_counter_ns(), step=step)
+        if step == 0:
+            async with anyio.create_task_group() as tg:
+                for tool in tools:
+                    tg.start_soon(lambda t=tool: t.acall(value=1))
+    return tracer.end_turn(trace)
+
+
+async def run(args):
+    disabled = span_cost_ns(args.iterations)
+    probe = Tracer()
+    probe_turn = probe.start_turn("probe")
+    enabled = span_cost_ns(args.iterations)
+    probe.end_turn(probe_turn)
+
+    client = SimulatedFleetClient(args.tools, args.rtt, tools_per_server=1)
+    dispatcher = ToolDispatcher(client)
+    registry = ToolRegistry(client, dispatcher=dispatcher)
+    await registry.refresh_all(list(client.tools))
+    tools = registry.snapshot()
+
+    tracer = Tracer(args.output)
+    summary = await simulated_turn(tracer, tools, args.llm_latency)
+    print(f"span outside a turn: {disabled:.0f} ns, inside a turn: {enabled:.0f} ns")
+    print(f"simulated turn {summary['elapsed_ms']:.0f} ms, {summary['spans']} spans")
+    for category, ms in sorted(summary["ms"].items()):
+        print(f"  {category:<10}{ms:>10.1f} ms")
+    overhead_us = summary["spans"] * enabled / 1000
+    print(f"tracing overhead of the turn: ~{overhead_us:.0f} us")
+    if args.output:
+        print(f"trace written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn tracing cost")
+    parser.add_argument("--output", default=None, help="trace directory or .jsonl file")
+    parser.add_argument("--tools", type=int, default=4, help="parallel tool calls in the turn")
+    parser.add_argument("--rtt", type=float, default=0.05, help="call_tool round trip, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="one LLM call, seconds")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+    anyio.run(run, args)
+
+
+if __name__ == "__main__":
+    main()
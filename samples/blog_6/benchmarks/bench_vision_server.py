@@ -0,0 +1,219 @@
+"""
+Load benchmark for vision_server.py
+
+Starts a fake OpenAI-compatible upstream (benchmarks/fake_upstream.py) and the
+vision server pointed at it, then posts synthetic JPEG payloads of several
+sizes at increasing concurrency. For every step it reports requests/sec,
+latency percentiles, how long the server's event loop was blocked and the
+server's peak RSS.
+
+Usage:
+    uv run python benchmarks/bench_vision_server.py \
+        [--latency 0.4] [--token-rate 40] [--concurrency 1,4,16,64] [--requests 64]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+
+PAYLOAD_SIZES = {
+    "QVGA": (320, 240),
+    "VGA": (640, 480),
+    "UXGA": (1600, 1200),
+}
+
+# Event loop lag below this is scheduling noise, not blocking
+LAG_THRESHOLD = 0.005
+LAG_INTERVAL = 0.01
+
+
+def serve_app(port: int):
+    """Run vision_server with an event loop lag monitor and a stats endpoint"""
+    import uvicorn
+
+    sys.path.insert(0, APP_DIR)
+    import vision_server
+
+    app = vision_server.app
+    loop_stats = {"blocked": 0.0, "max_lag": 0.0}
+
+    async def monitor_loop():
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = loop.time() - start - LAG_INTERVAL
+            if lag > LAG_THRESHOLD:
+                loop_stats["blocked"] += lag
+                loop_stats["max_lag"] = max(loop_stats["max_lag"], lag)
+
+    def ensure_monitor():
+        # Started from the first stats request, which the driver sends before any load
+        if getattr(app.state, "monitor", None) is None:
+            app.state.monitor = asyncio.create_task(monitor_loop())
+
+    @app.get("/__bench__/stats")
+    async def bench_stats():
+        ensure_monitor()
+        return {
+            **loop_stats,
+            "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    @app.post("/__bench__/reset")
+    async def bench_reset():
+        ensure_monitor()
+        loop_stats["blocked"] = 0.0
+        loop_stats["max_lag"] = 0.0
+        return loop_stats
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def make_payload(width: int, height: int) -> dict:
+    rng = np.random.default_rng(width)
+    pixels = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=80)
+    url = "data:image/jpg;base64," + base64.b64encode(buffer.getvalue()).decode()
+    return {
+        "role": "user",
+        "content": [
+            {"type": "image_url", "image_url": {"url": url}},
+            {"type": "text", "text": "What is in this photo?"},
+        ],
+    }
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up in {timeout}s")
+
+
+async def run_step(client, url, payload, concurrency, total):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(url, json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def drive(args, app_url: str):
+    async with httpx.AsyncClient(timeout=300) as client:
+        await wait_ready(client, f"{app_url}/__bench__/stats")
+
+        print(
+            f"{'payload':<8}{'KiB':>7}{'conc':>6}{'req/s':>9}{'p50 ms':>9}"
+            f"{'p90 ms':>9}{'p99 ms':>9}{'blocked s':>11}{'max lag ms':>12}"
+            f"{'rss MiB':>9}{'err':>5}"
+        )
+        for name, (width, height) in PAYLOAD_SIZES.items():
+            payload = make_payload(width, height)
+            kib = len(payload["content"][0]["image_url"]["url"]) / 1024
+            for concurrency in args.concurrency:
+                total = max(args.requests, concurrency)
+                await client.post(f"{app_url}/__bench__/reset")
+                latencies, errors, elapsed = await run_step(
+                    client, f"{app_url}/explain_photo", payload, concurrency, total
+                )
+                stats = (await client.get(f"{app_url}/__bench__/stats")).json()
+                print(
+                    f"{name:<8}{kib:>7.0f}{concurrency:>6}{total / elapsed:>9.1f}"
+                    f"{percentile(latencies, 0.5) * 1000:>9.0f}"
+                    f"{percentile(latencies, 0.9) * 1000:>9.0f}"
+                    f"{percentile(latencies, 0.99) * 1000:>9.0f}"
+                    f"{stats['blocked']:>11.2f}{stats['max_lag'] * 1000:>12.0f}"
+                    f"{stats['peak_rss_kib'] / 1024:>9.0f}{errors:>5}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for vision_server.py")
+    parser.add_argument("--serve-app", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--app-port", type=int, default=8801)
+    parser.add_argument("--upstream-port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.4, help="upstream seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="upstream tokens per second")
+    parser.add_argument("--tokens", type=int, default=20, help="upstream completion tokens")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda s: [int(c) for c in s.split(",")],
+        default=[1, 4, 16, 64],
+    )
+    parser.add_argument("--requests", type=int, default=64, help="requests per step")
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args.app_port)
+        return
+
+    env = dict(
+        os.environ,
+        DASHSCOPE_API_KEY="sk-bench",
+        VISION_API_BASE=f"http://127.0.0.1:{args.upstream_port}/v1",
+    )
+    upstream = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCH_DIR, "fake_upstream.py"),
+            "--port", str(args.upstream_port),
+            "--latency", str(args.latency),
+            "--token-rate", str(args.token_rate),
+            "--tokens", str(args.tokens),
+        ],
+        env=env,
+    )
+    app = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve-app", "--app-port", str(args.app_port)],
+        env=env,
+        cwd=APP_DIR,
+    )
+    try:
+        asyncio.run(drive(args, f"http://127.0.0.1:{args.app_port}"))
+    finally:
+        app.terminate()
+        upstream.terminate()
+        app.wait()
+        upstream.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Record and replay the agent's LLM and MCP exchanges
+
+A cassette is a directory with:
+
+- llm.jsonl: one line per chat completion request, with the request body,
+  the response status and the raw response chunks (every SSE chunk of a
+  streamed reply) with their offsets from the request
+- mcp.jsonl: one line per list_tools / call_tool, with the arguments, the
+  result and the elapsed time
+
+LLM traffic is recorded and replayed by an OpenAI-compatible stand-in
+(this module run as a script, the agent points AGENT_LLM_API_BASE at it),
+MCP traffic by wrappers around the MCP client. Replay matches a request by
+its content; one the recording does not have (a prompt changed) gets the
+next unused exchange in recording order and counts as a miss. Responses
+come back with their original timing, or none at all with --latency zero.
+
+Usage:
+    uv run python benchmarks/cassette.py --record cassettes/demo --upstream https://api.siliconflow.cn/v1/chat/completions
+    uv run python benchmarks/cassette.py --replay cassettes/demo [--latency zero] [--port 9003]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+import mcp.types as types
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+LLM_FILE = "llm.jsonl"
+MCP_FILE = "mcp.jsonl"
+SESSIONS_FILE = "sessions.json"
+
+DEFAULT_UPSTREAM = "https://api.siliconflow.cn/v1/chat/completions"
+
+
+def exchange_key(*parts) -> str:
+    """Content hash of a request, independent of dict key order"""
+    text = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class CassetteLog:
+    """Recorded exchanges, one JSON line each, appended as they complete"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def append(self, entry: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class Replay:
+    """Recorded exchanges served by key, in recording order for unknown keys"""
+
+    def __init__(self, entries: List[dict]):
+        self.entries = entries
+        self.reset()
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def reset(self):
+        """Serve the whole recording again"""
+        self.by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        for i, entry in enumerate(self.entries):
+            self.by_key[entry["key"]].append(i)
+        self.used = [False] * len(self.entries)
+        self.next_unused = 0
+        self.hits = 0
+        self.misses = 0
+        # Recorded seconds served with the responses
+        self.waited = 0.0
+
+    def take(self, key: str) -> Optional[dict]:
+        queue = self.by_key.get(key)
+        while queue:
+            i = queue.popleft()
+            if not self.used[i]:
+                self.used[i] = True
+                self.hits += 1
+                return self.entries[i]
+        self.misses += 1
+        while self.next_unused < len(self.entries) and self.used[self.next_unused]:
+            self.next_unused += 1
+        if self.next_unused == len(self.entries):
+            return None
+        self.used[self.next_unused] = True
+        return self.entries[self.next_unused]
+
+    def stats(self) -> dict:
+        return {
+            "recorded": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waited": round(self.waited, 6),
+        }
+
+
+def _dump_result(result):
+    return result.model_dump(mode="json", exclude_none=True) if result is not False else False
+
+
+class RecordingMcpClient:
+    """Pass list_tools / call_tool through to the MCP client and record them"""
+
+    def __init__(self, client, log: CassetteLog):
+        self.client = client
+        self.log = log
+
+    def __getattr__(self, name):
+        # get_session, initialize_mcp_server, ... of the wrapped client
+        return getattr(self.client, name)
+
+    async def list_tools(self, server_name: str):
+        start = time.perf_counter()
+        result = await self.client.list_tools(server_name)
+        self.log.append(
+            {
+                "key": exchange_key("list_tools", server_name),
+                "method": "list_tools",
+                "server": server_name,
+                "result": _dump_result(result),
+                "elapsed": time.perf_counter() - start,
+            }
+        )
+        return result
+
+    async def call_tool(self, server_name: str, name: str, arguments=None):
+        start = time.perf_counter()
+        result = await self.client.call_tool(server_name, name, arguments)
+        self.log.append(
+            {
+                "key": exchange_key("call_tool", server_name, name, arguments),
+                "method": "call_tool",
+                "server": server_name,
+                "name": name,
+                "arguments": arguments,
+                "result": _dump_result(result),
+                "elapsed": time.perf_counter() - start,
+            }
+        )
+        return result
+
+
+class ReplayMcpClient:
+    """MCP client answering list_tools / call_tool from a cassette"""
+
+    def __init__(self, replay: Replay, zero_latency: bool = False):
+        self.replay = replay
+        self.zero_latency = zero_latency
+        self.calls = 0
+
+    @property
+    def server_names(self) -> List[str]:
+        return sorted(
+            {entry["server"] for entry in self.replay.entries if entry["method"] == "list_tools"}
+        )
+
+    async def _take(self, key: str) -> Optional[dict]:
+        entry = self.replay.take(key)
+        if entry is None:
+            return None
+        if not self.zero_latency:
+            self.replay.waited += entry["elapsed"]
+            await asyncio.sleep(entry["elapsed"])
+        return entry
+
+    async def list_tools(self, server_name: str):
+        entry = await self._take(exchange_key("list_tools", server_name))
+        if entry is None or entry["result"] is False:
+            return False
+        return types.ListToolsResult.model_validate(entry["result"])
+
+    async def call_tool(self, server_name: str, name: str, arguments=None):
+        self.calls += 1
+        entry = await self._take(exchange_key("call_tool", server_name, name, arguments))
+        if entry is None or entry["result"] is False:
+            return False
+        return types.CallToolResult.model_validate(entry["result"])
+
+
+def create_app(
+    log: Optional[CassetteLog] = None,
+    upstream: str = DEFAULT_UPSTREAM,
+    replay: Optional[Replay] = None,
+    zero_latency: bool = False,
+) -> FastAPI:
+    """Recording proxy to `upstream` with a log, otherwise replay of `replay`"""
+    import httpx
+
+    app = FastAPI(title="LLM cassette")
+    stats = {"requests": 0}
+
+    async def record(body: bytes, request: Request):
+        payload = json.loads(body)
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": request.headers.get("authorization", ""),
+        }
+        client = httpx.AsyncClient(timeout=None)
+        start = time.perf_counter()
+        upstream_request = client.build_request("POST", upstream, content=body, headers=headers)
+        response = await client.send(upstream_request, stream=True)
+        chunks = []
+
+        async def relay():
+            try:
+                async for chunk in response.aiter_text():
+                    chunks.append([time.perf_counter() - start, chunk])
+                    yield chunk
+            finally:
+                await response.aclose()
+                await client.aclose()
+                log.append(
+                    {
+                        "key": exchange_key(payload),
+                        "request": payload,
+                        "status": response.status_code,
+                        "content_type": response.headers.get("content-type", ""),
+                        "chunks": chunks,
+                    }
+                )
+
+        return StreamingResponse(
+            relay(),
+            status_code=response.status_code,
+            media_type=response.headers.get("content-type"),
+        )
+
+    async def play(body: bytes):
+        payload = json.loads(body)
+        entry = replay.take(exchange_key(payload))
+        if entry is None:
+            return Response(
+                json.dumps({"error": "request not in cassette"}),
+                status_code=500,
+                media_type="application/json",
+            )
+        chunks = entry["chunks"]
+        if not zero_latency and chunks:
+            replay.waited += chunks[-1][0]
+        if not payload.get("stream"):
+            if not zero_latency and chunks:
+                await asyncio.sleep(chunks[-1][0])
+            return Response(
+                "".join(text for _, text in chunks),
+                status_code=entry["status"],
+                media_type=entry["content_type"] or None,
+            )
+
+        async def stream():
+            start = time.perf_counter()
+            for offset, text in chunks:
+                if not zero_latency:
+                    await asyncio.sleep(max(0.0, offset - (time.perf_counter() - start)))
+                yield text
+
+        return StreamingResponse(
+            stream(), status_code=entry["status"], media_type=entry["content_type"] or None
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        stats["requests"] += 1
+        if replay is not None:
+            return await play(body)
+        return await record(body, request)
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, **(replay.stats() if replay is not None else {})}
+
+    @app.post("/reset")
+    async def reset():
+        stats["requests"] = 0
+        if replay is not None:
+            replay.reset()
+        return {"reset": True}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Record or replay LLM exchanges")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", metavar="CASSETTE", help="cassette directory to record to")
+    mode.add_argument("--replay", metavar="CASSETTE", help="cassette directory to replay")
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM, help="chat completions URL")
+    parser.add_argument("--latency", choices=["original", "zero"], default="original")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9003)
+    args = parser.parse_args()
+
+    if args.record:
+        log = CassetteLog(os.path.join(args.record, LLM_FILE))
+        app = create_app(log=log, upstream=args.upstream)
+    else:
+        app = create_app(
+            replay=Replay.load(os.path.join(args.replay, LLM_FILE)),
+            zero_latency=args.latency == "zero",
+        )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
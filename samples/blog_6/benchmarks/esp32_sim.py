@@ -0,0 +1,372 @@
+"""
+Python stand-in for the ESP32 MCP-over-MQTT server (components/mcp-over-mqtt)
+
+Speaks the same topics and payloads as mcp_server.c so agents and the MCP
+client can be benchmarked without hardware:
+
+- retained `notifications/server/online` on $mcp-server/presence/{client_id}/{name},
+  with an empty will message on the same topic
+- `initialize` on the control topic $mcp-server/{client_id}/{name}, answered on
+  $mcp-rpc/{mcp_client_id}/{client_id}/{name} (the MCP client id comes from
+  the MCP-MQTT-CLIENT-ID user property), which is then subscribed
+- `tools/list`, `tools/call` (arguments nested as {"kwargs": {...}}) and the
+  firmware's -32600 / -32601 errors on the $mcp-rpc topic
+
+Like the firmware, requests are handled one at a time; each message takes
+--message-time seconds (receive, parse and publish on the ESP32) and each
+tools/call --service-time more. Besides set_volume and explain_photo the
+simulator has an `echo` tool returning its text, so request and response
+payload sizes can be varied. The firmware drops JSON-RPC batch arrays;
+--batch answers them with one array instead and announces the "batch"
+experimental capability.
+
+Usage:
+    uv run python benchmarks/esp32_sim.py [--host localhost] [--servers 1] [--service-time 0.005] [--batch]
+"""
+
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+import paho.mqtt.client as paho
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.subscribeoptions import SubscribeOptions
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = "2024-11-05"
+
+# name -> (description, [(property, type, description)], handler(kwargs) -> text)
+ToolSpec = Dict[str, tuple]
+
+
+def firmware_tools() -> ToolSpec:
+    """The tools registered by main/main.c, plus echo for payload size tests"""
+
+    def set_volume(kwargs):
+        volume = kwargs["volume"]
+        if not isinstance(volume, (int, float)):
+            return "Volume argument must be an integer"
+        if volume < 0 or volume > 100:
+            return "Volume must be between 0 and 100"
+        return "Volume set successfully"
+
+    def explain_photo(kwargs):
+        # The firmware's messages, including their wording
+        if not isinstance(kwargs["url"], str):
+            return "Address argument must be an integer"
+        if not isinstance(kwargs["question"], str):
+            return "Question argument must be an integer"
+        if not kwargs.get("url"):
+            return "Address must not be empty"
+        if not kwargs.get("question"):
+            return "Question must not be empty"
+        return "A person in a blue shirt, smiling"
+
+    return {
+        "set_volume": (
+            "Set the volume of the device, range 0 to 100",
+            [("volume", "integer", "Volume level (0-100)")],
+            set_volume,
+        ),
+        "explain_photo": (
+            "Explain the photo by the question. Used when users ask a question about the photo",
+            [
+                ("url", "string", "url to explain the photo"),
+                ("question", "string", "the question about the photo"),
+            ],
+            explain_photo,
+        ),
+        "echo": (
+            "Return the text unchanged",
+            [("text", "string", "text to return")],
+            lambda kwargs: str(kwargs["text"]),
+        ),
+    }
+
+
+def tool_list(tools: ToolSpec) -> List[dict]:
+    """tools/list result in the shape jsonrpc_tool_list_response builds"""
+    return [
+        {
+            "name": name,
+            "description": description,
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    prop: {"description": prop_description, "type": prop_type}
+                    for prop, prop_type, prop_description in props
+                },
+                "required": [prop for prop, _, _ in props],
+            },
+        }
+        for name, (description, props, _) in tools.items()
+    ]
+
+
+def user_property(properties, key: str) -> Optional[str]:
+    for name, value in getattr(properties, "UserProperty", None) or []:
+        if name == key:
+            return value
+    return None
+
+
+class SimulatedEsp32Server:
+    """One simulated device, its MQTT network loop runs in paho's thread"""
+
+    def __init__(
+        self,
+        client_id: str,
+        name: str = "ESP32 Demo Server",
+        description: str = "A demo server for ESP32 using MCP over MQTT",
+        host: str = "localhost",
+        port: int = 1883,
+        service_time: float = 0.0,
+        qos: int = 0,
+        tools: Optional[ToolSpec] = None,
+        message_time: float = 0.0,
+        batch: bool = False,
+    ):
+        self.client_id = client_id
+        self.name = name
+        self.description = description
+        self.host = host
+        self.port = port
+        self.service_time = service_time
+        self.message_time = message_time
+        self.batch = batch
+        self.qos = qos
+        self.tools = tools if tools is not None else firmware_tools()
+        self.control_topic = f"$mcp-server/{client_id}/{name}"
+        self.presence_topic = f"$mcp-server/presence/{client_id}/{name}"
+        self.clients: List[str] = []
+        self.calls = 0
+        self.messages = 0
+        self.connected = threading.Event()
+        self.requests: "queue.Queue" = queue.Queue()
+
+        self.client = paho.Client(
+            paho.CallbackAPIVersion.VERSION2, client_id=client_id, protocol=paho.MQTTv5
+        )
+        self.client.will_set(self.presence_topic, "", qos=0, retain=False)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.worker = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = 10
+        properties.UserProperty = ("MCP-COMPONENT-TYPE", "mcp-server")
+        self.worker.start()
+        self.client.connect_async(self.host, self.port, keepalive=10, properties=properties)
+        self.client.loop_start()
+
+    def stop(self):
+        # Clear the retained presence, as the device going away would via its will
+        self.client.publish(self.presence_topic, "", qos=0, retain=True)
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.requests.put(None)
+
+    def _subscribe(self, topic: str):
+        options = SubscribeOptions(qos=self.qos, noLocal=True)
+        self.client.subscribe(topic, options=options)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error(f"{self.client_id} connect failed: {reason_code}")
+            return
+        self._subscribe(self.control_topic)
+        online = {
+            "jsonrpc": "2.0",
+            "method": "notifications/server/online",
+            "params": {
+                "server_name": self.name,
+                "description": self.description,
+                "meta": {"rbac": {"roles": []}},
+            },
+        }
+        client.publish(self.presence_topic, json.dumps(online), qos=self.qos, retain=True)
+        self.connected.set()
+
+    def _on_message(self, client, userdata, message):
+        # Keep the network thread free, the worker answers in arrival order
+        self.requests.put((message.topic, message.payload, message.properties))
+
+    def _serve(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            try:
+                self._handle(*request)
+            except Exception as e:
+                logger.warning(f"{self.client_id} failed to handle {request[0]}: {e}")
+
+    def _response(self, request_id, result=None, error: Optional[tuple] = None) -> dict:
+        response = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            response["error"] = {"code": error[0], "message": error[1]}
+        else:
+            response["result"] = result
+        return response
+
+    def _reply(self, topic: str, request_id, result=None, error: Optional[tuple] = None):
+        response = self._response(request_id, result, error)
+        self.client.publish(topic, json.dumps(response), qos=self.qos)
+
+    def _handle(self, topic: str, payload: bytes, properties):
+        self.messages += 1
+        if self.message_time > 0:
+            time.sleep(self.message_time)
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            return
+        if isinstance(request, list):
+            if self.batch and request and topic.startswith("$mcp-rpc/"):
+                self._batch(topic, request)
+            return
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0":
+            return
+        method = request.get("method")
+        request_id = request.get("id")
+        if method is None:
+            return
+
+        if topic == self.control_topic:
+            if method != "initialize" or request_id is None:
+                return
+            mcp_client_id = user_property(properties, "MCP-MQTT-CLIENT-ID")
+            if mcp_client_id is None:
+                return
+            rpc_topic = f"$mcp-rpc/{mcp_client_id}/{self.client_id}/{self.name}"
+            if mcp_client_id not in self.clients:
+                self.clients.append(mcp_client_id)
+                self._subscribe(rpc_topic)
+            capabilities = {"tools": {"listChanged": True}} if self.tools else {}
+            if self.batch:
+                capabilities["experimental"] = {"batch": {}}
+            self._reply(
+                rpc_topic,
+                request_id,
+                {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "serverInfo": {"name": "mcp", "version": "0.0.1"},
+                    "capabilities": capabilities,
+                },
+            )
+            return
+
+        if not topic.startswith("$mcp-rpc/"):
+            return
+        if method == "tools/list":
+            self._reply(topic, request_id, {"tools": tool_list(self.tools)})
+        elif method == "tools/call":
+            response = self._call(request_id, request.get("params") or {})
+            self.client.publish(topic, json.dumps(response), qos=self.qos)
+
+    def _batch(self, topic: str, requests: list):
+        """One array of responses, notifications in the batch get none"""
+        responses = []
+        for request in requests:
+            if not isinstance(request, dict) or request.get("jsonrpc") != "2.0":
+                responses.append(self._response(None, error=(-32600, "Invalid Request")))
+                continue
+            request_id = request.get("id")
+            if request_id is None:
+                continue
+            if request.get("method") == "tools/call":
+                responses.append(self._call(request_id, request.get("params") or {}))
+            elif request.get("method") == "tools/list":
+                responses.append(self._response(request_id, {"tools": tool_list(self.tools)}))
+            else:
+                responses.append(self._response(request_id, error=(-32601, "Method not found")))
+        if responses:
+            self.client.publish(topic, json.dumps(responses), qos=self.qos)
+
+    def _call(self, request_id, params: dict) -> dict:
+        name = params.get("name")
+        kwargs = (params.get("arguments") or {}).get("kwargs")
+        if not isinstance(name, str) or not isinstance(kwargs, dict):
+            return self._response(request_id, error=(-32600, "Invalid params"))
+        tool = self.tools.get(name)
+        # The firmware needs exactly the declared arguments
+        if tool is None or sorted(kwargs) != sorted(prop for prop, _, _ in tool[1]):
+            return self._response(request_id, error=(-32601, "Method not found"))
+        if self.service_time > 0:
+            time.sleep(self.service_time)
+        self.calls += 1
+        text = tool[2](kwargs)
+        return self._response(request_id, {"content": [{"type": "text", "text": text}]})
+
+
+class SimulatedFleet:
+    """Start and stop several simulated devices named '{name} {i}'"""
+
+    def __init__(self, count: int, name: str = "ESP32 Sim", **kwargs):
+        self.servers = [
+            SimulatedEsp32Server(f"esp32-sim-{i}", f"{name} {i}", **kwargs) for i in range(count)
+        ]
+
+    def start(self, timeout: float = 10.0) -> bool:
+        for server in self.servers:
+            server.start()
+        deadline = time.monotonic() + timeout
+        return all(
+            server.connected.wait(max(0.0, deadline - time.monotonic())) for server in self.servers
+        )
+
+    def stop(self):
+        for server in self.servers:
+            server.stop()
+
+    @property
+    def names(self) -> List[str]:
+        return [server.name for server in self.servers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated ESP32 MCP servers")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--servers", type=int, default=1)
+    parser.add_argument("--name", default="ESP32 Sim", help="server names are '<name> <i>'")
+    parser.add_argument("--service-time", type=float, default=0.005, help="seconds per tools/call")
+    parser.add_argument(
+        "--message-time", type=float, default=0.0, help="seconds per received message"
+    )
+    parser.add_argument("--batch", action="store_true", help="answer JSON-RPC batch arrays")
+    parser.add_argument("--qos", type=int, default=0, choices=[0, 1, 2])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    fleet = SimulatedFleet(
+        args.servers,
+        args.name,
+        host=args.host,
+        port=args.port,
+        service_time=args.service_time,
+        message_time=args.message_time,
+        batch=args.batch,
+        qos=args.qos,
+    )
+    if not fleet.start():
+        logger.error(f"Could not connect to {args.host}:{args.port}")
+    logger.info(f"Serving {fleet.names}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
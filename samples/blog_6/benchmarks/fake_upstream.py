@@ -0,0 +1,118 @@
+"""
+OpenAI-compatible stand-in for benchmarks
+
+Serves /v1/chat/completions with a configurable first-token latency and
+token rate, so the vision server (or an agent) can be load tested without
+paying for, or being rate limited by, a real model.
+
+Usage:
+    uv run python benchmarks/fake_upstream.py --port 9000 --latency 0.4 --token-rate 40
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def create_app(latency: float, token_rate: float, completion_tokens: int) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible upstream")
+    stats = {"requests": 0, "request_bytes": 0}
+
+    def generation_time() -> float:
+        return completion_tokens / token_rate if token_rate > 0 else 0.0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        stats["requests"] += 1
+        stats["request_bytes"] += len(body)
+        payload = json.loads(body)
+        model = payload.get("model", "fake-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if payload.get("stream"):
+
+            async def chunks():
+                await asyncio.sleep(latency)
+                per_token = 1.0 / token_rate if token_rate > 0 else 0.0
+                for i in range(completion_tokens):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [
+                            {"index": 0, "delta": {"content": "x "}, "finish_reason": None}
+                        ],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    if per_token:
+                        await asyncio.sleep(per_token)
+                done = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    # Some clients (llama-index SiliconFlow) require "content" in every delta
+                    "choices": [
+                        {"index": 0, "delta": {"content": ""}, "finish_reason": "stop"}
+                    ],
+                }
+                yield f"data: {json.dumps(done)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency + generation_time())
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": " ".join(["x"] * completion_tokens),
+                    },
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(body) // 4,
+                "completion_tokens": completion_tokens,
+                "total_tokens": len(body) // 4 + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="tokens per second")
+    parser.add_argument("--tokens", type=int, default=20, help="completion tokens per reply")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.token_rate, args.tokens)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Content-addressed store for binary tool results
+
+Images and embedded resources returned by MCP tools are kept here instead of
+in the prompt. The LLM only sees a short handle with the MIME type and size,
+e.g. `[image image/jpeg 48.2 KiB blob:3f1c9a0d2b7e4c51]`, and the bytes are
+fetched on demand by handle (for example to send a photo to the vision
+server). Identical payloads share one entry; least recently used blobs are
+dropped once the store grows past its byte budget.
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import anyio
+import requests
+from llama_index.core.tools import BaseTool, FunctionTool
+
+logger = logging.getLogger(__name__)
+
+HANDLE_PREFIX = "blob:"
+
+# Text resources up to this many characters are inlined, longer ones are stored
+INLINE_TEXT_LIMIT = 2000
+
+DEFAULT_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+@dataclass
+class Blob:
+    handle: str
+    data: bytes
+    mime_type: str
+    source: Optional[str] = None
+    created: float = field(default_factory=time.time)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode()}"
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+class BlobStore:
+    """In-memory blobs keyed by the hash of their bytes, bounded by total size"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.blobs: "OrderedDict[str, Blob]" = OrderedDict()
+        self.total_bytes = 0
+
+    def put(self, data: bytes, mime_type: str, source: Optional[str] = None) -> Blob:
+        handle = HANDLE_PREFIX + hashlib.sha256(data).hexdigest()[:16]
+        blob = self.blobs.get(handle)
+        if blob is not None:
+            self.blobs.move_to_end(handle)
+            return blob
+        blob = Blob(handle, data, mime_type or "application/octet-stream", source)
+        self.blobs[handle] = blob
+        self.total_bytes += blob.size
+        while self.total_bytes > self.max_bytes and len(self.blobs) > 1:
+            _, evicted = self.blobs.popitem(last=False)
+            self.total_bytes -= evicted.size
+            logger.debug(f"Evicted {evicted.handle} ({format_size(evicted.size)})")
+        return blob
+
+    def put_base64(
+        self, data: str, mime_type: str, source: Optional[str] = None
+    ) -> Optional[Blob]:
+        """Store base64 data from a tool result, None if it does not decode"""
+        try:
+            raw = base64.b64decode(data)
+        except (binascii.Error, ValueError) as e:
+            logger.warning(f"Dropped undecodable {mime_type} from {source}: {e}")
+            return None
+        return self.put(raw, mime_type, source)
+
+    def get(self, handle: str) -> Optional[Blob]:
+        blob = self.blobs.get(handle.strip().strip("[]"))
+        if blob is not None:
+            self.blobs.move_to_end(blob.handle)
+        return blob
+
+    def stats(self) -> dict:
+        return {"blobs": len(self.blobs), "bytes": self.total_bytes}
+
+
+def describe_blob(kind: str, blob: Blob, uri: Optional[str] = None) -> str:
+    """Compact placeholder for the prompt, independent of the blob size"""
+    location = f" {uri}" if uri else ""
+    return f"[{kind}{location} {blob.mime_type} {format_size(blob.size)} {blob.handle}]"
+
+
+def create_blob_tools(blob_store: BlobStore, vision_url: Optional[str] = None) -> List[BaseTool]:
+    """Tools that let the agent look at stored blobs by handle"""
+
+    async def blob_info(handle: str) -> str:
+        blob = blob_store.get(handle)
+        if blob is None:
+            return f"{handle} is unknown or expired"
+        return (
+            f"{blob.handle}: {blob.mime_type}, {format_size(blob.size)}, "
+            f"from {blob.source or 'unknown'}"
+        )
+
+    tools = [
+        FunctionTool.from_defaults(
+            fn=blob_info,
+            async_fn=blob_info,
+            name="blob_info",
+            description="Show MIME type, size and origin of a binary tool result by its blob: handle",
+        )
+    ]
+
+    if vision_url:
+
+        async def explain_image(handle: str, question: str = "这张图片里有什么？") -> str:
+            blob = blob_store.get(handle)
+            if blob is None:
+                return f"{handle} is unknown or expired"
+            if not blob.mime_type.startswith("image/"):
+                return f"{handle} is {blob.mime_type}, not an image"
+            payload = {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": blob.data_url()}},
+                    {"type": "text", "text": question},
+                ],
+            }
+            try:
+                response = await anyio.to_thread.run_sync(
+                    lambda: requests.post(vision_url, json=payload, timeout=60)
+                )
+                response.raise_for_status()
+                return response.json()["response"]
+            except Exception as e:
+                return f"explain {handle} error: {e}"
+
+        tools.append(
+            FunctionTool.from_defaults(
+                fn=explain_image,
+                async_fn=explain_image,
+                name="explain_image",
+                description="Ask the vision model a question about an image tool result by its blob: handle",
+            )
+        )
+
+    return tools
@@ -0,0 +1,246 @@
+"""
+Deterministic fast path for simple device commands
+
+"volume 40" or "把音量调到30" maps onto one tool call with one argument, yet
+going through the agent costs a full workflow run with at least two LLM
+round trips. IntentFastPath builds anchored patterns from each tool's
+inputSchema (the tool name, one integer / number / enum argument and its
+range) and, when a message matches one of them completely, calls the tool
+directly through its registered wrapper, so the dispatcher, caches and the
+firmware's {"kwargs": {...}} argument format all stay the same. Anything
+that does not match with high confidence, or whose call fails, falls
+through to the LLM.
+"""
+
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import mcp.types as types
+
+from mcp_tools import is_error_result, namespaced_tool_name
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept for the summary
+LATENCY_WINDOW = 200
+
+# Verbs in tool names that are not part of what the user names
+NAME_VERBS = {"set", "get", "change", "update", "adjust", "put"}
+
+# Chinese words users say for common tool name nouns
+SYNONYMS = {
+    "volume": ["音量", "声音"],
+    "brightness": ["亮度"],
+    "temperature": ["温度"],
+    "speed": ["速度", "风速"],
+    "color": ["颜色"],
+    "mode": ["模式"],
+}
+
+_RANGE_IN_TEXT = re.compile(r"(-?\d+)\s*(?:-|~|to|到|至)\s*(-?\d+)")
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_NUMBER = "[零一二两三四五六七八九十百]+"
+
+
+def parse_number(text: str) -> Optional[float]:
+    """'40', '4.5', '三十', '一百' -> number, None if not a number"""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if not re.fullmatch(_CN_NUMBER, text):
+        return None
+    total, current = 0, 0
+    for char in text:
+        if char in _CN_DIGITS:
+            current = _CN_DIGITS[char]
+        elif char == "十":
+            total += (current or 1) * 10
+            current = 0
+        elif char == "百":
+            total += (current or 1) * 100
+            current = 0
+    return float(total + current)
+
+
+def schema_range(prop: dict) -> Tuple[Optional[float], Optional[float]]:
+    """minimum/maximum from the schema, else a "0-100" style range in the description"""
+    low, high = prop.get("minimum"), prop.get("maximum")
+    if low is None and high is None:
+        match = _RANGE_IN_TEXT.search(prop.get("description") or "")
+        if match:
+            low, high = float(match.group(1)), float(match.group(2))
+    return low, high
+
+
+@dataclass
+class IntentPattern:
+    server_name: str
+    tool_name: str
+    param: str
+    param_type: str
+    regex: "re.Pattern"
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+    def parse(self, raw: str):
+        """Argument value from the matched text, None if out of range or wrong type"""
+        if self.param_type == "string":
+            return raw
+        value = parse_number(raw)
+        if value is None:
+            return None
+        if self.param_type == "integer":
+            if value != int(value):
+                return None
+            value = int(value)
+        if self.low is not None and value < self.low:
+            return None
+        if self.high is not None and value > self.high:
+            return None
+        return value
+
+
+@dataclass
+class FastPathMatch:
+    server_name: str
+    tool_name: str
+    arguments: dict
+
+
+def build_patterns(server_name: str, tool: types.Tool) -> List[IntentPattern]:
+    """Patterns for a tool taking exactly one integer, number or enum argument"""
+    schema = tool.inputSchema or {}
+    properties = schema.get("properties") or {}
+    if len(properties) != 1:
+        return []
+    param, prop = next(iter(properties.items()))
+    param_type = prop.get("type")
+    if prop.get("enum"):
+        param_type = "string"
+        value = "(?P<value>" + "|".join(re.escape(str(v)) for v in prop["enum"]) + ")"
+    elif param_type in ("integer", "number"):
+        value = rf"(?P<value>-?\d+(?:\.\d+)?|{_CN_NUMBER})"
+    else:
+        return []
+
+    words = [w for w in tool.name.lower().split("_") if w and w not in NAME_VERBS]
+    if not words:
+        return []
+    noun = r"[\s_]*".join(re.escape(w) for w in words)
+    nouns = [re.escape(tool.name.lower()), noun]
+    nouns += [re.escape(s) for w in words for s in SYNONYMS.get(w, [])]
+    if param.lower() not in words:
+        nouns.append(re.escape(param.lower()))
+    names = "(?:" + "|".join(nouns) + ")"
+
+    english = (
+        rf"(?:please\s+)?(?:(?:set|change|adjust|turn)\s+)?(?:the\s+)?{names}"
+        rf"\s*(?:to|at|=|:)?\s*{value}\s*%?(?:\s+please)?[.!]?"
+    )
+    chinese = (
+        rf"(?:请|帮我)?(?:把|将)?{names}\s*"
+        rf"(?:调到|调成|调为|设为|设置为|设置成|设成|改成|改为|到|为)?\s*{value}\s*%?(?:吧)?[。！!]?"
+    )
+    low, high = schema_range(prop)
+    return [
+        IntentPattern(
+            server_name,
+            tool.name,
+            param,
+            param_type,
+            re.compile(pattern, re.IGNORECASE),
+            low,
+            high,
+        )
+        for pattern in (english, chinese)
+    ]
+
+
+class IntentFastPath:
+    """Answer high-confidence single-tool commands without the LLM"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.patterns: List[IntentPattern] = []
+        self.registry_version = None
+        self.hits = 0
+        self.misses = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def rebuild(self):
+        if self.registry_version == self.registry.version:
+            return
+        self.patterns = [
+            pattern
+            for server_name, tools in self.registry.server_tools.items()
+            for tool in tools
+            for pattern in build_patterns(server_name, tool)
+        ]
+        self.registry_version = self.registry.version
+        logger.info(f"Fast path has {len(self.patterns)} patterns")
+
+    def match(self, message: str) -> Optional[FastPathMatch]:
+        self.rebuild()
+        text = message.strip()
+        matches: Dict[Tuple[str, str], FastPathMatch] = {}
+        for pattern in self.patterns:
+            found = pattern.regex.fullmatch(text)
+            if not found:
+                continue
+            value = pattern.parse(found.group("value"))
+            if value is None:
+                continue
+            matches[(pattern.server_name, pattern.tool_name)] = FastPathMatch(
+                pattern.server_name, pattern.tool_name, {pattern.param: value}
+            )
+        # The same command on several devices is ambiguous, let the LLM ask
+        if len(matches) != 1:
+            return None
+        return next(iter(matches.values()))
+
+    def _tool(self, match: FastPathMatch):
+        name = namespaced_tool_name(match.server_name, match.tool_name)
+        for tool in self.registry.llamaindex_tools.get(match.server_name, []):
+            if tool.metadata.name == name:
+                return tool
+        return None
+
+    async def handle(self, message: str) -> Optional[Tuple[FastPathMatch, str]]:
+        """Call the matched tool, returns (match, result text) or None to fall through"""
+        start = time.perf_counter()
+        match = self.match(message)
+        tool = self._tool(match) if match else None
+        if tool is None:
+            self.misses += 1
+            return None
+        # Same call as the LLM's, the wrapper validates and sends {"kwargs": arguments}
+        output = str(await tool.acall(**match.arguments))
+        elapsed = time.perf_counter() - start
+        if is_error_result(match.tool_name, output):
+            # A raw error is no answer, the agent can explain it or try another way
+            self.misses += 1
+            logger.info(f"Fast path {match.server_name}/{match.tool_name} failed: {output}")
+            return None
+        self.hits += 1
+        self.latencies.append(elapsed)
+        logger.info(
+            f"Fast path {match.server_name}/{match.tool_name}({match.arguments}) "
+            f"took {elapsed * 1000:.0f} ms"
+        )
+        return match, output
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        samples = sorted(s * 1000 for s in self.latencies)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 2) if total else None,
+            "p50_ms": round(samples[len(samples) // 2], 1) if samples else None,
+        }
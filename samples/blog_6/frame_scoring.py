@@ -0,0 +1,122 @@
+import base64
+import binascii
+import io
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Frames are scored on a downscaled grayscale copy; the JPEG decoder can do
+# most of the downscaling for free (DCT scaling), which keeps scoring cheap.
+SCORING_MAX_SIDE = 320
+
+# Pixels at or beyond these levels count as clipped (crushed shadows / blown highlights)
+DARK_LEVEL = 8
+BRIGHT_LEVEL = 247
+
+
+@dataclass
+class FrameScore:
+    """Quality metrics of a single frame in a burst"""
+
+    index: int
+    sharpness: float
+    brightness: float
+    clipped: float
+    score: float
+
+
+def decode_data_url(url: str) -> Optional[bytes]:
+    """Raw bytes of a ``data:<mime>;base64,...`` URL, None for other URLs or bad base64"""
+    if not isinstance(url, str) or not url.startswith("data:"):
+        return None
+    header, _, payload = url.partition(",")
+    if not header.endswith(";base64"):
+        return None
+    try:
+        return base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def load_gray(data: bytes, max_side: int = SCORING_MAX_SIDE) -> np.ndarray:
+    """Decode an encoded image into a small float32 grayscale array"""
+    image = Image.open(io.BytesIO(data))
+    # For JPEG this selects a reduced-size decode instead of decoding full resolution
+    image.draft("L", (max_side, max_side))
+    image = image.convert("L")
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side))
+    return np.asarray(image, dtype=np.float32)
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian, higher means sharper"""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    lap = (
+        gray[:-2, 1:-1]
+        + gray[2:, 1:-1]
+        + gray[1:-1, :-2]
+        + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def score_gray(gray: np.ndarray, index: int = 0) -> FrameScore:
+    """Combine sharpness and exposure into a single comparable score"""
+    sharpness = laplacian_variance(gray)
+    brightness = float(gray.mean())
+    clipped = float(
+        np.count_nonzero((gray <= DARK_LEVEL) | (gray >= BRIGHT_LEVEL)) / gray.size
+    )
+
+    # Penalise frames far from mid-grey and frames with many clipped pixels;
+    # an underexposed frame has little usable detail even if its edges are crisp.
+    exposure = 1.0 - min(abs(brightness - 128.0) / 128.0, 1.0)
+    score = sharpness * (0.5 + 0.5 * exposure) * (1.0 - clipped)
+    return FrameScore(
+        index=index,
+        sharpness=sharpness,
+        brightness=brightness,
+        clipped=clipped,
+        score=score,
+    )
+
+
+def score_frame(data: bytes, index: int = 0) -> FrameScore:
+    """Decode and score a single encoded frame"""
+    return score_gray(load_gray(data), index)
+
+
+def select_best_frame(frames: List[bytes]) -> Tuple[int, List[FrameScore]]:
+    """
+    Score every frame of a burst and pick the best one
+
+    Frames that fail to decode get a score of 0 so a single corrupt frame
+    does not fail the whole burst.
+
+    Returns:
+        Tuple of (index of the best frame, scores of all frames)
+
+    Raises:
+        ValueError: If the burst is empty or none of its frames decodes
+    """
+    if not frames:
+        raise ValueError("burst contains no frames")
+
+    scores = []
+    decoded = 0
+    for index, data in enumerate(frames):
+        try:
+            scores.append(score_frame(data, index))
+            decoded += 1
+        except Exception:
+            scores.append(FrameScore(index, 0.0, 0.0, 1.0, 0.0))
+    if not decoded:
+        raise ValueError("no frame of the burst could be decoded")
+
+    best = max(scores, key=lambda s: s.score)
+    return best.index, scores
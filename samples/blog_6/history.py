@@ -0,0 +1,86 @@
+"""
+Token-budgeted conversation history
+
+Keeps prebuilt ChatMessage objects in a bounded deque together with an
+estimated token count, so building the prompt is a copy of the deque instead
+of re-slicing and re-validating the whole history on every turn, and prompt
+size stays bounded by tokens rather than by message count.
+"""
+
+import re
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# CJK punctuation, kana, ideographs and full-width forms
+_CJK_PATTERN = re.compile(r"[　-ヿ㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a model tokenizer
+
+    CJK characters are about one token each; other text is about four
+    characters per token for BPE tokenizers such as DeepSeek's.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def build_message(role: MessageRole, content: str) -> ChatMessage:
+    # Plain text message without tool_calls; validated once here so the text
+    # ends up in a TextBlock (model_construct with blocks=[] drops the content)
+    return ChatMessage(role=role, content=content, additional_kwargs={})
+
+
+class ConversationHistory:
+    """Recent messages, trimmed to a message count and an estimated token budget"""
+
+    def __init__(self, max_messages: int = 20, max_tokens: int = 2000):
+        self.max_tokens = max_tokens
+        self.entries: Deque[Tuple[ChatMessage, int]] = deque(maxlen=max_messages)
+        self.total_tokens = 0
+        # Model route of the last turn, lets the router keep follow-ups on the same model
+        self.last_route: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, role: MessageRole, content: str):
+        if not content or not content.strip():
+            return
+        tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if len(self.entries) == self.entries.maxlen:
+            # deque drops the oldest entry on append, keep the total in sync
+            self.total_tokens -= self.entries[0][1]
+        self.entries.append((build_message(role, content), tokens))
+        self.total_tokens += tokens
+        # Drop oldest messages beyond the budget, but always keep the newest one
+        while self.total_tokens > self.max_tokens and len(self.entries) > 1:
+            _, dropped = self.entries.popleft()
+            self.total_tokens -= dropped
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        self.append(MessageRole.USER, user_message)
+        self.append(MessageRole.ASSISTANT, assistant_message)
+
+    def messages(self) -> List[ChatMessage]:
+        return [message for message, _ in self.entries]
+
+    def last_user_message(self) -> Optional[str]:
+        for message, _ in reversed(self.entries):
+            if message.role == MessageRole.USER:
+                return message.content
+        return None
+
+    def clear(self):
+        self.entries.clear()
+        self.total_tokens = 0
+        self.last_route = None
@@ -1,38 +1,211 @@
 import asyncio
 import anyio
+import json
 import logging
 import os
-from typing import List, Optional, Union, cast
-from dataclasses import dataclass
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+from dataclasses import asdict, dataclass
 
 from llama_index.core.agent.workflow import (
+    AgentInput,
     AgentOutput,
     AgentStream,
     AgentWorkflow,
+    ToolCall,
     ToolCallResult,
 )
+import paho.mqtt.client as paho
 
 import mcp.client.mqtt as mcp_mqtt
 from mcp.shared.mqtt import configure_logging
-import mcp.types as types
 
 from llama_index.llms.siliconflow import SiliconFlow
 from llama_index.core.llms import ChatMessage, MessageRole
-from llama_index.core.tools import BaseTool, FunctionTool
 from llama_index.core.settings import Settings
 
+from mcp_batch import McpBatchClient, supports_batch
+from mcp_readiness import ServerReadiness
+from mcp_tools import ToolRegistry, namespaced_tool_name
+from tool_cache import ToolSchemaCache, capability_hash
+from tool_dispatch import ToolDispatcher
+from result_cache import ToolResultCache
+from server_health import ServerHealth
+from history import ConversationHistory, build_message, estimate_tokens
+from console import AsyncConsole, BrokerHealth
+from blob_store import BlobStore, create_blob_tools
+from model_router import FAST, REASONING, ModelRouter, RouteDecision
+from fast_path import IntentFastPath
+from response_cache import ResponseCache, context_hash
+from tracing import Tracer, span
+from tool_selector import ToolSelector, load_synonyms
+
 configure_logging(level="DEBUG")
 logger = logging.getLogger(__name__)
 
 
+MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "localhost")
+# Seconds between broker round trip probes while the REPL is idle, 0 disables
+BROKER_HEALTH_INTERVAL = float(os.getenv("BROKER_HEALTH_INTERVAL", "10"))
+
+# Servers the agent waits for at startup (comma separated, empty means any
+# MCP_MIN_SERVERS servers), and how long to wait at most
+MCP_SERVERS = [
+    name.strip()
+    for name in os.getenv("MCP_SERVERS", "ESP32 Demo Server").split(",")
+    if name.strip()
+]
+MCP_MIN_SERVERS = int(os.getenv("MCP_MIN_SERVERS", "1"))
+MCP_WAIT_TIMEOUT = float(os.getenv("MCP_WAIT_TIMEOUT", "10"))
+
+# Set MCP_TOOL_CACHE=off to always list tools from the devices at startup
+USE_TOOL_CACHE = os.getenv("MCP_TOOL_CACHE", "") != "off"
+
+# MCP_LAZY_INIT=on only records discovered devices whose tools are cached and
+# initializes them on their first tool call; sessions unused for
+# MCP_IDLE_TIMEOUT seconds are closed (0 keeps them). At most
+# MCP_INIT_CONCURRENCY devices are initialized at a time.
+MCP_LAZY_INIT = os.getenv("MCP_LAZY_INIT", "") == "on"
+MCP_IDLE_TIMEOUT = float(os.getenv("MCP_IDLE_TIMEOUT", "300"))
+MCP_INIT_CONCURRENCY = int(os.getenv("MCP_INIT_CONCURRENCY", "16"))
+
+# Concurrent tool calls allowed per device, and the timeout of a single call
+TOOL_CONCURRENCY_PER_SERVER = int(os.getenv("TOOL_CONCURRENCY_PER_SERVER", "1"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
+# MCP_BATCH=on sends calls to the same device within MCP_BATCH_WINDOW seconds
+# (up to MCP_BATCH_SIZE) as one JSON-RPC batch, to devices that announce batches.
+# The bundled firmware does not, and the default ReAct models call one tool per
+# step, so with them nothing is batched and no batch connection is opened
+USE_MCP_BATCH = os.getenv("MCP_BATCH", "") == "on"
+MCP_BATCH_WINDOW = float(os.getenv("MCP_BATCH_WINDOW", "0.005"))
+MCP_BATCH_SIZE = int(os.getenv("MCP_BATCH_SIZE", "8"))
+
+# Calls to a device fail immediately for CIRCUIT_RESET_TIMEOUT seconds after
+# it went offline or CIRCUIT_FAILURES calls in a row failed or took longer
+# than CIRCUIT_SLOW_CALL seconds, with CIRCUIT_BREAKER=on; off by default.
+# Failing fast trades success for latency: the LLM's retries of an instant
+# failure are spent within seconds, so a device that is back within the time
+# its timed-out retries would have spanned now fails the turn
+# (bench_circuit_breaker.py: 100% -> 46% of turns on a device offline 6s of
+# every 10s). Only turn it on for devices that stay away for long
+USE_CIRCUIT_BREAKER = os.getenv("CIRCUIT_BREAKER", "") == "on"
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "2"))
+CIRCUIT_SLOW_CALL = float(os.getenv("CIRCUIT_SLOW_CALL", "10"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "15"))
+
+# Results of read-only tools (readOnlyHint, or listed in READ_ONLY_TOOLS) are
+# reused for RESULT_CACHE_TTL seconds
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "5"))
+READ_ONLY_TOOLS = [
+    name.strip() for name in os.getenv("READ_ONLY_TOOLS", "").split(",") if name.strip()
+]
+
+# Estimated token budget of the conversation history sent with each turn
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+
+# Easy and tool-only turns go to the fast model, the rest to the reasoning
+# model; AGENT_MODEL_ROUTER=off sends every turn to the fast model with the
+# settings of a full turn, i.e. DeepSeek-V3 as before the router existed
+USE_MODEL_ROUTER = os.getenv("AGENT_MODEL_ROUTER", "") != "off"
+# Models on SiliconFlow's function-calling list (e.g. Qwen2.5) fail in streamed turns
+# without tool calls, both defaults run as ReAct agents
+FAST_MODEL = os.getenv("AGENT_FAST_MODEL", "deepseek-ai/DeepSeek-V3")
+REASONING_MODEL = os.getenv("AGENT_REASONING_MODEL", "deepseek-ai/DeepSeek-R1")
+
+# Commands like "volume 40" that match a tool's inputSchema exactly are sent
+# straight to the tool; AGENT_FAST_PATH=off always goes through the LLM
+USE_FAST_PATH = os.getenv("AGENT_FAST_PATH", "") != "off"
+FAST_PATH = "fast_path"
+
+# Answers to repeated and near-duplicate first messages of a conversation are
+# reused for RESPONSE_CACHE_TTL seconds, 0 disables the response cache
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE = "cache"
+
+# Only the AGENT_TOOL_TOP_K tools most relevant to the message (plus the
+# AGENT_ALWAYS_TOOLS ones, bare or namespaced names) go into the prompt once
+# the catalog is larger than that; 0 always exposes every tool
+TOOL_TOP_K = int(os.getenv("AGENT_TOOL_TOP_K", "8"))
+ALWAYS_TOOLS = [
+    name.strip() for name in os.getenv("AGENT_ALWAYS_TOOLS", "").split(",") if name.strip()
+]
+# JSON file mapping terms of tool and server names to the words users say for
+# them, e.g. {"kitchen": ["厨房"], "fan": ["风扇"]}, for the tool selection
+TOOL_SYNONYMS_FILE = os.getenv("AGENT_TOOL_SYNONYMS")
+# Workflows kept per (route, exposed tool set)
+WORKFLOW_CACHE_SIZE = 16
+
+# Turn traces in Chrome trace-event format: a directory (one JSON file per
+# turn) or a .jsonl file (one line per turn); unset keeps only the summaries
+TRACE_OUTPUT = os.getenv("AGENT_TRACE")
+
+# Chat completions endpoint of the agent LLM, overridable to run against a local stand-in
+LLM_API_BASE = os.getenv("AGENT_LLM_API_BASE")
+
+# Vision server endpoint the agent can send stored image results to
+# (e.g. http://localhost:8001/explain_photo), unset disables explain_image
+VISION_SERVER_URL = os.getenv("VISION_SERVER_URL")
+
+readiness = ServerReadiness(lazy=MCP_LAZY_INIT, max_initializing=MCP_INIT_CONCURRENCY)
+server_health = (
+    ServerHealth(CIRCUIT_FAILURES, CIRCUIT_SLOW_CALL, CIRCUIT_RESET_TIMEOUT)
+    if USE_CIRCUIT_BREAKER
+    else None
+)
+batch_client = (
+    McpBatchClient(MQTT_BROKER_HOST, timeout=TOOL_CALL_TIMEOUT) if USE_MCP_BATCH else None
+)
+dispatcher = ToolDispatcher(
+    max_concurrency_per_server=TOOL_CONCURRENCY_PER_SERVER,
+    timeout=TOOL_CALL_TIMEOUT,
+    batch_client=batch_client,
+    batch_window=MCP_BATCH_WINDOW,
+    max_batch=MCP_BATCH_SIZE,
+)
+registry = ToolRegistry(
+    cache=ToolSchemaCache() if USE_TOOL_CACHE else None,
+    readiness=readiness,
+    dispatcher=dispatcher,
+    result_cache=ToolResultCache(RESULT_CACHE_TTL, READ_ONLY_TOOLS)
+    if RESULT_CACHE_TTL > 0
+    else None,
+    blob_store=BlobStore(),
+    health=server_health,
+)
+
+
 async def on_mcp_server_discovered(client: mcp_mqtt.MqttTransportClient, server_name):
+    readiness.mark_discovered(server_name)
+    if server_health is not None:
+        server_health.mark_online(server_name)
+    if MCP_LAZY_INIT and server_name in registry.server_tools:
+        # Tools are known from the cache, connect on the first call
+        logger.debug(f"Discovered {server_name}")
+        return
     logger.info(f"Discovered {server_name}, connecting ...")
-    await client.initialize_mcp_server(server_name)
+    readiness.initialize_soon(client, server_name)
 
 
 async def on_mcp_connect(client, server_name, connect_result):
-    capabilities = client.get_session(server_name).server_info.capabilities
+    if server_health is not None:
+        server_health.mark_online(server_name)
+    server_info = client.get_session(server_name).server_info
+    capabilities = server_info.capabilities
     logger.info(f"Capabilities of {server_name}: {capabilities}")
+    if batch_client is not None and supports_batch(server_info):
+        batch_client.enable(server_name)
+    # Register tools first, the agent only waits for servers to become ready
+    if capabilities.tools:
+        cap_hash = capability_hash(server_info)
+        if registry.use_cached(server_name, cap_hash):
+            # Same capabilities as last time: usable now, revalidate in the background
+            readiness.mark_connected(server_name)
+        await registry.refresh_server(server_name, cap_hash)
+        logger.info(f"Tools of {server_name}: {registry.server_tools.get(server_name)}")
+    readiness.mark_connected(server_name)
     if capabilities.prompts:
         prompts = await client.list_prompts(server_name)
         logger.info(f"Prompts of {server_name}: {prompts}")
@@ -41,148 +214,174 @@ async def on_mcp_connect(client, server_name, connect_result):
         logger.info(f"Resources of {server_name}: {resources}")
         resource_templates = await client.list_resource_templates(server_name)
         logger.info(f"Resources templates of {server_name}: {resource_templates}")
-    if capabilities.tools:
-        toolsResult = await client.list_tools(server_name)
-        tools = toolsResult.tools
-        logger.info(f"Tools of {server_name}: {tools}")
 
 
 async def on_mcp_disconnect(client, server_name):
     logger.info(f"Disconnected from {server_name}")
+    readiness.mark_disconnected(server_name)
+    if server_name in readiness.evicted:
+        # Idle session closed by us, the device is still online
+        return
+    if server_health is not None:
+        server_health.mark_offline(server_name)
+    if batch_client is not None:
+        batch_client.disable(server_name)
+    registry.remove_server(server_name)
 
 
 client = None
 api_key = os.getenv("YOUR_API_KEY_FROM_CLOUD_SILICONFLOW_CN")
 
 
-async def get_mcp_tools(mcp_client: mcp_mqtt.MqttTransportClient) -> List[BaseTool]:
-    all_tools = []
-    try:
-        try:
-            tools_result = await mcp_client.list_tools("ESP32 Demo Server")
-
-            if tools_result is False:
-                return all_tools
-
-            list_tools_result = cast(types.ListToolsResult, tools_result)
-            tools = list_tools_result.tools
-
-            for tool in tools:
-                logger.info(f"tool: {tool.name} - {tool.description}")
-
-                def create_mcp_tool_wrapper(client_ref, server_name, tool_name):
-                    async def mcp_tool_wrapper(**kwargs):
-                        try:
-                            result = await client_ref.call_tool(
-                                server_name, tool_name, kwargs
-                            )
-                            if result is False:
-                                return f"call {tool_name} failed"
-
-                            call_result = cast(types.CallToolResult, result)
-
-                            if hasattr(call_result, "content") and call_result.content:
-                                content_parts = []
-                                for content_item in call_result.content:
-                                    if hasattr(content_item, "type"):
-                                        if content_item.type == "text":
-                                            text_content = cast(
-                                                types.TextContent, content_item
-                                            )
-                                            content_parts.append(text_content.text)
-                                        elif content_item.type == "image":
-                                            image_content = cast(
-                                                types.ImageContent, content_item
-                                            )
-                                            content_parts.append(
-                                                f"[image: {image_content.mimeType}]"
-                                            )
-                                        elif content_item.type == "resource":
-                                            resource_content = cast(
-                                                types.EmbeddedResource, content_item
-                                            )
-                                            content_parts.append(
-                                                f"[resource: {resource_content.resource}]"
-                                            )
-                                        else:
-                                            content_parts.append(str(content_item))
-                                    else:
-                                        content_parts.append(str(content_item))
-
-                                result_text = "\n".join(content_parts)
-
-                                if (
-                                    hasattr(call_result, "isError")
-                                    and call_result.isError
-                                ):
-                                    return f"tool return error: {result_text}"
-                                else:
-                                    return result_text
-                            else:
-                                return str(call_result)
+def process_tool_output(response_text):
+    if hasattr(response_text, "content"):
+        response_text = response_text.content
+        return response_text
+    return None
 
-                        except Exception as e:
-                            error_msg = f"call {tool_name} error: {e}"
-                            logger.error(error_msg)
-                            return error_msg
 
-                    return mcp_tool_wrapper
+# ReAct agents write "Thought: ... Action: ..." before "Answer: <text>"
+REACT_THOUGHT_MARKER = "Thought:"
+REACT_ANSWER_MARKER = "Answer:"
 
-                wrapper_func = create_mcp_tool_wrapper(
-                    mcp_client, "ESP32 Demo Server", tool.name
-                )
 
-                try:
-                    llamaindex_tool = FunctionTool.from_defaults(
-                        fn=wrapper_func,
-                        name=f"mcp_{tool.name}",
-                        description=tool.description or f"MCP tool: {tool.name}",
-                        async_fn=wrapper_func,
-                    )
-                    all_tools.append(llamaindex_tool)
-                    # logger.info(f"call tool success: mcp_{tool.name}")
+class ReActAnswerStream:
+    """Answer part of a streamed ReAct LLM call, the scaffolding before it held back"""
 
-                except Exception as e:
-                    logger.error(f"create tool {tool.name} error: {e}")
+    def __init__(self):
+        self.sent = 0
 
-        except Exception as e:
-            logger.error(f"Get tool list error: {e}")
+    def reset(self):
+        """Start of the next LLM call of the turn"""
+        self.sent = 0
 
-    except Exception as e:
-        logger.error(f"Get tool list error: {e}")
+    def delta(self, response: str) -> str:
+        """New answer text in the response streamed so far"""
+        start = response.find(REACT_ANSWER_MARKER)
+        if start >= 0:
+            answer = response[start + len(REACT_ANSWER_MARKER) :].lstrip()
+        else:
+            answer = response.lstrip()
+            # A reply that does not open with a thought is the answer itself, as the
+            # ReAct output parser reads it
+            if REACT_THOUGHT_MARKER.startswith(answer[: len(REACT_THOUGHT_MARKER)]):
+                return ""
+        delta = answer[self.sent :]
+        self.sent = len(answer)
+        return delta
 
-    return all_tools
 
+@dataclass
+class ChatEvent:
+    """Event yielded by ConversationalAgent.chat_stream"""
+
+    # "delta", "tool_call", "tool_result" or "done"
+    type: str
+    text: str = ""
+    tool_name: Optional[str] = None
+    # Seconds from the start of the turn to the first answer text, set on the "done" event
+    ttft: Optional[float] = None
+    # Model route of the turn, set on the "done" event
+    route: Optional[str] = None
+    elapsed: Optional[float] = None
+    # Estimated tokens of the system prompt, history and user message
+    prompt_tokens: Optional[int] = None
 
-def process_tool_output(response_text):
-    if hasattr(response_text, "content"):
-        response_text = response_text.content
-        return response_text
-    return None
+
+class MqttStreamSink:
+    """Publish chat events to an MQTT topic as they happen, e.g. for a speaker device"""
+
+    def __init__(self, topic: str, host: str = "localhost", port: int = 1883):
+        self.topic = topic
+        self.client = paho.Client(paho.CallbackAPIVersion.VERSION2)
+        # Non-blocking connect, the network loop runs in paho's own thread
+        self.client.connect_async(host, port)
+        self.client.loop_start()
+
+    def publish(self, event: ChatEvent):
+        payload = json.dumps(asdict(event), ensure_ascii=False)
+        with span("mqtt publish", "mqtt", topic=self.topic, bytes=len(payload)):
+            self.client.publish(self.topic, payload)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
 
 
 class ConversationalAgent:
-    def __init__(self, mcp_client: Optional[mcp_mqtt.MqttTransportClient] = None):
+    def __init__(
+        self,
+        mcp_client: Optional[mcp_mqtt.MqttTransportClient] = None,
+        tool_registry: Optional[ToolRegistry] = None,
+    ):
+        # Route of every turn without the router, and of get_workflow() calls without one
+        self.default_route = REASONING if USE_MODEL_ROUTER else FAST
         self.llm = SiliconFlow(
             api_key=api_key,
-            model="deepseek-ai/DeepSeek-V3",
+            model=REASONING_MODEL if USE_MODEL_ROUTER else FAST_MODEL,
             temperature=0.6,
             max_tokens=4000,
             timeout=180,
+            **({"base_url": LLM_API_BASE} if LLM_API_BASE else {}),
         )
         Settings.llm = self.llm
 
+        self.llms = {self.default_route: self.llm}
+        self.router = None
+        if USE_MODEL_ROUTER:
+            self.llms[FAST] = SiliconFlow(
+                api_key=api_key,
+                model=FAST_MODEL,
+                temperature=0.6,
+                max_tokens=1000,
+                timeout=60,
+                **({"base_url": LLM_API_BASE} if LLM_API_BASE else {}),
+            )
+            self.router = ModelRouter()
+
         self.mcp_client = mcp_client
         self.tools = []
 
         # self.agent = AgentRunner.from_llm(llm=self.llm, tools=self.tools, verbose=True)
 
-        self.mcp_tools_loaded = False
+        # Tools of all connected servers, kept up to date by the MCP callbacks
+        self.tool_registry = tool_registry or ToolRegistry(mcp_client)
+        self.tools_version = None
+        # Agent-side tools for image and resource results kept in the blob store
+        blob_store = self.tool_registry.blob_store
+        self.local_tools = (
+            create_blob_tools(blob_store, VISION_SERVER_URL) if blob_store else []
+        )
 
-        self.conversation_history = []
+        # Workflow per model route, tool set and system prompt, least recently used dropped first
+        self.workflows: "OrderedDict[tuple, AgentWorkflow]" = OrderedDict()
+        # Blob tools work on results of any other tool, they are always exposed
+        always_tools = ALWAYS_TOOLS + [tool.metadata.name for tool in self.local_tools]
+        self.tool_selector = (
+            ToolSelector(TOOL_TOP_K, always_tools, load_synonyms(TOOL_SYNONYMS_FILE))
+            if TOOL_TOP_K > 0
+            else None
+        )
+        # Bare MCP tool names, lets the router spot tool intents
+        self.tool_names: List[str] = []
+        # Namespaced tool name -> (server name, mcp.types.Tool)
+        self.mcp_tools: Dict[str, tuple] = {}
+        self.fast_path = IntentFastPath(self.tool_registry) if USE_FAST_PATH else None
+        self.response_cache = (
+            ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+            if RESPONSE_CACHE_TTL > 0
+            else None
+        )
+        self._cache_context = None
+        self.tracer = Tracer(TRACE_OUTPUT)
 
         self.max_history_length = 20
 
+        # Completed turns as prebuilt messages, trimmed by estimated tokens
+        self.conversation_history = ConversationHistory(
+            max_messages=self.max_history_length, max_tokens=HISTORY_TOKEN_BUDGET
+        )
+
         self.system_prompt = """
                 在这个对话中，你将扮演一个简单的情感助手。
                 你有视觉能力，当你被问 “你看看我今天打扮得怎么样”、“你看看我这件衣服是什么牌子的” 等视觉相关问题时，你可以调用 "explain_photo" 这个工具，
@@ -190,159 +389,446 @@ class ConversationalAgent:
                 根据我提供的问题，生成一个简洁的回应。
                 请注意，回应的长度不应超过20个字符，内容应是对我的问题的情感分析或回应。
                 """
-
-    def _build_chat_messages(self, new_message: str) -> list:
-        """Build structured chat message array"""
-        messages = []
-
-        # Add system prompt
-        messages.append(
-            ChatMessage(
-                role=MessageRole.SYSTEM,
-                content=self.system_prompt,
-                additional_kwargs={},
-            )
+        self._system_message = None
+
+    def _system_chat_message(self) -> ChatMessage:
+        # Built once, rebuilt only if the system prompt was changed
+        if self._system_message is None or self._system_message.content != self.system_prompt:
+            self._system_message = build_message(MessageRole.SYSTEM, self.system_prompt)
+        return self._system_message
+
+    def _build_chat_messages(
+        self, new_message: str, history: Optional[ConversationHistory] = None
+    ) -> list:
+        """Build structured chat message array: system prompt, history, user message"""
+        if history is None:
+            history = self.conversation_history
+        messages = [self._system_chat_message()]
+        messages.extend(history.messages())
+        messages.append(build_message(MessageRole.USER, new_message))
+        return messages
+
+    def estimate_prompt_tokens(
+        self, new_message: str, history: Optional[ConversationHistory] = None
+    ) -> int:
+        if history is None:
+            history = self.conversation_history
+        return (
+            estimate_tokens(self.system_prompt)
+            + history.total_tokens
+            + estimate_tokens(new_message)
         )
 
-        # Add conversation history (keep recent N rounds of conversation)
-        recent_history = (
-            self.conversation_history[-self.max_history_length :]
-            if len(self.conversation_history) > self.max_history_length
-            else self.conversation_history
-        )
-
-        # Clean history messages, completely remove tool_calls field and filter empty messages
-        for i, msg in enumerate(recent_history):
-            # Ensure content is valid (not None and not empty string)
-            content = msg.content or ""
-
-            if not content.strip():  # Skip empty messages
-                continue
-
-            # Use model_construct to create cleanest messages
-            clean_msg = ChatMessage.model_construct(
-                role=msg.role,
-                content=content,
-                additional_kwargs={},
-                blocks=[],  # Ensure no extra block data
-            )
-            messages.append(clean_msg)
-
-        # Add current user message
-        messages.append(
-            ChatMessage(
-                role=MessageRole.USER, content=new_message, additional_kwargs={}
-            )
-        )
-
-        # Final cleanup: ensure all messages have valid content
-        final_messages = []
-        for msg in messages:
-            # Check if content is valid
-            content = msg.content
-            if content is None or not str(content).strip():
-                continue  # Skip invalid messages
-            else:
-                # Add messages with valid content directly
-                final_messages.append(msg)
-
-        return final_messages
+    @property
+    def mcp_tools_loaded(self) -> bool:
+        return self.tools_version == self.tool_registry.version
 
     async def load_mcp_tools(self):
-        if not self.mcp_tools_loaded and self.mcp_client:
-            try:
-                mcp_tools = await get_mcp_tools(self.mcp_client)
-                if mcp_tools:
-                    self.tools.extend(mcp_tools)
-                    # self.agent = AgentRunner.from_llm(
-                    #     llm=self.llm, tools=self.tools, verbose=True
-                    # )
-                    logger.info(f"load {len(mcp_tools)} tools")
-                    self.mcp_tools_loaded = True
-            except Exception as e:
-                logger.error(f"load tool error: {e}")
-
-    async def chat(self, message: str) -> str:
-        try:
-            if not self.mcp_tools_loaded:
-                await self.load_mcp_tools()
-
-            query_info = AgentWorkflow.from_tools_or_functions(
-                tools_or_functions=self.tools,
-                llm=self.llm,
+        """Take the current tool snapshot from the registry if it changed"""
+        if self.mcp_tools_loaded:
+            return
+        if not self.tool_registry.server_tools and self.mcp_client:
+            # Nothing registered by the callbacks yet, list connected servers directly
+            await self.tool_registry.refresh_all(readiness.connected)
+        self.tools = self.tool_registry.snapshot() + self.local_tools
+        self.mcp_tools = {
+            namespaced_tool_name(server_name, tool.name): (server_name, tool)
+            for server_name, tools in self.tool_registry.server_tools.items()
+            for tool in tools
+        }
+        self.tool_names = [tool.name for _, tool in self.mcp_tools.values()]
+        self.tools_version = self.tool_registry.version
+        if self.tool_selector is not None:
+            self.tool_selector.index(self.tools)
+        logger.info(f"load {len(self.tools)} tools")
+
+    def select_tools(self, message: str, history: ConversationHistory) -> list:
+        """Tools exposed to the LLM for this message"""
+        if self.tool_selector is None:
+            return self.tools
+        return self.tool_selector.select(message, history.last_user_message())
+
+    def get_workflow(
+        self, route: Optional[str] = None, tools: Optional[list] = None
+    ) -> AgentWorkflow:
+        """Return the cached workflow of a route and tool set, building it on first use"""
+        if route is None:
+            route = self.default_route
+        if tools is None:
+            tools = self.tools
+        # The tools version covers input schema changes that keep name and description
+        key = (
+            route,
+            self.tools_version,
+            self.system_prompt,
+            tuple((tool.metadata.name, tool.metadata.description) for tool in tools),
+        )
+        workflow = self.workflows.get(key)
+        if workflow is None:
+            workflow = AgentWorkflow.from_tools_or_functions(
+                tools_or_functions=tools,
+                llm=self.llms[route],
                 system_prompt=self.system_prompt,
                 verbose=False,
                 timeout=180,
             )
+            self.workflows[key] = workflow
+            if len(self.workflows) > WORKFLOW_CACHE_SIZE:
+                self.workflows.popitem(last=False)
+            logger.info(f"Built {route} agent workflow with {len(tools)} tools")
+        else:
+            self.workflows.move_to_end(key)
+        return workflow
+
+    def cache_context(self) -> str:
+        """Response cache key part for the current system prompt and tool set"""
+        key = (self.tools_version, self.system_prompt)
+        if self._cache_context is None or self._cache_context[0] != key:
+            tools = [(tool.metadata.name, tool.metadata.description) for tool in self.tools]
+            self._cache_context = (key, context_hash(self.system_prompt, tools))
+        return self._cache_context[1]
+
+    def response_cache_ttl(self, called_tools: List[str]) -> Optional[float]:
+        """Lifetime of a cached turn that called these tools, None if it must not be cached"""
+        if not called_tools:
+            return self.response_cache.ttl
+        result_cache = self.tool_registry.result_cache
+        if result_cache is None:
+            return None
+        for name in called_tools:
+            server_tool = self.mcp_tools.get(name)
+            if server_tool is None or not result_cache.is_read_only(*server_tool):
+                return None
+        # The answer quotes tool data, keep it no longer than the tool result itself
+        return result_cache.ttl
+
+    def use_response_cache(self, message: str, history: ConversationHistory) -> bool:
+        if self.response_cache is None:
+            return False
+        # Only the first turn of a conversation: later answers may depend on the history
+        # ("我叫什么名字", "继续"), and the service shares one cache between all sessions
+        return not len(history)
+
+    def route(self, message: str, history: ConversationHistory) -> RouteDecision:
+        if self.router is None:
+            return RouteDecision(self.default_route, "router disabled")
+        return self.router.classify(message, history.last_route, self.tool_names)
+
+    async def chat_stream(
+        self, message: str, history: Optional[ConversationHistory] = None
+    ) -> AsyncIterator[ChatEvent]:
+        """
+        Run one turn and yield events as they happen
+
+        Yields text deltas, tool call start/finish events and a final "done"
+        event carrying the full response and the turn timings. `history`
+        defaults to the agent's own conversation; the service passes one per
+        session so all sessions share the LLM, tools and workflow.
+        """
+        if history is None:
+            history = self.conversation_history
+        start = time.perf_counter()
+        ttft = None
+        completed = False
+        decision = None
+        called_tools: List[str] = []
+        use_cache = self.use_response_cache(message, history)
+        prompt_tokens = self.estimate_prompt_tokens(message, history)
+        trace = self.tracer.start_turn(message_chars=len(message), prompt_tokens=prompt_tokens)
+        try:
+            if not self.mcp_tools_loaded:
+                await self.load_mcp_tools()
 
-            message = self._build_chat_messages(message)
-            handler = query_info.run(chat_history=message)
-
-            output = None
-            async for event in handler.stream_events():
-                if isinstance(event, AgentOutput):
-                    output = event.response
-            response = process_tool_output(output)
+            handled = await self.fast_path.handle(message) if self.fast_path else None
+            cached = (
+                self.response_cache.get(self.cache_context(), message)
+                if handled is None and use_cache
+                else None
+            )
+            if handled is not None:
+                # A plain device command, answered by the tool without the LLM
+                match, response = handled
+                tool_name = namespaced_tool_name(match.server_name, match.tool_name)
+                yield ChatEvent(type="tool_call", tool_name=tool_name)
+                yield ChatEvent(type="tool_result", text=response, tool_name=tool_name)
+                decision = RouteDecision(FAST_PATH, "intent pattern")
+                completed = True
+                use_cache = False
+            elif cached is not None:
+                entry, match = cached
+                response = entry.response
+                ttft = time.perf_counter() - start
+                yield ChatEvent(type="delta", text=response)
+                decision = RouteDecision(RESPONSE_CACHE, match)
+                completed = True
+                use_cache = False
+            else:
+                decision = self.route(message, history)
+                tools = self.select_tools(message, history)
+                with span("workflow", "agent", route=decision.route, tools=len(tools)):
+                    query_info = self.get_workflow(decision.route, tools)
+
+                chat_messages = self._build_chat_messages(message, history)
+                handler = query_info.run(chat_history=chat_messages)
+                # Without function calling the workflow runs a ReActAgent, whose raw
+                # stream must not reach the user (or a speaker topic)
+                react = (
+                    None
+                    if self.llms[decision.route].metadata.is_function_calling_model
+                    else ReActAnswerStream()
+                )
 
-            logger.info(f"Agent response: {response}")
-            return str(response)
+                output = None
+                # One LLM call runs from the step input (or the last tool result) to its output
+                llm_start, llm_first = time.perf_counter_ns(), None
+                async for event in handler.stream_events():
+                    if isinstance(event, AgentStream):
+                        if event.delta and llm_first is None:
+                            llm_first = time.perf_counter_ns()
+                        delta = react.delta(event.response) if react else event.delta
+                        if delta:
+                            # First token of the answer, not of the reasoning before it
+                            if ttft is None:
+                                ttft = time.perf_counter() - start
+                            yield ChatEvent(type="delta", text=delta)
+                    elif isinstance(event, AgentInput):
+                        llm_start, llm_first = time.perf_counter_ns(), None
+                        if react:
+                            react.reset()
+                    elif isinstance(event, ToolCallResult):
+                        llm_start, llm_first = time.perf_counter_ns(), None
+                        if react:
+                            react.reset()
+                        yield ChatEvent(
+                            type="tool_result",
+                            text=str(event.tool_output),
+                            tool_name=event.tool_name,
+                        )
+                    elif isinstance(event, ToolCall):
+                        called_tools.append(event.tool_name)
+                        yield ChatEvent(type="tool_call", tool_name=event.tool_name)
+                    elif isinstance(event, AgentOutput):
+                        output = event.response
+                        now = time.perf_counter_ns()
+                        trace.add(
+                            "llm",
+                            "llm",
+                            llm_start,
+                            now,
+                            model=self.llms[decision.route].model,
+                            ttft_ms=round((llm_first - llm_start) / 1e6, 1)
+                            if llm_first
+                            else None,
+                            output_chars=len(output.content or ""),
+                            tool_calls=len(event.tool_calls),
+                        )
+                        llm_start, llm_first = now, None
+                # Re-raises a failed run, which stream_events() ends without reporting
+                await handler
+                response = str(process_tool_output(output))
+                completed = output is not None
 
         except Exception as e:
-            error_msg = f"error: {e}"
-            logger.error(error_msg)
-            return error_msg
+            response = f"error: {e}"
+            logger.error(response)
+
+        if completed:
+            # Failed turns are not remembered, the next turn starts from the last good one
+            history.add_turn(message, response)
+            history.last_route = decision.route
+
+        elapsed = time.perf_counter() - start
+        self.tracer.end_turn(
+            trace,
+            route=decision.route if decision else None,
+            response_chars=len(response),
+            completed=completed,
+        )
+        if completed and use_cache:
+            ttl = self.response_cache_ttl(called_tools)
+            if ttl is None:
+                self.response_cache.skip()
+            else:
+                self.response_cache.put(self.cache_context(), message, response, elapsed, ttl)
+        if decision is not None and self.router is not None:
+            self.router.record(decision, elapsed)
+        if ttft is not None:
+            logger.info(f"Time to first token: {ttft:.2f}s, turn: {elapsed:.2f}s")
+        logger.info(
+            f"Prompt ~{prompt_tokens} tokens, history {len(history)} "
+            f"messages / ~{history.total_tokens} tokens"
+        )
+        logger.info(f"Agent response: {response}")
+        yield ChatEvent(
+            type="done",
+            text=response,
+            ttft=ttft,
+            elapsed=elapsed,
+            prompt_tokens=prompt_tokens,
+            route=decision.route if decision else None,
+        )
+
+    async def chat(self, message: str) -> str:
+        response = ""
+        async for event in self.chat_stream(message):
+            if event.type == "done":
+                response = event.text
+        return response
 
 
 async def main():
     try:
         async with mcp_mqtt.MqttTransportClient(
             "test_client",
-            auto_connect_to_mcp_server=True,
+            auto_connect_to_mcp_server=not MCP_LAZY_INIT,
             on_mcp_server_discovered=on_mcp_server_discovered,
             on_mcp_connect=on_mcp_connect,
             on_mcp_disconnect=on_mcp_disconnect,
             mqtt_options=mcp_mqtt.MqttOptions(
-                host="localhost",
+                host=MQTT_BROKER_HOST,
             ),
         ) as mcp_client:
+            registry.client = mcp_client
+            dispatcher.client = mcp_client
+            readiness.client = mcp_client
+            if batch_client is not None:
+                batch_client.start()
+            start = time.perf_counter()
+            cached_servers = registry.load_cached()
             await mcp_client.start()
-            await anyio.sleep(3)
+            if MCP_SERVERS and set(MCP_SERVERS) <= set(cached_servers):
+                # Tools are known from the cache, revalidation happens on connect
+                logger.info(f"Starting with cached tools of {cached_servers}")
+            elif await readiness.wait_for(
+                MCP_SERVERS, min_servers=MCP_MIN_SERVERS, timeout=MCP_WAIT_TIMEOUT
+            ):
+                logger.info(
+                    f"MCP servers ready in {time.perf_counter() - start:.2f}s: "
+                    f"{sorted(readiness.connected)}"
+                )
+            else:
+                logger.warning(
+                    f"Timed out after {MCP_WAIT_TIMEOUT}s waiting for {MCP_SERVERS}, "
+                    f"connected: {sorted(readiness.connected)}"
+                )
 
-            agent = ConversationalAgent(mcp_client)
+            agent = ConversationalAgent(mcp_client, registry)
             if not agent.mcp_tools_loaded:
                 await agent.load_mcp_tools()
 
+            # Optionally mirror the streamed reply to an MQTT topic
+            stream_topic = os.getenv("AGENT_STREAM_TOPIC")
+            sink = MqttStreamSink(stream_topic, MQTT_BROKER_HOST) if stream_topic else None
+
+            # stdin is read in a thread so MQTT keeps running while the user types
+            console = AsyncConsole()
+            health = None
+            if BROKER_HEALTH_INTERVAL > 0:
+                health = BrokerHealth(MQTT_BROKER_HOST, interval=BROKER_HEALTH_INTERVAL)
+                health.start()
+            evictor = None
+            if MCP_LAZY_INIT and MCP_IDLE_TIMEOUT > 0:
+                evictor = asyncio.ensure_future(readiness.run_evictor(MCP_IDLE_TIMEOUT))
+
             print("input 'exit' or 'quit' exit")
             print("input 'tools' show available tools")
+            print("input 'stats' show tool call latency per device")
+            print("input 'health' show broker round trip")
             print("=" * 50)
 
-            while True:
-                try:
-                    user_input = input("\nuser: ").strip()
-
-                    if user_input.lower() in ["exit", "quit"]:
+            try:
+                while True:
+                    try:
+                        prompt = f"\nuser [{health.status()}]: " if health else "\nuser: "
+                        user_input = await console.readline(prompt)
+                        if user_input is None:
+                            break
+                        user_input = user_input.strip()
+
+                        if user_input.lower() in ["exit", "quit"]:
+                            break
+
+                        if user_input.lower() == "tools":
+                            print(f"available tools: {len(agent.tools)}")
+                            for tool in agent.tools:
+                                tool_name = getattr(tool.metadata, "name", str(tool))
+                                tool_desc = getattr(
+                                    tool.metadata, "description", "No description"
+                                )
+                                print(f"- {tool_name}: {tool_desc}")
+                            continue
+
+                        if user_input.lower() == "stats":
+                            for server_name, stats in dispatcher.summary().items():
+                                print(f"- {server_name}: {stats}")
+                            if registry.result_cache is not None:
+                                print(f"result cache: {registry.result_cache.stats()}")
+                            if registry.blob_store is not None:
+                                print(f"blob store: {registry.blob_store.stats()}")
+                            print(f"tool arguments: {registry.argument_stats.stats()}")
+                            if agent.router is not None:
+                                print(f"model routes: {agent.router.summary()}")
+                            if agent.fast_path is not None:
+                                print(f"fast path: {agent.fast_path.stats()}")
+                            if agent.response_cache is not None:
+                                print(f"response cache: {agent.response_cache.stats()}")
+                            if agent.tool_selector is not None:
+                                print(f"tool selection: {agent.tool_selector.stats()}")
+                            print(f"turn traces: {agent.tracer.stats()}")
+                            print(f"mcp servers: {readiness.stats()}")
+                            if batch_client is not None:
+                                print(f"tool batches: {dispatcher.batch_stats()}")
+                            continue
+
+                        if user_input.lower() == "health":
+                            if health:
+                                print(f"broker {MQTT_BROKER_HOST}: {health.summary()}")
+                            else:
+                                print("broker health probe is disabled")
+                            print(f"connected servers: {sorted(readiness.connected)}")
+                            if server_health is not None:
+                                for server_name, state in server_health.stats().items():
+                                    print(f"- circuit {server_name}: {state}")
+                            continue
+
+                        if not user_input:
+                            continue
+
+                        print("\nAgent: ", end="", flush=True)
+                        streamed = False
+                        async for event in agent.chat_stream(user_input):
+                            if sink:
+                                sink.publish(event)
+                            if event.type == "delta":
+                                streamed = True
+                                print(event.text, end="", flush=True)
+                            elif event.type == "tool_call":
+                                print(f"\n[calling {event.tool_name}]", flush=True)
+                            elif event.type == "tool_result":
+                                print(f"[{event.tool_name} done]", flush=True)
+                            elif event.type == "done":
+                                if not streamed:
+                                    print(event.text, end="")
+                                ttft = f"{event.ttft:.2f}s" if event.ttft is not None else "-"
+                                print(
+                                    f"\n({event.route} model, first token {ttft}, "
+                                    f"total {event.elapsed:.2f}s, "
+                                    f"prompt ~{event.prompt_tokens} tokens)"
+                                )
+
+                    except KeyboardInterrupt:
                         break
-
-                    if user_input.lower() == "tools":
-                        print(f"available tools: {len(agent.tools)}")
-                        for tool in agent.tools:
-                            tool_name = getattr(tool.metadata, "name", str(tool))
-                            tool_desc = getattr(
-                                tool.metadata, "description", "No description"
-                            )
-                            print(f"- {tool_name}: {tool_desc}")
-                        continue
-
-                    if not user_input:
-                        continue
-
-                    response = await agent.chat(user_input)
-                    print(f"\nAgent: {response}")
-
-                except KeyboardInterrupt:
-                    break
-                except Exception as e:
-                    print(f"error: {e}")
+                    except Exception as e:
+                        print(f"error: {e}")
+            finally:
+                if sink:
+                    sink.close()
+                if health:
+                    health.stop()
+                if evictor:
+                    evictor.cancel()
+                if batch_client is not None:
+                    batch_client.close()
 
     except Exception as e:
         print(f"agent init error: {e}")
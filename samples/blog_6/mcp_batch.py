@@ -0,0 +1,306 @@
+"""
+JSON-RPC batches of tools/call for MCP-over-MQTT servers
+
+Every tools/call is its own MQTT publish and response on the $mcp-rpc
+topic, and the ESP32 handles one message at a time, so the calls of an LLM
+step to the same device pay the per-message cost once each. JSON-RPC 2.0
+allows an array of requests answered by an array of responses; the MQTT
+SDK client only sends single messages, so McpBatchClient keeps its own MQTT
+connection and MCP session with the servers that take batches.
+
+Batches are opt-in per server: a server advertises them with the
+"batch" entry of its experimental capabilities (the firmware in this repo
+does not, it drops anything that is not a single JSON object). Servers are
+enabled from their initialize result, the batch session's own initialize
+checks it again, and a server that answers a batch with a single error is
+disabled; in each case BatchNotSupported tells the caller to send the calls
+one by one. The MQTT connection is only opened once a server is enabled, so
+with the bundled firmware MCP_BATCH=on costs no second connection or session.
+
+Only calls issued together are merged. Both default models run as ReAct
+agents that call one tool per LLM step, so with them and the bundled
+firmware nothing is batched; batches need a function-calling model that
+emits several calls in a step and a device that announces them.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import mcp.types as types
+import paho.mqtt.client as paho
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.subscribeoptions import SubscribeOptions
+
+logger = logging.getLogger(__name__)
+
+# Key of the experimental capability a server announces batch support with
+BATCH_CAPABILITY = "batch"
+
+PROTOCOL_VERSION = "2024-11-05"
+
+PRESENCE_PREFIX = "$mcp-server/presence/"
+
+
+class BatchNotSupported(Exception):
+    pass
+
+
+def supports_batch(server_info: Optional[types.InitializeResult]) -> bool:
+    """Whether a server's initialize result announces JSON-RPC batches"""
+    if server_info is None or server_info.capabilities is None:
+        return False
+    return BATCH_CAPABILITY in (server_info.capabilities.experimental or {})
+
+
+def _error_text(error: dict) -> str:
+    return f"{error.get('code')} {error.get('message')}"
+
+
+class McpBatchClient:
+    """Send several tools/call requests to one server as a single MQTT message"""
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 1883,
+        timeout: float = 10.0,
+        qos: int = 0,
+    ):
+        self.client_id = f"mcp-batch-{uuid.uuid4().hex[:8]}"
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.qos = qos
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Servers whose initialize result announced batches
+        self.enabled_servers: Set[str] = set()
+        # Server name -> MQTT client id, from the retained presence messages
+        self.server_client_ids: Dict[str, str] = {}
+        # Server name -> $mcp-rpc topic of the batch session
+        self.rpc_topics: Dict[str, str] = {}
+        self.initializing: Dict[str, asyncio.Future] = {}
+        # Request id -> (topic, future of the response)
+        self.pending: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self.subscribing: Dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+        self.batches = 0
+        self.batched_calls = 0
+        self.connected = False
+
+        self.client = paho.Client(
+            paho.CallbackAPIVersion.VERSION2, client_id=self.client_id, protocol=paho.MQTTv5
+        )
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.on_subscribe = self._on_subscribe
+
+    def start(self):
+        """Bind to the running loop, the connection waits for the first enabled server"""
+        self.loop = asyncio.get_running_loop()
+
+    def _connect(self):
+        self.connected = True
+        properties = Properties(PacketTypes.CONNECT)
+        properties.UserProperty = ("MCP-COMPONENT-TYPE", "mcp-client")
+        # Non-blocking connect, the network loop runs in paho's own thread
+        self.client.connect_async(self.host, self.port, properties=properties)
+        self.client.loop_start()
+
+    def close(self):
+        if not self.connected:
+            return
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def enable(self, server_name: str):
+        self.enabled_servers.add(server_name)
+        if not self.connected:
+            self._connect()
+
+    def disable(self, server_name: str):
+        self.enabled_servers.discard(server_name)
+        self.rpc_topics.pop(server_name, None)
+
+    def enabled(self, server_name: str) -> bool:
+        return server_name in self.enabled_servers
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        client.subscribe(f"{PRESENCE_PREFIX}#", qos=0)
+        # Sessions do not survive a reconnect, initialize again on the next batch
+        self.loop.call_soon_threadsafe(self.rpc_topics.clear)
+
+    def _on_subscribe(self, client, userdata, mid, reason_codes, properties):
+        # On the loop, the SUBACK can arrive before subscribe() returned the mid
+        self.loop.call_soon_threadsafe(self._subscribed, mid)
+
+    def _subscribed(self, mid: int):
+        future = self.subscribing.pop(mid, None)
+        if future is not None:
+            _set_result(future, True)
+
+    def _on_message(self, client, userdata, message):
+        # Called in paho's thread, futures are resolved on the event loop
+        if message.topic.startswith(PRESENCE_PREFIX):
+            parts = message.topic[len(PRESENCE_PREFIX) :].split("/", 1)
+            if len(parts) == 2:
+                self.loop.call_soon_threadsafe(
+                    self._presence, parts[1], parts[0], bool(message.payload)
+                )
+            return
+        try:
+            payload = json.loads(message.payload)
+        except ValueError:
+            return
+        self.loop.call_soon_threadsafe(self._resolve, message.topic, payload)
+
+    def _presence(self, server_name: str, server_client_id: str, online: bool):
+        if online:
+            self.server_client_ids[server_name] = server_client_id
+        elif self.server_client_ids.get(server_name) == server_client_id:
+            del self.server_client_ids[server_name]
+            self.rpc_topics.pop(server_name, None)
+
+    def _resolve(self, topic: str, payload):
+        responses = payload if isinstance(payload, list) else [payload]
+        for response in responses:
+            if not isinstance(response, dict):
+                continue
+            request_id = response.get("id")
+            if request_id is None and "error" in response and not isinstance(payload, list):
+                # A server without batches rejects the whole array with one error
+                error = BatchNotSupported(_error_text(response["error"]))
+                for pending_id, (pending_topic, future) in list(self.pending.items()):
+                    if pending_topic == topic:
+                        del self.pending[pending_id]
+                        _set_exception(future, error)
+                continue
+            entry = self.pending.pop(request_id, None)
+            if entry is not None:
+                _set_result(entry[1], response)
+
+    async def _subscribe(self, topic: str):
+        future = self.loop.create_future()
+        _, mid = self.client.subscribe(topic, options=SubscribeOptions(qos=self.qos, noLocal=True))
+        self.subscribing[mid] = future
+        await asyncio.wait_for(future, self.timeout)
+
+    async def _send(self, topic: str, requests: List[dict], properties=None) -> List[dict]:
+        futures = []
+        for request in requests:
+            future = self.loop.create_future()
+            self.pending[request["id"]] = (topic, future)
+            futures.append(future)
+        payload = requests if len(requests) > 1 else requests[0]
+        try:
+            self.client.publish(topic, json.dumps(payload), qos=self.qos, properties=properties)
+            return await asyncio.wait_for(asyncio.gather(*futures), self.timeout)
+        finally:
+            for request in requests:
+                self.pending.pop(request["id"], None)
+
+    async def _initialize(self, server_name: str) -> str:
+        server_client_id = self.server_client_ids.get(server_name)
+        if server_client_id is None:
+            raise BatchNotSupported(f"no presence of {server_name} seen")
+        rpc_topic = f"$mcp-rpc/{self.client_id}/{server_client_id}/{server_name}"
+        await self._subscribe(rpc_topic)
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.UserProperty = ("MCP-MQTT-CLIENT-ID", self.client_id)
+        request = {
+            "jsonrpc": "2.0",
+            "method": "initialize",
+            "params": {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "mcp-batch", "version": "0.1.0"},
+            },
+            "id": next(self.ids),
+        }
+        (response,) = await self._send(
+            f"$mcp-server/{server_client_id}/{server_name}", [request], properties
+        )
+        if "error" in response:
+            raise BatchNotSupported(f"initialize failed: {_error_text(response['error'])}")
+        if not supports_batch(types.InitializeResult.model_validate(response["result"])):
+            raise BatchNotSupported("batch capability not announced")
+        initialized = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+        self.client.publish(rpc_topic, json.dumps(initialized), qos=self.qos)
+        logger.info(f"Batch session with {server_name} initialized")
+        return rpc_topic
+
+    async def _rpc_topic(self, server_name: str) -> str:
+        topic = self.rpc_topics.get(server_name)
+        if topic is not None:
+            return topic
+        # Concurrent batches to a new server share one initialize
+        future = self.initializing.get(server_name)
+        if future is None:
+            future = asyncio.ensure_future(self._initialize(server_name))
+            self.initializing[server_name] = future
+            future.add_done_callback(lambda _: self.initializing.pop(server_name, None))
+        try:
+            topic = await asyncio.shield(future)
+        except asyncio.TimeoutError:
+            raise BatchNotSupported(f"{server_name} did not answer initialize")
+        self.rpc_topics[server_name] = topic
+        return topic
+
+    async def call_tools(
+        self, server_name: str, calls: List[Tuple[str, Optional[dict]]]
+    ) -> List[Union[types.CallToolResult, bool]]:
+        """
+        Results in the order of `calls`, False for a call the server failed
+        (as MqttTransportClient.call_tool returns)
+
+        Raises:
+            BatchNotSupported: If nothing was sent or the server rejected the batch,
+                the calls can be sent one by one
+        """
+        if not self.client.is_connected():
+            raise BatchNotSupported("batch connection is down")
+        topic = await self._rpc_topic(server_name)
+        requests = [
+            {
+                "jsonrpc": "2.0",
+                "method": "tools/call",
+                "params": {"name": name, "arguments": arguments or {}},
+                "id": next(self.ids),
+            }
+            for name, arguments in calls
+        ]
+        responses = await self._send(topic, requests)
+        self.batches += 1
+        self.batched_calls += len(calls)
+
+        results = []
+        for (name, _), response in zip(calls, responses):
+            if "error" in response:
+                error = _error_text(response["error"])
+                logger.error(f"call {name} on {server_name} failed: {error}")
+                results.append(False)
+            else:
+                results.append(types.CallToolResult.model_validate(response["result"]))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "servers": sorted(self.enabled_servers),
+            "batches": self.batches,
+            "batched_calls": self.batched_calls,
+        }
+
+
+def _set_result(future: asyncio.Future, value):
+    # The waiter may have timed out or been cancelled meanwhile
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future: asyncio.Future, error: BaseException):
+    if not future.done():
+        future.set_exception(error)
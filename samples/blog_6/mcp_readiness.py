@@ -0,0 +1,194 @@
+"""
+Event-driven readiness tracking for MCP servers discovered over MQTT
+
+Replaces a fixed sleep after MqttTransportClient.start(): the discovery and
+connect callbacks report to a ServerReadiness, and the agent waits until the
+servers it needs are connected, or a timeout expires.
+
+For large fleets the readiness can also run lazily: discovery only records
+the server in the index, ensure_connected() initializes it the first time
+one of its tools is called, and evict_idle() closes sessions that have not
+been used for a while. Initializations run at most `max_initializing` at a
+time, so thousands of devices coming online do not become a storm of
+initialize requests.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+
+class ServerReadiness:
+    """Track discovered / connected MCP servers and let callers wait for them"""
+
+    def __init__(self, client=None, lazy: bool = False, max_initializing: Optional[int] = None):
+        self.client = client
+        # Initialize discovered servers only when ensure_connected() needs them
+        self.lazy = lazy
+        self.discovered: Set[str] = set()
+        self.connected: Set[str] = set()
+        # Servers whose session was closed by evict_idle(), they are still online
+        self.evicted: Set[str] = set()
+        self.last_used: Dict[str, float] = {}
+        self.initializations = 0
+        self.evictions = 0
+        self._changed = anyio.Event()
+        self._initializing: Set[str] = set()
+        self._init_limit = anyio.Semaphore(max_initializing) if max_initializing else None
+        # Keep references to background initializations so they are not garbage collected
+        self._pending = set()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = anyio.Event()
+
+    def mark_discovered(self, server_name: str):
+        self.discovered.add(server_name)
+        self._notify()
+
+    def mark_connected(self, server_name: str):
+        self.connected.add(server_name)
+        self.evicted.discard(server_name)
+        self.last_used[server_name] = time.monotonic()
+        self._notify()
+
+    def mark_disconnected(self, server_name: str):
+        self.connected.discard(server_name)
+        self.last_used.pop(server_name, None)
+        self._notify()
+
+    def touch(self, server_name: str):
+        """Record a use of the server, postponing its idle eviction"""
+        if server_name in self.connected:
+            self.last_used[server_name] = time.monotonic()
+
+    def initialize_soon(self, client, server_name: str):
+        """
+        Initialize a discovered server in the background
+
+        The discovery callback returns immediately, so several servers that
+        show up together are initialized concurrently instead of one by one.
+        A server already being initialized is not initialized twice.
+        """
+        if server_name in self._initializing:
+            return
+        self._initializing.add(server_name)
+
+        async def initialize():
+            try:
+                if self._init_limit is None:
+                    await client.initialize_mcp_server(server_name)
+                else:
+                    async with self._init_limit:
+                        await client.initialize_mcp_server(server_name)
+                self.initializations += 1
+            except Exception as e:
+                logger.error(f"Initialize {server_name} error: {e}")
+            finally:
+                self._initializing.discard(server_name)
+                self._notify()
+
+        task = asyncio.ensure_future(initialize())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def ensure_connected(self, server_name: str, timeout: float = 10.0) -> bool:
+        """
+        Wait until a server is connected, initializing it first in lazy mode
+
+        Returns:
+            bool: True if connected, False if the timeout expired first
+        """
+        with anyio.move_on_after(timeout):
+            while server_name not in self.connected:
+                if self.lazy and self.client is not None and server_name in self.discovered:
+                    self.initialize_soon(self.client, server_name)
+                await self._changed.wait()
+        self.touch(server_name)
+        return server_name in self.connected
+
+    def is_ready(
+        self, server_names: Optional[Iterable[str]] = None, min_servers: int = 1
+    ) -> bool:
+        if server_names:
+            return set(server_names) <= self.connected
+        return len(self.connected) >= min_servers
+
+    async def wait_for(
+        self,
+        server_names: Optional[Iterable[str]] = None,
+        min_servers: int = 1,
+        timeout: float = 10.0,
+    ) -> bool:
+        """
+        Wait until the given servers (or any `min_servers` servers) are connected
+
+        Args:
+            server_names: Servers that must all be connected; if empty, any
+                `min_servers` connected servers are enough
+            min_servers: Number of servers to wait for when no names are given
+            timeout: Seconds to wait at most
+
+        Returns:
+            bool: True if ready, False if the timeout expired first
+        """
+        server_names = list(server_names or [])
+        with anyio.move_on_after(timeout):
+            while not self.is_ready(server_names, min_servers):
+                await self._changed.wait()
+        return self.is_ready(server_names, min_servers)
+
+    async def evict_idle(self, idle_timeout: float) -> List[str]:
+        """
+        Close the sessions of servers unused for `idle_timeout` seconds
+
+        The servers stay in the discovered index and are initialized again on
+        their next use. Needs an MQTT client that can close a session
+        (deinitialize_mcp_server); with other clients nothing is evicted.
+        """
+        deinitialize = getattr(self.client, "deinitialize_mcp_server", None)
+        if deinitialize is None:
+            return []
+        deadline = time.monotonic() - idle_timeout
+        idle = [
+            server_name
+            for server_name in self.connected
+            if server_name not in self._initializing
+            and self.last_used.get(server_name, 0.0) <= deadline
+        ]
+        for server_name in idle:
+            # Marked first so the disconnect callback knows the server is still online
+            self.evicted.add(server_name)
+            self.mark_disconnected(server_name)
+            try:
+                await deinitialize(server_name)
+            except Exception as e:
+                logger.warning(f"Close idle session of {server_name} error: {e}")
+        if idle:
+            self.evictions += len(idle)
+            logger.info(f"Closed {len(idle)} idle MCP sessions")
+        return idle
+
+    async def run_evictor(self, idle_timeout: float, interval: Optional[float] = None):
+        """Evict idle sessions periodically, run it as a background task"""
+        if getattr(self.client, "deinitialize_mcp_server", None) is None:
+            logger.warning("The MQTT client can not close MCP sessions, idle eviction is off")
+            return
+        interval = interval or max(1.0, idle_timeout / 4)
+        while True:
+            await anyio.sleep(interval)
+            await self.evict_idle(idle_timeout)
+
+    def stats(self) -> dict:
+        return {
+            "discovered": len(self.discovered),
+            "connected": len(self.connected),
+            "initializing": len(self._initializing),
+            "initializations": self.initializations,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,131 @@
+"""
+Route each turn to a fast model or a reasoning model
+
+Most turns are device commands ("把音量调到30") or small talk that a fast
+model answers in well under a second, while a reasoning model such as
+DeepSeek-R1 can think for tens of seconds. ModelRouter is a cheap local
+classifier: reasoning keywords, long or multi-question messages and
+follow-ups to a reasoning turn go to the reasoning model; tool intents and
+short messages go to the fast model. Every decision and the latency of each
+route are recorded.
+"""
+
+import logging
+import re
+import statistics
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+REASONING = "reasoning"
+
+# Samples kept per route, and recent decisions kept for inspection
+LATENCY_WINDOW = 200
+DECISION_WINDOW = 100
+
+TOOL_KEYWORDS = (
+    "音量", "声音", "调到", "调高", "调低", "大一点", "小一点", "打开", "关闭", "开灯", "关灯",
+    "亮度", "颜色", "拍", "照片", "看看", "设置", "静音", "播放", "暂停",
+    "volume", "louder", "quieter", "mute", "turn on", "turn off", "switch", "brightness",
+    "photo", "picture", "set ", "play", "pause",
+)
+
+REASONING_KEYWORDS = (
+    "为什么", "分析", "解释", "比较", "对比", "推理", "计算", "证明", "规划", "计划", "建议",
+    "优缺点", "步骤", "怎么办",
+    "why", "explain", "analy", "compare", "reason", "calculate", "prove", "plan",
+    "step by step", "pros and cons", "how should", "how do i",
+)
+
+FOLLOW_UP_KEYWORDS = ("继续", "然后呢", "还有呢", "为什么呢", "详细", "go on", "continue", "and then", "more")
+
+_QUESTION_MARKS = re.compile(r"[?？]")
+_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+
+def message_length(text: str) -> int:
+    """Length with CJK characters counted twice, they carry about a word each"""
+    return len(text) + len(_CJK.findall(text))
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    reason: str
+
+
+class ModelRouter:
+    """Classify turns as fast or reasoning and keep per-route latency"""
+
+    def __init__(
+        self,
+        long_message_chars: int = 80,
+        tool_keywords: Iterable[str] = TOOL_KEYWORDS,
+        reasoning_keywords: Iterable[str] = REASONING_KEYWORDS,
+    ):
+        self.long_message_chars = long_message_chars
+        self.tool_keywords = tuple(tool_keywords)
+        self.reasoning_keywords = tuple(reasoning_keywords)
+        self.latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=LATENCY_WINDOW)
+        )
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.reasons: Dict[str, int] = defaultdict(int)
+        self.decisions: Deque[tuple] = deque(maxlen=DECISION_WINDOW)
+
+    def classify(
+        self,
+        message: str,
+        last_route: Optional[str] = None,
+        tool_names: Iterable[str] = (),
+    ) -> RouteDecision:
+        """
+        Pick a route from the message and the conversation state
+
+        `last_route` is the route of the previous turn of the same
+        conversation, `tool_names` the bare names of the available tools.
+        """
+        text = message.strip().lower()
+        tool_names = [name.lower() for name in tool_names]
+        if any(name in text for name in tool_names):
+            return RouteDecision(FAST, "tool name")
+        if any(keyword in text for keyword in self.reasoning_keywords):
+            return RouteDecision(REASONING, "reasoning keyword")
+        if last_route == REASONING and any(keyword in text for keyword in FOLLOW_UP_KEYWORDS):
+            return RouteDecision(REASONING, "follow-up of a reasoning turn")
+        if any(keyword in text for keyword in self.tool_keywords):
+            return RouteDecision(FAST, "tool intent")
+        if any(name.replace("_", " ") in text for name in tool_names):
+            return RouteDecision(FAST, "tool name")
+        if message_length(text) > self.long_message_chars:
+            return RouteDecision(REASONING, "long message")
+        if len(_QUESTION_MARKS.findall(text)) >= 2:
+            return RouteDecision(REASONING, "several questions")
+        return RouteDecision(FAST, "short message")
+
+    def record(self, decision: RouteDecision, elapsed: float):
+        self.counts[decision.route] += 1
+        self.reasons[decision.reason] += 1
+        self.latencies[decision.route].append(elapsed)
+        self.decisions.append((time.time(), decision.route, decision.reason, elapsed))
+        logger.info(f"Route {decision.route} ({decision.reason}) took {elapsed:.2f}s")
+
+    def summary(self) -> dict:
+        """Per-route turn count, share and latency percentiles (ms), and decision reasons"""
+        total = sum(self.counts.values())
+        routes = {}
+        for route, count in self.counts.items():
+            samples = sorted(s * 1000 for s in self.latencies[route])
+            routes[route] = {
+                "turns": count,
+                "share": round(count / total, 2) if total else None,
+                "p50_ms": round(statistics.median(samples), 1) if samples else None,
+                "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 1)
+                if len(samples) >= 20
+                else None,
+            }
+        return {"routes": routes, "reasons": dict(self.reasons)}
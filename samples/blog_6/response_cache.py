@@ -0,0 +1,199 @@
+"""
+Cache of complete agent responses for repeated turns
+
+Greetings, "what can you do" and other frequent questions reach the voice
+agent again and again, and each one pays a full LLM turn. ResponseCache
+keeps recent answers keyed on the normalized user message and a hash of
+the system prompt and tool set; punctuation and filler particles are
+folded, so "你好呀！" repeats "你好啊". A message that is not an exact
+repeat is still served when its character n-grams are close enough to a
+cached one ("请介绍一下你自己" / "介绍一下你自己"), computed locally without an
+embedding service. A near-duplicate must also use exactly the same content
+words (English words and Chinese characters other than fillers), so
+"capital of austria" never answers "capital of australia" and "light on"
+never answers "light off"; numbers and negations must match as well.
+Entries expire after a TTL and the least recently used are dropped beyond
+a size limit. Only the first turn of a conversation is looked up and
+stored, and turns that called a mutating tool never are, see
+ConversationalAgent.chat_stream.
+"""
+
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Character n-gram size, bigrams work for both Chinese and short English phrases
+NGRAM_SIZE = 2
+
+_PUNCTUATION = re.compile(r"[\W_]+", re.UNICODE)
+# Sentence-final particles and politeness words that do not change the request
+_FILLERS = re.compile(r"(?:^please |(?: please)+$|[啊呀吧呢嘛哦哈啦]+$)")
+# Numbers and negations, messages differing in them never share an answer
+# ("can't" is normalized to "can t")
+_KEY_TOKENS = re.compile(
+    r"\d+(?:\.\d+)?|[零一二两三四五六七八九十百千万]+|[不没别非]|\b(?:not|no|never|t)\b"
+)
+_WORD = re.compile(r"[a-z0-9]+|[一-鿿]")
+# Words a near-duplicate may add or drop, everything else must be the same
+_FILLER_WORDS = frozenset(
+    ["a", "an", "the", "please", "just", "some", "请", "吧", "呢", "啊", "呀", "嘛", "哦", "哈",
+     "啦", "吗", "的", "了", "呗"]
+)
+
+
+def normalize_message(text: str) -> str:
+    """Case, width, punctuation and filler words folded: '你好呀！' -> '你好'"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = " ".join(_PUNCTUATION.sub(" ", text).split())
+    return _FILLERS.sub("", text).strip() or text
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> FrozenSet[str]:
+    if len(text) <= n:
+        return frozenset([text])
+    return frozenset(text[i : i + n] for i in range(len(text) - n + 1))
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """English words and Chinese characters of a normalized message, fillers left out"""
+    return frozenset(word for word in _WORD.findall(text) if word not in _FILLER_WORDS)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two n-gram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def context_hash(system_prompt: str, tools: Iterable[Tuple[str, str]]) -> str:
+    """Hash of the system prompt and the (name, description) of every tool"""
+    digest = hashlib.sha256(system_prompt.encode())
+    for name, description in sorted(tools):
+        digest.update(f"\0{name}\0{description}".encode())
+    return digest.hexdigest()[:16]
+
+
+@dataclass
+class CachedResponse:
+    context: str
+    normalized: str
+    ngrams: FrozenSet[str]
+    key_tokens: Tuple[str, ...]
+    words: FrozenSet[str]
+    response: str
+    # Duration of the turn that produced the response, the latency a hit saves
+    elapsed: float
+    expires: float
+
+
+class ResponseCache:
+    """Exact and near-duplicate lookup of recent responses, bounded by LRU and TTL"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 600.0, threshold: float = 0.8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Minimum n-gram similarity of a near-duplicate
+        self.threshold = threshold
+        self.entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.saved = 0.0
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self.entries.items() if entry.expires <= now]
+        for key in expired:
+            del self.entries[key]
+
+    def get(self, context: str, message: str) -> Optional[Tuple[CachedResponse, str]]:
+        """Cached entry and how it matched ("exact" or "near-duplicate"), None on a miss"""
+        now = time.monotonic()
+        normalized = normalize_message(message)
+        entry = self.entries.get((context, normalized))
+        if entry is not None and entry.expires > now:
+            self.entries.move_to_end((context, normalized))
+            self.exact_hits += 1
+            self.saved += entry.elapsed
+            return entry, "exact"
+
+        self._expire(now)
+        ngrams = char_ngrams(normalized)
+        key_tokens = tuple(_KEY_TOKENS.findall(normalized))
+        words = content_words(normalized)
+        best, best_score = None, self.threshold
+        for candidate in self.entries.values():
+            if (
+                candidate.context != context
+                or candidate.key_tokens != key_tokens
+                or candidate.words != words
+            ):
+                continue
+            # Jaccard can not reach the threshold when the sizes differ too much
+            small, large = sorted((len(ngrams), len(candidate.ngrams)))
+            if small < best_score * large:
+                continue
+            score = similarity(ngrams, candidate.ngrams)
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end((best.context, best.normalized))
+        self.near_hits += 1
+        self.saved += best.elapsed
+        logger.info(f"Near-duplicate of {best.normalized!r} ({best_score:.2f}) for {normalized!r}")
+        return best, "near-duplicate"
+
+    def put(
+        self,
+        context: str,
+        message: str,
+        response: str,
+        elapsed: float,
+        ttl: Optional[float] = None,
+    ):
+        """Store a response, `ttl` shortens the lifetime (e.g. for read-only tool data)"""
+        normalized = normalize_message(message)
+        if not normalized or not response:
+            return
+        now = time.monotonic()
+        key = (context, normalized)
+        self.entries[key] = CachedResponse(
+            context,
+            normalized,
+            char_ngrams(normalized),
+            tuple(_KEY_TOKENS.findall(normalized)),
+            content_words(normalized),
+            response,
+            elapsed,
+            now + min(self.ttl, ttl if ttl is not None else self.ttl),
+        )
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def skip(self):
+        """Count a turn that could not be cached, e.g. it called a mutating tool"""
+        self.skipped += 1
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 2) if lookups else None,
+            "skipped": self.skipped,
+            "saved_s": round(self.saved, 2),
+        }
@@ -0,0 +1,103 @@
+"""
+TTL cache for results of read-only MCP tools
+
+A status or sensor query asked twice within a few seconds does not need a
+second MQTT round trip to the ESP32. Only tools marked read-only, through the
+MCP `readOnlyHint` annotation or an explicit list, are cached; calling any
+other tool on the same server drops that server's cached results, since it
+may have changed the device state. Each drop bumps the server's generation,
+and a read that was already in flight when it happened is not stored: its
+result may predate the change.
+"""
+
+import json
+import logging
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Expired entries are swept once the cache grows past this size, then the oldest dropped
+MAX_ENTRIES = 1024
+
+
+def canonical_arguments(arguments) -> str:
+    return json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolResultCache:
+    """Results of read-only tool calls keyed by server, tool and arguments"""
+
+    def __init__(self, ttl: float = 5.0, read_only_tools: Optional[Iterable[str]] = None):
+        self.ttl = ttl
+        # Tool names ("get_status") or server-qualified names ("ESP32 Demo Server/get_status")
+        self.read_only_tools = set(read_only_tools or [])
+        # In insertion order, so the first entry is the oldest
+        self.entries: Dict[Tuple[str, str, str], Tuple[float, str]] = {}
+        # Server name -> number of invalidations
+        self.generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_read_only(self, server_name: str, tool) -> bool:
+        if tool.name in self.read_only_tools:
+            return True
+        if f"{server_name}/{tool.name}" in self.read_only_tools:
+            return True
+        # mcp.types.Tool allows extra fields, so annotations may be a model or a plain dict
+        annotations = getattr(tool, "annotations", None)
+        if isinstance(annotations, dict):
+            return bool(annotations.get("readOnlyHint"))
+        return bool(getattr(annotations, "readOnlyHint", False))
+
+    def get(self, server_name: str, tool_name: str, arguments) -> Optional[str]:
+        key = (server_name, tool_name, canonical_arguments(arguments))
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if time.monotonic() < expires:
+                self.hits += 1
+                logger.info(
+                    f"Result cache hit for {server_name}/{tool_name} "
+                    f"({self.hits} hits, {self.misses} misses)"
+                )
+                return result
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def generation(self, server_name: str) -> int:
+        """Take before a call, put() stores its result only if nothing was invalidated since"""
+        return self.generations.get(server_name, 0)
+
+    def put(
+        self,
+        server_name: str,
+        tool_name: str,
+        arguments,
+        result: str,
+        generation: Optional[int] = None,
+    ):
+        if generation is not None and generation != self.generation(server_name):
+            logger.debug(f"Not caching {server_name}/{tool_name}, the server changed meanwhile")
+            return
+        now = time.monotonic()
+        if len(self.entries) >= MAX_ENTRIES:
+            self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+            while len(self.entries) >= MAX_ENTRIES:
+                del self.entries[next(iter(self.entries))]
+        key = (server_name, tool_name, canonical_arguments(arguments))
+        # Re-inserted at the end, so the order stays the order of expiry
+        self.entries.pop(key, None)
+        self.entries[key] = (now + self.ttl, result)
+
+    def invalidate_server(self, server_name: str):
+        self.generations[server_name] = self.generation(server_name) + 1
+        stale = [key for key in self.entries if key[0] == server_name]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            logger.info(f"Dropped {len(stale)} cached results of {server_name}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
@@ -0,0 +1,163 @@
+"""
+Per-server circuit breaker for MCP tool calls
+
+An ESP32 that dropped off Wi-Fi does not answer call_tool, so each call
+waits for the full timeout, and the LLM usually retries. ServerHealth
+tracks every server from what the agent already sees: presence (discovery
+and the disconnect callback), failed or timed out calls, and the latency of
+calls that succeed. After `failure_threshold` failures in a row, or as soon
+as the server goes offline, its circuit opens and calls fail immediately
+with a clear error. Once `reset_timeout` has passed, or the server comes
+back online, one probe call is let through (half-open): success closes the
+circuit, failure opens it again for twice as long.
+
+Fast failures cost turns as well as saving time: retries of a call that
+failed at once are used up long before the device could be back, where
+retries that waited for a timeout might have reached it. The breaker suits
+devices that stay away longer than an LLM turn's retries last.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Weight of the newest sample in the smoothed round trip time
+RTT_ALPHA = 0.2
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+@dataclass
+class ServerState:
+    state: str = CLOSED
+    # Consecutive failed or slow calls
+    failures: int = 0
+    reason: str = ""
+    opened_at: float = 0.0
+    reset_timeout: float = 0.0
+    # A half-open circuit lets a single probe call through, started at this time
+    probe_started: Optional[float] = None
+    # Smoothed round trip of successful calls, seconds
+    rtt: Optional[float] = None
+    opens: int = 0
+    rejected: int = 0
+
+
+class ServerHealth:
+    """Circuit state of every MCP server, checked before each tool call"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 2,
+        slow_call: float = 10.0,
+        reset_timeout: float = 15.0,
+        max_reset_timeout: float = 120.0,
+    ):
+        self.failure_threshold = failure_threshold
+        # A call slower than this counts as a failure even if it succeeded
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.servers: Dict[str, ServerState] = {}
+
+    def _state(self, server_name: str) -> ServerState:
+        state = self.servers.get(server_name)
+        if state is None:
+            state = ServerState(reset_timeout=self.reset_timeout)
+            self.servers[server_name] = state
+        return state
+
+    def _open(self, server_name: str, state: ServerState, reason: str, reset_timeout: float):
+        if state.state != OPEN:
+            state.opens += 1
+            logger.warning(f"Circuit of {server_name} opened: {reason}")
+        state.state = OPEN
+        state.reason = reason
+        state.opened_at = time.monotonic()
+        state.reset_timeout = min(reset_timeout, self.max_reset_timeout)
+        state.probe_started = None
+
+    def check(self, server_name: str):
+        """
+        Let a call through, or fail fast while the circuit is open
+
+        Raises:
+            CircuitOpenError: If the server is considered unavailable
+        """
+        state = self.servers.get(server_name)
+        if state is None or state.state == CLOSED:
+            return
+        now = time.monotonic()
+        if state.state == OPEN:
+            remaining = state.opened_at + state.reset_timeout - now
+            if remaining > 0:
+                state.rejected += 1
+                raise CircuitOpenError(
+                    f"{server_name} is unavailable ({state.reason}), "
+                    f"not calling it again for {remaining:.0f}s"
+                )
+            state.state = HALF_OPEN
+        # A probe that never reported back (e.g. cancelled) is replaced after a while
+        if state.probe_started is not None and now - state.probe_started < state.reset_timeout:
+            state.rejected += 1
+            raise CircuitOpenError(
+                f"{server_name} is unavailable ({state.reason}), a probe call is in progress"
+            )
+        state.probe_started = now
+
+    def record_success(self, server_name: str, elapsed: float):
+        if elapsed >= self.slow_call:
+            self.record_failure(server_name, f"slow response of {elapsed:.1f}s")
+            return
+        state = self._state(server_name)
+        if state.rtt is None:
+            state.rtt = elapsed
+        else:
+            state.rtt = (1 - RTT_ALPHA) * state.rtt + RTT_ALPHA * elapsed
+        state.failures = 0
+        if state.state != CLOSED:
+            logger.info(f"Circuit of {server_name} closed")
+        state.state = CLOSED
+        state.probe_started = None
+        state.reset_timeout = self.reset_timeout
+
+    def record_failure(self, server_name: str, reason: str):
+        state = self._state(server_name)
+        state.failures += 1
+        if state.state == HALF_OPEN:
+            # The probe failed, back off
+            self._open(server_name, state, reason, state.reset_timeout * 2)
+        elif state.state == OPEN or state.failures >= self.failure_threshold:
+            self._open(server_name, state, reason, state.reset_timeout)
+
+    def mark_offline(self, server_name: str, reason: str = "went offline"):
+        """Presence lost or session disconnected, open right away"""
+        self._open(server_name, self._state(server_name), reason, self.reset_timeout)
+
+    def mark_online(self, server_name: str):
+        """The server announced itself again, let the next call probe it"""
+        state = self.servers.get(server_name)
+        if state is not None and state.state == OPEN:
+            state.state = HALF_OPEN
+            state.probe_started = None
+
+    def stats(self) -> Dict[str, dict]:
+        """State, smoothed round trip (ms) and fast-failed calls per server"""
+        return {
+            server_name: {
+                "state": state.state,
+                "rtt_ms": round(state.rtt * 1000, 1) if state.rtt is not None else None,
+                "opens": state.opens,
+                "rejected": state.rejected,
+            }
+            for server_name, state in self.servers.items()
+        }
@@ -0,0 +1,87 @@
+"""
+On-disk cache of MCP tool schemas
+
+Lets the agent build its tools at startup without waiting for discovery,
+initialize and tools/list round trips over MQTT. Entries are keyed by server
+name and a hash of the capabilities the server announced; the registry
+revalidates them in the background once the server connects.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import mcp.types as types
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("MCP_TOOL_CACHE_PATH", ".mcp_tool_cache.json")
+
+
+def capability_hash(announcement) -> str:
+    """
+    Stable hash of what a server announced about itself
+
+    Accepts the InitializeResult of a session (capabilities, serverInfo,
+    protocol version) or any JSON-serializable capability payload.
+    """
+    if hasattr(announcement, "model_dump"):
+        announcement = announcement.model_dump(mode="json", exclude_none=True)
+    data = json.dumps(announcement, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+class ToolSchemaCache:
+    """JSON file mapping server name -> capability hash and tool schemas"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable tool cache {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        # Write to a temp file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Write tool cache {self.path} error: {e}")
+
+    def get(self, server_name: str) -> Optional[Tuple[Optional[str], List[types.Tool]]]:
+        """Return (capability hash, tools) for a server, None if not cached"""
+        entry = self.entries.get(server_name)
+        if entry is None:
+            return None
+        try:
+            tools = [types.Tool.model_validate(tool) for tool in entry["tools"]]
+        except Exception as e:
+            logger.warning(f"Dropping invalid cache entry of {server_name}: {e}")
+            self.entries.pop(server_name, None)
+            return None
+        return entry.get("capability_hash"), tools
+
+    def put(self, server_name: str, capability_hash: Optional[str], tools: List[types.Tool]):
+        self.entries[server_name] = {
+            "capability_hash": capability_hash,
+            "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools],
+            "updated": time.time(),
+        }
+        self.save()
+
+    def server_names(self) -> List[str]:
+        return list(self.entries)
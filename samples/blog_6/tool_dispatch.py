@@ -0,0 +1,223 @@
+"""
+Concurrent MCP tool call dispatch
+
+ToolDispatcher sits between the tool wrappers and the MQTT client: it limits
+how many calls run at once against each server (ESP32 firmware handles one
+message at a time), bounds every call with a timeout and records per-call
+latency.
+
+A function-calling agent runs the independent tool calls of one LLM step in
+parallel, and the dispatcher keeps those to different devices concurrent.
+Both default models (DeepSeek-V3 and R1 report is_function_calling_model
+False) run as ReAct agents with one tool call per step, so with them there
+is nothing to run in parallel within a turn: what applies is the per-server
+limit for calls from concurrent turns or sessions, and the timeout.
+
+With a batch client, calls to a server that takes JSON-RPC batches are
+coalesced: calls that arrive while the server is busy, or within
+`batch_window` of each other, go out together as one MQTT message once it
+is their turn.
+"""
+
+import logging
+import statistics
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+import anyio
+
+from mcp_batch import BatchNotSupported
+from tracing import result_size, span
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per server for the summary
+LATENCY_WINDOW = 200
+
+
+class ToolCallTimeout(Exception):
+    pass
+
+
+@dataclass
+class PendingBatch:
+    """Calls to one server waiting to be sent together"""
+
+    calls: List[tuple] = field(default_factory=list)
+    results: Optional[list] = None
+    error: Optional[Exception] = None
+    # perf_counter() when the batch went out, None before
+    sent_at: Optional[float] = None
+    done: anyio.Event = field(default_factory=anyio.Event)
+
+
+class ToolDispatcher:
+    """Call tools through the MQTT client with per-server limits and timeouts"""
+
+    def __init__(
+        self,
+        client=None,
+        max_concurrency_per_server: int = 1,
+        timeout: float = 30.0,
+        server_limits: Optional[Dict[str, int]] = None,
+        batch_client=None,
+        batch_window: float = 0.005,
+        max_batch: int = 8,
+    ):
+        self.client = client
+        self.max_concurrency_per_server = max_concurrency_per_server
+        self.timeout = timeout
+        # Overrides of the concurrency limit for servers that can take more
+        self.server_limits = server_limits or {}
+        self.semaphores: Dict[str, anyio.Semaphore] = {}
+        self.latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=LATENCY_WINDOW)
+        )
+        self.timeouts: Dict[str, int] = defaultdict(int)
+        # McpBatchClient, None sends every call on its own
+        self.batch_client = batch_client
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        # Server name -> batch still taking calls
+        self.pending: Dict[str, PendingBatch] = {}
+        self.messages: Dict[str, int] = defaultdict(int)
+        self.fallbacks = 0
+
+    def _semaphore(self, server_name: str) -> anyio.Semaphore:
+        semaphore = self.semaphores.get(server_name)
+        if semaphore is None:
+            limit = self.server_limits.get(server_name, self.max_concurrency_per_server)
+            semaphore = anyio.Semaphore(limit)
+            self.semaphores[server_name] = semaphore
+        return semaphore
+
+    async def call_tool(self, server_name: str, tool_name: str, arguments=None):
+        """
+        Same contract as MqttTransportClient.call_tool, bounded by the timeout
+
+        Raises:
+            ToolCallTimeout: If queueing plus the round trip exceeded the timeout
+        """
+        start = time.perf_counter()
+        try:
+            with span("call_tool", "dispatch", server=server_name) as trace_args:
+                with anyio.fail_after(self.timeout):
+                    if self.batch_client is not None and self.batch_client.enabled(server_name):
+                        result, queued = await self._call_batched(
+                            server_name, tool_name, arguments, start
+                        )
+                    else:
+                        async with self._semaphore(server_name):
+                            queued = time.perf_counter() - start
+                            result = await self._call_single(server_name, tool_name, arguments)
+                    trace_args["queued_ms"] = round(queued * 1000, 1)
+        except TimeoutError:
+            self.timeouts[server_name] += 1
+            raise ToolCallTimeout(
+                f"{tool_name} on {server_name} timed out after {self.timeout:.0f}s"
+            )
+
+        elapsed = time.perf_counter() - start
+        self.latencies[server_name].append(elapsed)
+        logger.info(
+            f"Tool {server_name}/{tool_name} took {elapsed * 1000:.0f} ms "
+            f"(queued {queued * 1000:.0f} ms)"
+        )
+        return result
+
+    async def _call_single(self, server_name: str, tool_name: str, arguments):
+        self.messages[server_name] += 1
+        # Request publish to response receive on the MQTT transport
+        with span(f"mqtt call_tool {tool_name}", "mqtt", server=server_name) as mqtt_args:
+            result = await self.client.call_tool(server_name, tool_name, arguments)
+            mqtt_args["response_chars"] = result_size(result)
+        return result
+
+    async def _call_batched(self, server_name: str, tool_name: str, arguments, start: float):
+        """
+        Join the server's pending batch; the first caller sends it when the
+        server is free, the others wait for its results
+        """
+        batch = self.pending.get(server_name)
+        leader = batch is None
+        if leader:
+            batch = self.pending[server_name] = PendingBatch()
+        index = len(batch.calls)
+        batch.calls.append((tool_name, arguments))
+        if len(batch.calls) >= self.max_batch:
+            self.pending.pop(server_name, None)
+
+        if not leader:
+            await batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+            if batch.results is None:
+                if batch.sent_at is not None:
+                    raise ToolCallTimeout(f"batch with {tool_name} on {server_name} was lost")
+                # The first caller gave up before sending, go on alone
+                async with self._semaphore(server_name):
+                    queued = time.perf_counter() - start
+                    return await self._call_single(server_name, tool_name, arguments), queued
+            return batch.results[index], batch.sent_at - start
+
+        try:
+            async with self._semaphore(server_name):
+                # Let the other calls of the same LLM step join
+                await anyio.sleep(self.batch_window)
+                if self.pending.get(server_name) is batch:
+                    del self.pending[server_name]
+                batch.sent_at = time.perf_counter()
+                queued = batch.sent_at - start
+                batch.results = await self._send_batch(server_name, batch.calls)
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            if self.pending.get(server_name) is batch:
+                del self.pending[server_name]
+            batch.done.set()
+        return batch.results[index], queued
+
+    async def _send_batch(self, server_name: str, calls: List[tuple]) -> list:
+        if len(calls) == 1:
+            return [await self._call_single(server_name, *calls[0])]
+        try:
+            self.messages[server_name] += 1
+            with span(f"mqtt batch {len(calls)} calls", "mqtt", server=server_name):
+                return await self.batch_client.call_tools(server_name, calls)
+        except BatchNotSupported as e:
+            logger.warning(f"{server_name} does not take batches ({e}), calling one by one")
+            self.batch_client.disable(server_name)
+            self.fallbacks += 1
+            return [await self._call_single(server_name, *call) for call in calls]
+        except TimeoutError:
+            # The device may have run the calls, they are not sent again
+            logger.warning(f"Batch to {server_name} timed out, calling one by one from now on")
+            self.batch_client.disable(server_name)
+            raise
+
+    def batch_stats(self) -> dict:
+        """MQTT messages per server and how the batches went"""
+        return {
+            "messages": dict(self.messages),
+            "fallbacks": self.fallbacks,
+            **(self.batch_client.stats() if self.batch_client is not None else {}),
+        }
+
+    def summary(self) -> Dict[str, dict]:
+        """Per-server call count, latency percentiles (ms) and timeouts"""
+        result = {}
+        for server_name in set(self.latencies) | set(self.timeouts):
+            samples = sorted(s * 1000 for s in self.latencies.get(server_name, ()))
+            result[server_name] = {
+                "calls": len(samples),
+                "p50_ms": round(statistics.median(samples), 1) if samples else None,
+                "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 1)
+                if len(samples) >= 20
+                else None,
+                "max_ms": round(samples[-1], 1) if samples else None,
+                "timeouts": self.timeouts.get(server_name, 0),
+            }
+        return result
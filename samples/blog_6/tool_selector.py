@@ -0,0 +1,212 @@
+"""
+Relevance-filtered tool exposure for large tool catalogs
+
+Every tool of every device goes into each LLM prompt, so prompt tokens and
+latency grow with the fleet. ToolSelector keeps a local BM25 index over tool
+names, server names, descriptions and parameter descriptions, and exposes
+only the `top_k` tools that match the user message (and, with half the
+weight, the previous one, so "再大一点" follows "把音量调到30") plus an
+always-include list. Chinese words for actions and quantities are mapped
+onto the English terms the firmware uses, room and device names through a
+site vocabulary, and Chinese descriptions are indexed as character bigrams.
+Catalogs of up to `top_k` tools are always exposed in full, and so is the
+whole catalog when no device tool matches ("what can you do?", a phrasing
+the tables miss), rather than leaving the LLM with no device tool at all.
+"""
+
+import json
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from llama_index.core.tools import BaseTool
+
+from fast_path import SYNONYMS
+
+logger = logging.getLogger(__name__)
+
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Weight of the previous user message in the query
+CONTEXT_WEIGHT = 0.5
+
+# Selection latency samples kept for stats()
+LATENCY_WINDOW = 200
+
+# Chinese (and colloquial English) words for the actions and quantities device tools
+# are named after, on top of the fast path's. Only device-agnostic words belong here:
+# room and device names are site vocabulary, passed to ToolSelector as `synonyms`
+QUERY_SYNONYMS = {
+    **SYNONYMS,
+    "volume": SYNONYMS["volume"] + ["大声", "小声", "louder", "quieter"],
+    "brightness": SYNONYMS["brightness"] + ["亮一点", "暗一点", "brighter", "dimmer"],
+    "color": SYNONYMS["color"] + ["红色", "绿色", "蓝色", "白色", "黄色"],
+    "photo": ["照片", "拍照", "拍", "看看", "打扮", "衣服", "图片", "picture"],
+    "position": ["位置"],
+    "lock": ["锁上", "上锁"],
+    "unlock": ["解锁", "开锁"],
+    "music": ["音乐", "歌"],
+    "humidity": ["湿度"],
+    "battery": ["电量", "电池"],
+    "on": ["打开", "开"],
+    "off": ["关闭", "关掉", "关"],
+    "open": ["打开", "拉开"],
+    "close": ["关上", "拉上"],
+}
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "by", "for", "from", "in", "is", "it", "of", "or", "the",
+    "this", "to", "used", "when", "with", "users", "user", "ask", "mcp", "tool", "please",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[一-鿿]+")
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def tokenize(text: str) -> List[str]:
+    """English words (snake/camel case split, plural s dropped) and CJK bigrams"""
+    text = unicodedata.normalize("NFKC", _CAMEL.sub(" ", text or "")).lower()
+    tokens = []
+    for word in _WORD.findall(text.replace("_", " ")):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run[i : i + 2] for i in range(max(1, len(run) - 1)))
+    return tokens
+
+
+def query_terms(message: str, synonyms: Dict[str, List[str]] = QUERY_SYNONYMS) -> List[str]:
+    """Tokens of a user message plus the terms its synonyms stand for"""
+    terms = tokenize(message)
+    text = message.lower()
+    for term, words in synonyms.items():
+        if any(word in text for word in words):
+            terms.append(term)
+    return terms
+
+
+def load_synonyms(path: Optional[str]) -> Dict[str, List[str]]:
+    """Site vocabulary from a JSON file of {term: [words]}, empty without a path"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        synonyms = json.load(f)
+    logger.info(f"Loaded tool selection synonyms for {len(synonyms)} terms from {path}")
+    return synonyms
+
+
+def tool_document(tool: BaseTool) -> List[str]:
+    """Indexed text of a tool, its name counted twice"""
+    metadata = tool.metadata
+    parts = [metadata.name, metadata.name, metadata.description or ""]
+    if metadata.fn_schema is not None:
+        for name, field in metadata.fn_schema.model_fields.items():
+            parts.append(f"{name} {field.description or ''}")
+    return tokenize(" ".join(parts))
+
+
+class ToolSelector:
+    """Top-k tools per turn by BM25 relevance, plus tools that are always exposed"""
+
+    def __init__(
+        self,
+        top_k: int = 8,
+        always_include: Optional[Iterable[str]] = None,
+        synonyms: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.top_k = top_k
+        # Namespaced or bare tool names
+        self.always_include = set(always_include or [])
+        # Site vocabulary (room and device names in the user's language) on top of the
+        # device-agnostic table, e.g. {"kitchen": ["厨房"]}
+        self.synonyms = dict(QUERY_SYNONYMS)
+        for term, words in (synonyms or {}).items():
+            self.synonyms[term] = self.synonyms.get(term, []) + list(words)
+        self.tools: List[BaseTool] = []
+        # term -> [(tool position, term frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        self.avg_length = 0.0
+        self.always_positions: List[int] = []
+        self.turns = 0
+        self.exposed = 0
+        # Turns where no device tool matched and the whole catalog was exposed
+        self.fallbacks = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def index(self, tools: List[BaseTool]):
+        """Rebuild the index, call it whenever the tool set changed"""
+        self.tools = list(tools)
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for i, tool in enumerate(self.tools):
+            document = tool_document(tool)
+            self.lengths.append(len(document))
+            for term, tf in Counter(document).items():
+                self.postings[term].append((i, tf))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.always_positions = [i for i, tool in enumerate(self.tools) if self._always(tool)]
+
+    def _always(self, tool: BaseTool) -> bool:
+        name = tool.metadata.name
+        return name in self.always_include or name.split("__")[-1] in self.always_include
+
+    def scores(self, terms: Iterable[str]) -> Dict[int, float]:
+        """BM25 score of every tool matching at least one term, by tool position"""
+        scores: Dict[int, float] = {}
+        n_docs = len(self.tools)
+        for term, count in Counter(terms).items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for i, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.avg_length)
+                scores[i] = scores.get(i, 0.0) + count * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def select(self, message: str, previous: Optional[str] = None) -> List[BaseTool]:
+        """Tools to expose for this message, in catalog order"""
+        if len(self.tools) <= self.top_k:
+            return self.tools
+        start = time.perf_counter()
+        scores = self.scores(query_terms(message, self.synonyms))
+        if previous:
+            for i, score in self.scores(query_terms(previous, self.synonyms)).items():
+                scores[i] = scores.get(i, 0.0) + CONTEXT_WEIGHT * score
+        always = set(self.always_positions)
+        if any(score > 0 for i, score in scores.items() if i not in always):
+            ranked = sorted(scores, key=lambda i: scores[i], reverse=True)
+            chosen = set(ranked[: self.top_k])
+            chosen.update(always)
+            selected = [self.tools[i] for i in sorted(chosen)]
+        else:
+            # Nothing to go on, the LLM picks from everything
+            self.fallbacks += 1
+            selected = self.tools
+
+        self.turns += 1
+        self.exposed += len(selected)
+        self.latencies.append(time.perf_counter() - start)
+        logger.debug(f"Exposing {[tool.metadata.name for tool in selected]}")
+        return selected
+
+    def stats(self) -> dict:
+        samples = sorted(self.latencies)
+        return {
+            "catalog": len(self.tools),
+            "turns": self.turns,
+            "mean_exposed": round(self.exposed / self.turns, 1) if self.turns else None,
+            "fallbacks": self.fallbacks,
+            "p50_us": round(samples[len(samples) // 2] * 1e6, 1) if samples else None,
+        }
@@ -1,11 +1,20 @@
 import os
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import logging
 from openai import OpenAI
 
+from frame_scoring import decode_data_url, select_best_frame
+
 logger = logging.getLogger(__name__)
 
+# OpenAI-compatible upstream, overridable so the server can run against a local stand-in
+VISION_API_BASE = os.getenv(
+    "VISION_API_BASE", "https://dashscope.aliyuncs.com/compatible-mode/v1"
+)
+VISION_MODEL = os.getenv("VISION_MODEL", "qwen-vl-plus")
+
 
 class VisionRequest(BaseModel):
     """
@@ -36,6 +45,14 @@ class VisionResponse(BaseModel):
     response: str
 
 
+class BurstVisionResponse(VisionResponse):
+    """Burst response model, also reports which frame was sent to the model"""
+
+    selected_frame: int
+    frame_count: int
+    scores: list[float]
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="ESP32 AI Vision Assistant API",
@@ -54,13 +71,71 @@ async def process_audio(request: VisionRequest):
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
 
+@app.post("/explain_photo_burst", response_model=BurstVisionResponse)
+async def process_burst(request: VisionRequest):
+    """
+    Same request body as /explain_photo, but with several image_url parts.
+
+    Frames are scored locally (sharpness and exposure) and only the best one
+    is forwarded to the vision model, so a blurry capture does not cost an
+    extra paid call.
+    """
+    image_parts = [part for part in request.content if part.get("type") == "image_url"]
+    if not image_parts:
+        raise HTTPException(status_code=400, detail="No image_url in request")
+
+    frames = []
+    for part in image_parts:
+        image_url = part.get("image_url")
+        data = decode_data_url(image_url.get("url", "")) if isinstance(image_url, dict) else None
+        if data is None:
+            raise HTTPException(
+                status_code=400, detail="Burst frames must be valid base64 data URLs"
+            )
+        frames.append(data)
+
+    try:
+        # Decoding and scoring is CPU bound, keep it off the event loop
+        best, scores = await run_in_threadpool(select_best_frame, frames)
+    except ValueError as e:
+        # Corrupt frames only, nothing worth a vision model call
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        logger.info(
+            f"Burst of {len(frames)} frames, selected frame {best} "
+            f"(scores: {[round(s.score, 1) for s in scores]})"
+        )
+
+        best_part = image_parts[best]
+        content = [
+            part
+            for part in request.content
+            if part.get("type") != "image_url" or part is best_part
+        ]
+        # Blocking OpenAI client call, keep it off the event loop like the scoring
+        result = await run_in_threadpool(
+            get_response, VisionRequest(role=request.role, content=content)
+        )
+        return BurstVisionResponse(
+            response=result.response,
+            selected_frame=best,
+            frame_count=len(frames),
+            scores=[s.score for s in scores],
+        )
+
+    except Exception as e:
+        logger.error(f"API processing error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+
 def get_response(request: VisionRequest) -> VisionResponse:
     client = OpenAI(
         api_key=os.getenv("DASHSCOPE_API_KEY"),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+        base_url=VISION_API_BASE,
     )
     completion = client.chat.completions.create(
-        model="qwen-vl-plus",
+        model=VISION_MODEL,
         messages=[request],
     )
     # 提取第一个 choice 的 message.content 字段